@@ -28,6 +28,10 @@ class Settings(BaseSettings):
 	expires_delta_refresh_token: str = os.getenv('REF_JWT_TOKEN')
 	algorithm: str = os.getenv('ALGORITHM')
 	secret_key: str = os.getenv('SECRET_KEY')
+	auth_cache_ttl: int = os.getenv('AUTH_CACHE_TTL', 60)
+	auth_cache_size: int = os.getenv('AUTH_CACHE_SIZE', 10000)
+	password_hash_workers: int = os.getenv('PASSWORD_HASH_WORKERS', 4)
+	password_hash_queue: int = os.getenv('PASSWORD_HASH_QUEUE', 32)
 
 	# DB block
 	postgres_name: str = os.getenv("POSTGRES_DB_NAME")
@@ -36,6 +40,33 @@ class Settings(BaseSettings):
 	postgres_domain: str = os.getenv("POSTGRES_HOST")
 	postgres_port: str = os.getenv("POSTGRES_PORT")
 	postgres_url: str = os.getenv("POSTGRES_URL")
+	postgres_pool_size: int = os.getenv("POSTGRES_POOL_SIZE", 5)
+	postgres_max_overflow: int = os.getenv("POSTGRES_MAX_OVERFLOW", 10)
+	postgres_pool_timeout: float = os.getenv("POSTGRES_POOL_TIMEOUT", 30)
+	postgres_pool_recycle: int = os.getenv("POSTGRES_POOL_RECYCLE", 1800)
+	postgres_pool_pre_ping: bool = os.getenv("POSTGRES_POOL_PRE_PING", True)
+	postgres_replica_urls: str = os.getenv("POSTGRES_REPLICA_URLS", "")
+	postgres_replica_max_lag: float = os.getenv("POSTGRES_REPLICA_MAX_LAG", 1)
+	postgres_replica_check_interval: float = os.getenv("POSTGRES_REPLICA_CHECK_INTERVAL", 5)
+	postgres_replica_probe_timeout: float = os.getenv("POSTGRES_REPLICA_PROBE_TIMEOUT", 2)
+
+	# Images block
+	image_max_size: int = os.getenv("IMAGE_MAX_SIZE", 10 * 1024 * 1024)
+	transform_workers: int = os.getenv("TRANSFORM_WORKERS", 4)
+	transform_queue: int = os.getenv("TRANSFORM_QUEUE", 32)
+
+	# QR block
+	qr_cache_size: int = os.getenv("QR_CACHE_SIZE", 1024)
+	qr_cache_ttl: int = os.getenv("QR_CACHE_TTL", 7 * 24 * 60 * 60)
+	qr_render_workers: int = os.getenv("QR_RENDER_WORKERS", 2)
+	qr_render_queue: int = os.getenv("QR_RENDER_QUEUE", 32)
+
+	# Leaderboards block
+	leaderboard_half_life: int = os.getenv("LEADERBOARD_HALF_LIFE", 24 * 60 * 60)
+	leaderboard_size: int = os.getenv("LEADERBOARD_SIZE", 1000)
+
+	# Pages block
+	pages_cache_ttl: int = os.getenv("PAGES_CACHE_TTL", 30)
 
 	# Users block
 	allowed_roles: list = ["user", "moderator", "admin"]
@@ -48,12 +79,32 @@ class Settings(BaseSettings):
 	redis_host: str = os.getenv("REDIS_DB_HOST")
 	redis_port: int = os.getenv("REDIS_DB_PORT")
 	redis_url: str = os.getenv("REDIS_URL")
+	blacklist_bloom_capacity: int = os.getenv("BLACKLIST_BLOOM_CAPACITY", 100000)
+	blacklist_bloom_error_rate: float = os.getenv("BLACKLIST_BLOOM_ERROR_RATE", 0.001)
+	# "local" limits requests in every worker process, "redis" shares the limit between workers
+	rate_limit_backend: str = os.getenv("RATE_LIMIT_BACKEND", "local")
+	rate_limit_max_keys: int = os.getenv("RATE_LIMIT_MAX_KEYS", 100000)
 	# Cloudinary
 	cloudinary_name: str = os.getenv("CLOUDINARY_NAME")
 	cloudinary_api: str = os.getenv("CLOUDINARY_API_KEY")
 	cloudinary_api_secret: str = os.getenv("CLOUDINARY_API_SECRET")
 	cloudinary_url: str = os.getenv("CLOUDINARY_URL")
 	cloudinary_folder: str = os.getenv("CLOUDINARY_FOLDERS")
+	cloudinary_api_url: str = os.getenv("CLOUDINARY_API_URL", "https://api.cloudinary.com/v1_1")
+	cloudinary_max_concurrency: int = os.getenv("CLOUDINARY_MAX_CONCURRENCY", 8)
+	cloudinary_timeout: float = os.getenv("CLOUDINARY_TIMEOUT", 30)
+	cloudinary_retries: int = os.getenv("CLOUDINARY_RETRIES", 3)
+	# Eager transformations generated at upload, name -> Cloudinary transformation options.
+	# Overridden with JSON in CLOUDINARY_PRESETS.
+	cloudinary_presets: dict[str, dict] = {
+		"thumbnail": {"width": 150, "height": 150, "crop": "thumb", "gravity": "auto"},
+		"card": {
+			"width": 600, "height": 400, "crop": "fill", "gravity": "auto",
+			"fetch_format": "auto", "quality": "auto",
+		},
+		"avatar": {"width": 250, "height": 250, "crop": "fill", "gravity": "face", "radius": "max"},
+		"optimized": {"fetch_format": "auto", "quality": "auto"},
+	}
 
 	# LavinaMQ - analog RebbitMQ
 	lavina_cluster: str = os.getenv("LAVINA_CLUSTER")
@@ -64,5 +115,13 @@ class Settings(BaseSettings):
 	lavina_port: int = os.getenv("LAVINA_PORT")
 	lavina_port_tsl: int = os.getenv("LAVINA_PORT_TSL")
 
+	# Jobs block, "amqp" runs jobs in worker.py processes, "local" in the API process
+	job_backend: str = os.getenv("JOB_BACKEND", "local")
+	job_queue: str = os.getenv("JOB_QUEUE", "image_jobs")
+	job_ttl: int = os.getenv("JOB_TTL", 24 * 60 * 60)
+	job_store_size: int = os.getenv("JOB_STORE_SIZE", 10000)
+	job_publish_queue: int = os.getenv("JOB_PUBLISH_QUEUE", 1000)
+	job_worker_processes: int = os.getenv("JOB_WORKER_PROCESSES", 2)
+
 
 settings = Settings()
@@ -1,9 +1,16 @@
+from typing import Optional
+
 import httpx
-from fastapi import APIRouter, Request
+from fastapi import APIRouter, Depends, Request
 from fastapi.templating import Jinja2Templates
-from sqlalchemy.orm import Session
-from src.database.connection import SessionLocal
-from src.database.models import Comment, User, Image
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import settings
+from src.database.connection import get_db
+from src.repository import comments as repository_comments
+from src.repository import image as repository_image
+from src.services.pagination import decode_cursor, encode_cursor
+from src.services.ttl_cache import TTLCache
 
 router = APIRouter(prefix="/pages", tags=["Pages"])
 
@@ -12,29 +19,62 @@ templates = Jinja2Templates(directory="front/templates")
 url_local = "http://0.0.0.0:8000"
 url_cloud = "https://pycrafters-project-pycrafters.koyeb.app"
 
+PAGE_SIZE = 20
+COMMENTS_PREVIEW = 3
+
+# Rendered image lists by cursor, shared by all visitors of the same page
+lights_cache = TTLCache(maxsize=256, ttl=settings.pages_cache_ttl)
+
 
 @router.get("/base")
 @router.get("/index")
 @router.get("/home")
-def get_base_pages(request: Request):
-	session: Session = SessionLocal()
-	users = session.query(User).all()
-	images = session.query(Image).all()
-	comments = session.query(Comment).all()
+async def get_base_pages(
+	request: Request,
+	cursor: Optional[str] = None,
+	db: AsyncSession = Depends(get_db),
+):
+	lights_html = lights_cache.get(cursor)
+	if lights_html is None:
+		lights_html = await render_lights(cursor, db)
+		lights_cache.set(cursor, lights_html)
+	return templates.TemplateResponse(
+		"home.html", {"request": request, "lights_html": lights_html}
+	)
+
+
+async def render_lights(cursor: Optional[str], db: AsyncSession) -> str:
+	"""
+	The render_lights function renders one page of images with a preview of their latest comments.
+		Costs three queries whatever the size of the tables: the page of images, their tags,
+		and the comments preview with authors. Comment counts are columns of the images.
+
+	:param cursor: str: Cursor of the page, None for the first page.
+	:param db: AsyncSession: Database session.
+	:return: Rendered HTML fragment.
+	"""
+	after = decode_cursor(cursor) if cursor else None
+	images = await repository_image.get_feed(db, PAGE_SIZE + 1, after)
+	next_cursor = None
+	if len(images) > PAGE_SIZE:
+		images = images[:PAGE_SIZE]
+		next_cursor = encode_cursor(images[-1].created_at, images[-1].id)
+
+	previews = await repository_comments.get_comment_previews(
+		[image.id for image in images], COMMENTS_PREVIEW, db
+	)
 	lights = []
 	for image in images:
-		image_comments = [
-			comment for comment in comments if comment.image_id == image.id
-		]
 		light = {
-			"image_name": image.image_name,
 			"path": image.path,
 			"description": image.description,
-			"comments": image_comments,
+			"tags": [tag.name for tag in image.tags],
+			"comments": previews.get(image.id, []),
+			"comment_count": image.comment_count,
 		}
 		lights.append(light)
-	return templates.TemplateResponse(
-		"base.html", {"request": request, "lights": lights}
+	return templates.get_template("lights.html").render(
+		lights=lights, next_cursor=next_cursor
 	)
 
 
@@ -1,11 +1,14 @@
-import redis.asyncio as redis
 import uvicorn
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 from fastapi_limiter import FastAPILimiter
 from config import settings
 from front.pages import routes as pages
-from src.routes import auth, admin, comments, cloudinary, image, qr, users
+from src.database.cache import redis_client
+from src.repository import token as token_repository
+from src.repository import users as users_repository
+from src.routes import auth, admin, comments, cloudinary, image, jobs, qr, tags, users
+from src.services.cloudinary import cloudinary_client
 
 app = FastAPI(title="PyCraft FastAPI project")
 
@@ -21,25 +24,31 @@ async def startup():
     :return: A coroutine, so we need to call it with await
 
     """
-    await FastAPILimiter.init(
-        await redis.Redis(
-            host=settings.redis_host,
-            port=settings.redis_port,
-            username=settings.redis_username,
-            password=settings.redis_password,
-            db=0,
-            encoding="utf-8",
-            decode_responses=True,
-        )
-    )
+    if settings.rate_limit_backend == "redis":
+        await FastAPILimiter.init(redis_client)
+    # Syncs connect to Redis in the background and retry, startup doesn't need Redis
+    app.state.blacklist_sync = await token_repository.start_blacklist_sync()
+    app.state.user_cache_sync = await users_repository.start_user_cache_sync()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    """
+    The shutdown function is called when the application stops and closes outgoing connections.
+
+    :return: None
+    """
+    await cloudinary_client.close()
 
 app.include_router(auth.router, prefix="/api")
 app.include_router(admin.router, prefix="/api")
 app.include_router(users.router, prefix="/api")
 app.include_router(image.router, prefix="/api")
 app.include_router(comments.router, prefix="/api")
+app.include_router(tags.router, prefix="/api")
 app.include_router(cloudinary.router, prefix="/api")
 app.include_router(qr.router, prefix="/api")
+app.include_router(jobs.router, prefix="/api")
 app.include_router(pages.router)
 
 
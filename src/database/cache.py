@@ -0,0 +1,23 @@
+import redis.asyncio as redis
+
+from config import settings
+
+# Shared async Redis client for rate limiting, token blacklist and caches
+redis_client = redis.Redis(
+    host=settings.redis_host,
+    port=settings.redis_port,
+    username=settings.redis_username,
+    password=settings.redis_password,
+    db=0,
+    encoding="utf-8",
+    decode_responses=True,
+)
+
+# Same Redis without response decoding, for binary values such as rendered images
+redis_binary_client = redis.Redis(
+    host=settings.redis_host,
+    port=settings.redis_port,
+    username=settings.redis_username,
+    password=settings.redis_password,
+    db=0,
+)
@@ -1,7 +1,17 @@
+import asyncio
+import time
+
 from fastapi import HTTPException, status
-from sqlalchemy import create_engine
-from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import SQLAlchemyError, TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, Pool
 
 from config import settings
 
@@ -12,20 +22,239 @@ domain = settings.postgres_domain
 port = settings.postgres_port
 
 DATABASE_URL = f"postgresql+psycopg2://{user}:{password}@{domain}:{port}/{db_name}"
+ASYNC_DATABASE_URL = f"postgresql+asyncpg://{user}:{password}@{domain}:{port}/{db_name}"
+
+POOL_OPTIONS = {
+    "pool_size": settings.postgres_pool_size,
+    "max_overflow": settings.postgres_max_overflow,
+    "pool_timeout": settings.postgres_pool_timeout,
+    "pool_recycle": settings.postgres_pool_recycle,
+    "pool_pre_ping": settings.postgres_pool_pre_ping,
+}
+
+
+class PoolStats:
+    """
+    Collects connection checkout wait times and pool exhaustion events.
+    """
+    # Upper bounds of the wait time histogram buckets, in seconds
+    buckets = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self) -> None:
+        self.histogram = [0] * (len(self.buckets) + 1)
+        self.waits = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.timeouts = 0
+
+    def observe(self, seconds: float) -> None:
+        """
+        The observe function records one checkout wait into the histogram.
+
+        :param seconds: float: Time spent waiting for a connection.
+        :return: None.
+        """
+        self.waits += 1
+        self.total_wait += seconds
+        self.max_wait = max(self.max_wait, seconds)
+        for index, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                self.histogram[index] += 1
+                return
+        self.histogram[-1] += 1
+
+    def snapshot(self, pool: Pool) -> dict:
+        """
+        The snapshot function combines the live pool counters with the collected wait statistics.
+
+        :param pool: Pool: Pool of the engine to describe.
+        :return: A dictionary with pool usage and wait time histogram.
+        """
+        labels = [f"<={int(bound * 1000)}ms" for bound in self.buckets] + ["+Inf"]
+        return {
+            "size": pool.size(),
+            "checked_in": pool.checkedin(),
+            "checked_out": pool.checkedout(),
+            "overflow": pool.overflow(),
+            "timeouts": self.timeouts,
+            "waits": self.waits,
+            "avg_wait_ms": round(self.total_wait / self.waits * 1000, 3) if self.waits else 0.0,
+            "max_wait_ms": round(self.max_wait * 1000, 3),
+            "wait_histogram": dict(zip(labels, self.histogram)),
+        }
 
-engine = create_engine(DATABASE_URL)
+
+pool_stats = PoolStats()
+
+
+class InstrumentedAsyncPool(AsyncAdaptedQueuePool):
+    """
+    AsyncAdaptedQueuePool that reports checkout wait times and timeouts to pool_stats.
+    """
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            pool_stats.timeouts += 1
+            raise
+        finally:
+            pool_stats.observe(time.perf_counter() - started)
+
+
+# Sync engine is kept for alembic migrations, seeds and the server-rendered pages
+engine = create_engine(DATABASE_URL, **POOL_OPTIONS)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async engine serves every API request through get_db
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL, poolclass=InstrumentedAsyncPool, **POOL_OPTIONS
+)
+
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+)
+
+
+class ReplicaRouter:
+    """
+    Picks a read replica engine for read-only queries.
+        Replication lag of every replica is measured at most once per check_interval seconds,
+        in a background task, so requests never wait for a probe and use the last known lags.
+        Replicas that are unreachable, don't answer within probe_timeout seconds
+        or lag more than max_lag seconds are skipped, and when none is left
+        (or before the first probe finished) the caller falls back to the primary engine.
+    """
+    LAG_QUERY = text(
+        "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+        "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+    )
+
+    def __init__(
+        self, replicas: list[AsyncEngine], max_lag: float, check_interval: float, probe_timeout: float = 2
+    ):
+        self.replicas = replicas
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.probe_timeout = probe_timeout
+        self.lags: dict[AsyncEngine, float | None] = {}
+        self.checked_at = None
+        self._next = 0
+        self._refresh_task: asyncio.Task | None = None
 
-def get_db():
-    db = Session(engine)
-    try:
-        yield db
-    except SQLAlchemyError as error:
-        db.rollback()
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(error)
+    async def measure_lag(self, replica: AsyncEngine) -> float | None:
+        """
+        The measure_lag function returns replication lag of the replica in seconds.
+            Non-Postgres replicas (SQLite files in tests) have no lag.
+
+        :param replica: AsyncEngine: Replica engine.
+        :return: Lag in seconds or None if the replica is unreachable.
+        """
+        try:
+            return await asyncio.wait_for(self._query_lag(replica), self.probe_timeout)
+        except (SQLAlchemyError, OSError, asyncio.TimeoutError):
+            return None
+
+    async def _query_lag(self, replica: AsyncEngine) -> float:
+        async with replica.connect() as conn:
+            if replica.dialect.name != "postgresql":
+                await conn.execute(text("SELECT 1"))
+                return 0.0
+            lag = await conn.scalar(self.LAG_QUERY)
+            return float(lag or 0.0)
+
+    async def refresh(self) -> None:
+        """
+        The refresh function probes all replicas concurrently and replaces the known lags.
+
+        :return: None.
+        """
+        self.checked_at = time.monotonic()
+        lags = await asyncio.gather(*(self.measure_lag(replica) for replica in self.replicas))
+        self.lags = dict(zip(self.replicas, lags))
+
+    def schedule_refresh(self) -> None:
+        if self._refresh_task is not None and not self._refresh_task.done():
+            return
+        # Set before the task runs, so requests arriving meanwhile don't schedule another one
+        self.checked_at = time.monotonic()
+        self._refresh_task = asyncio.create_task(self.refresh())
+
+    async def get_replica(self) -> AsyncEngine | None:
+        """
+        The get_replica function returns the next healthy replica in round-robin order.
+
+        :return: Replica engine or None if reads have to go to the primary.
+        """
+        if not self.replicas:
+            return None
+        if self.checked_at is None or time.monotonic() - self.checked_at > self.check_interval:
+            self.schedule_refresh()
+
+        healthy = [
+            replica for replica in self.replicas
+            if self.lags.get(replica) is not None and self.lags[replica] <= self.max_lag
+        ]
+        if not healthy:
+            return None
+        self._next = (self._next + 1) % len(healthy)
+        return healthy[self._next]
+
+
+replica_router = ReplicaRouter(
+    [
+        create_async_engine(
+            url.strip(), connect_args={"timeout": settings.postgres_replica_probe_timeout}, **POOL_OPTIONS
         )
-    finally:
-        db.close()
+        for url in settings.postgres_replica_urls.split(",")
+        if url.strip()
+    ],
+    max_lag=settings.postgres_replica_max_lag,
+    check_interval=settings.postgres_replica_check_interval,
+    probe_timeout=settings.postgres_replica_probe_timeout,
+)
+
+
+async def read_only_bind() -> dict:
+    """
+    The read_only_bind function returns bind arguments for session.execute of a read-only query.
+        Usage: await db.execute(stmt, bind_arguments=await read_only_bind())
+
+    :return: A dictionary with replica bind or empty dictionary to use the primary.
+    """
+    replica = await replica_router.get_replica()
+    if replica is None:
+        return {}
+    return {"bind": replica.sync_engine}
+
+
+def get_pool_stats() -> dict:
+    """
+    The get_pool_stats function returns usage of the async engine pool used by API requests.
+
+    :return: A dictionary with pool usage and wait time histogram.
+    """
+    return pool_stats.snapshot(async_engine.pool)
+
+
+async def get_db():
+    """
+    The get_db function is a dependency that yields an AsyncSession bound to the asyncpg engine.
+        Any SQLAlchemy error raised while the request is using the session rolls the transaction back
+        and is returned to the client as HTTP 500. The session is closed when the request finishes.
+
+    :return: AsyncSession
+    """
+    async with AsyncSessionLocal() as db:
+        try:
+            yield db
+        except SQLAlchemyError as error:
+            await db.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(error)
+            )
@@ -4,8 +4,13 @@ from sqlalchemy import (
 	String,
 	func,
 	DateTime,
+	DDL,
 	ForeignKey,
-	Text
+	Index,
+	JSON,
+	Text,
+	event,
+	literal_column,
 
 )
 
@@ -14,6 +19,14 @@ from sqlalchemy.orm import declarative_base, relationship, mapped_column, Mapped
 Base = declarative_base()
 
 
+def description_document(description):
+	"""
+	Text search document of an image description in PostgreSQL.
+		Queries must use the same expression, otherwise ix_images_description_fts isn't used.
+	"""
+	return func.to_tsvector(literal_column("'english'::regconfig"), description)
+
+
 class PrimaryKeyABC:
 	__abstract__ = True
 	id = Column(Integer, primary_key=True)
@@ -39,9 +52,12 @@ class User(Base, PrimaryKeyABC, CreatedAtABC):
 	is_admin: Mapped[bool] = mapped_column(default=False)
 	is_moderator: Mapped[bool] = mapped_column(default=False)
 	is_banned: Mapped[bool] = mapped_column(default=False)
-	refresh_token = Column(String(256), nullable=True)
+	# sha256 of the jti of the only valid refresh token, the token itself is never stored
+	refresh_token_hash = Column(String(64), nullable=True)
+	# Counters kept by the repository functions, src/repository/counters.py fixes any drift
+	image_count = Column(Integer, nullable=False, default=0, server_default="0")
 
-	comments = relationship('Comment', back_populates='users')
+	comments = relationship('Comment', back_populates='user')
 
 
 class Image(Base, PrimaryKeyABC, CreatedAtABC):
@@ -50,15 +66,46 @@ class Image(Base, PrimaryKeyABC, CreatedAtABC):
 	user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
 	path = Column(String, nullable=True)
 	description = Column(String, nullable=True)
+	file_size = Column(Integer, nullable=True)
+	file_hash = Column(String(64), nullable=True, index=True)
+	comment_count = Column(Integer, nullable=False, default=0, server_default="0")
 
 	tags = relationship("Tag", secondary="image_tags", back_populates="images")
-	comments = relationship('Comment', back_populates='images')
+	comments = relationship('Comment', back_populates='image')
+
+	# Keyset pagination of the feeds walks these indexes backwards, newest first
+	__table_args__ = (
+		Index("ix_images_created_at_id", "created_at", "id"),
+		Index("ix_images_user_id_created_at_id", "user_id", "created_at", "id"),
+		# Full-text search of descriptions, SQLite gets the images_fts table below instead
+		Index(
+			"ix_images_description_fts", description_document(description), postgresql_using="gin"
+		).ddl_if(dialect="postgresql"),
+	)
+
+
+# SQLite (tests) has no tsvector, descriptions are indexed by an external content FTS5 table
+for statement in (
+	"CREATE VIRTUAL TABLE images_fts USING fts5(description, content='images', content_rowid='id')",
+	"CREATE TRIGGER images_fts_insert AFTER INSERT ON images BEGIN "
+	"INSERT INTO images_fts(rowid, description) VALUES (new.id, new.description); END",
+	"CREATE TRIGGER images_fts_delete AFTER DELETE ON images BEGIN "
+	"INSERT INTO images_fts(images_fts, rowid, description) VALUES ('delete', old.id, old.description); END",
+	"CREATE TRIGGER images_fts_update AFTER UPDATE OF description ON images BEGIN "
+	"INSERT INTO images_fts(images_fts, rowid, description) VALUES ('delete', old.id, old.description); "
+	"INSERT INTO images_fts(rowid, description) VALUES (new.id, new.description); END",
+):
+	event.listen(Image.__table__, "after_create", DDL(statement).execute_if(dialect="sqlite"))
+event.listen(
+	Image.__table__, "before_drop", DDL("DROP TABLE IF EXISTS images_fts").execute_if(dialect="sqlite")
+)
 
 
 class Tag(Base, PrimaryKeyABC):
 	__tablename__ = "tags"
 
 	name = Column(String, unique=True, index=True)
+	image_count = Column(Integer, nullable=False, default=0, server_default="0")
 
 	images = relationship("Image", secondary="image_tags", back_populates="tags")
 
@@ -69,6 +116,9 @@ class ImageTagAssociation(Base):
 	image_id = Column(Integer, ForeignKey("images.id"), primary_key=True)
 	tag_id = Column(Integer, ForeignKey("tags.id"), primary_key=True)
 
+	# Primary key starts with image_id, the tag feed looks images up by tag_id
+	__table_args__ = (Index("ix_image_tags_tag_id_image_id", "tag_id", "image_id"),)
+
 
 class Comment(Base, PrimaryKeyABC, CreatedAtABC, UpdatedAtABC):
 	__tablename__ = 'comments'
@@ -77,22 +127,19 @@ class Comment(Base, PrimaryKeyABC, CreatedAtABC, UpdatedAtABC):
 	user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
 	image_id = Column(Integer, ForeignKey('images.id'), nullable=False)
 
-	users = relationship('User', back_populates='comments')
-	images = relationship('Image', back_populates='comments')
-
-
-class TokenBL(Base, PrimaryKeyABC):
-	__tablename__ = "blacklist"
+	user = relationship('User', back_populates='comments')
+	image = relationship('Image', back_populates='comments')
 
-	email = Column(String(128), nullable=True)
-	token = Column(String, nullable=True)
-	added_at = Column("added_at", DateTime, default=func.now())
+	# Comments of an image are paged by keyset on (created_at, id)
+	__table_args__ = (
+		Index("ix_comments_image_id_created_at", "image_id", "created_at", "id"),
+	)
 
 
 class CloudinaryResource(Base, PrimaryKeyABC, CreatedAtABC):
 	__tablename__ = "cloudinary_resources"
 
-	public_id = Column(String, nullable=False)
+	public_id = Column(String, nullable=False, unique=True, index=True)
 	format = Column(String)
 	version = Column(Integer)
 	resource_type = Column(String)
@@ -105,3 +152,22 @@ class CloudinaryResource(Base, PrimaryKeyABC, CreatedAtABC):
 	next_cursor = Column(String)
 	transformation = Column(String)
 	pages = Column(String)
+	# Preset name -> URL of the eager transformation generated at upload
+	presets = Column(JSON)
+
+	tag_rows = relationship(
+		"CloudinaryResourceTag", cascade="all, delete-orphan", passive_deletes=True
+	)
+
+
+class CloudinaryResourceTag(Base):
+	__tablename__ = "cloudinary_resource_tags"
+
+	# Primary key starts with tag, listing by tag is a range scan of it
+	tag = Column(String, primary_key=True)
+	resource_id = Column(
+		Integer, ForeignKey("cloudinary_resources.id", ondelete="CASCADE"), primary_key=True
+	)
+
+	# Tags of one resource are replaced on every update and removed by the cascade
+	__table_args__ = (Index("ix_cloudinary_resource_tag_resource_id", "resource_id"),)
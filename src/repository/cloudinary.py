@@ -1,6 +1,14 @@
+from typing import List
+
 import cloudinary
 import cloudinary.uploader
+from sqlalchemy import and_, delete, insert, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
 from config import settings
+from src.database.connection import read_only_bind
+from src.database.models import CloudinaryResource, CloudinaryResourceTag
 
 
 class CloudinaryRepository:
@@ -44,3 +52,125 @@ class CloudinaryRepository:
             public_id, format=format, width=100, height=150, crop="fill"
         )
         return {"url": url, "options": options}
+
+
+# Upload response fields stored in cloudinary_resources
+RESOURCE_FIELDS = (
+    "public_id", "format", "version", "resource_type", "bytes",
+    "width", "height", "url", "secure_url", "transformation", "pages",
+)
+
+
+async def save_resource(response: dict, db: AsyncSession) -> CloudinaryResource:
+    """
+    The save_resource function stores an upload response of Cloudinary.
+        Re-uploads with the same public_id overwrite the row with one INSERT ... ON CONFLICT DO UPDATE,
+        tags are replaced in cloudinary_resource_tags.
+
+    :param response: dict: Upload API response.
+    :param db: AsyncSession: Database session.
+    :return: Stored resource.
+    :doc-author: kagev
+    """
+    tags = list(dict.fromkeys(response.get("tags") or []))
+    values = {field: response.get(field) for field in RESOURCE_FIELDS}
+    values["pages"] = None if values["pages"] is None else str(values["pages"])
+    values["transformation"] = None if values["transformation"] is None else str(values["transformation"])
+    values["tags"] = ",".join(tags)
+    values["presets"] = {
+        name: build_url(values["public_id"], values["version"], values["format"], **transformation)
+        for name, transformation in settings.cloudinary_presets.items()
+    }
+
+    dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    stmt = dialect.insert(CloudinaryResource).values(**values)
+    resource_id = await db.scalar(
+        stmt.on_conflict_do_update(
+            index_elements=[CloudinaryResource.public_id],
+            set_={field: stmt.excluded[field] for field in values if field != "public_id"},
+        ).returning(CloudinaryResource.id)
+    )
+
+    await db.execute(
+        delete(CloudinaryResourceTag).filter(CloudinaryResourceTag.resource_id == resource_id)
+    )
+    if tags:
+        await db.execute(
+            insert(CloudinaryResourceTag),
+            [{"tag": tag, "resource_id": resource_id} for tag in tags],
+        )
+    await db.commit()
+
+    result = await db.execute(
+        select(CloudinaryResource)
+        .filter(CloudinaryResource.id == resource_id)
+        .execution_options(populate_existing=True)
+    )
+    return result.scalar()
+
+
+async def get_resource(public_id: str, db: AsyncSession) -> CloudinaryResource | None:
+    """
+    The get_resource function returns stored metadata of a Cloudinary resource, no API call is made.
+
+    :param public_id: str: Public id of the resource.
+    :param db: AsyncSession: Database session.
+    :return: Resource or None if it was never uploaded through the app.
+    :doc-author: kagev
+    """
+    result = await db.execute(
+        select(CloudinaryResource).filter(CloudinaryResource.public_id == public_id),
+        bind_arguments=await read_only_bind(),
+    )
+    return result.scalar()
+
+
+async def list_resources(
+    db: AsyncSession, limit: int, before_id: int | None = None, tag: str | None = None
+) -> List[CloudinaryResource]:
+    """
+    The list_resources function returns stored resources, newest first, instead of the Admin API listing.
+        Pages are cut by keyset on id, a tag filter walks the primary key of cloudinary_resource_tags.
+
+    :param db: AsyncSession: Database session.
+    :param limit: int: Maximum number of resources.
+    :param before_id: int: Id of the last resource of the previous page, None for the first page.
+    :param tag: str: Only resources with this tag.
+    :return: List of resources.
+    :doc-author: kagev
+    """
+    stmt = select(CloudinaryResource)
+    if tag is not None:
+        stmt = stmt.join(
+            CloudinaryResourceTag,
+            and_(
+                CloudinaryResourceTag.resource_id == CloudinaryResource.id,
+                CloudinaryResourceTag.tag == tag,
+            ),
+        )
+    if before_id is not None:
+        stmt = stmt.filter(CloudinaryResource.id < before_id)
+
+    result = await db.execute(
+        stmt.order_by(CloudinaryResource.id.desc()).limit(limit),
+        bind_arguments=await read_only_bind(),
+    )
+    return list(result.scalars())
+
+
+def build_url(public_id: str, version: int | None, format: str | None, **transformation) -> str:
+    return cloudinary.CloudinaryImage(public_id).build_url(
+        version=version, format=format, **transformation
+    )
+
+
+def resource_url(resource: CloudinaryResource, **transformation) -> str:
+    """
+    The resource_url function builds the delivery URL of a stored resource, no API call is made.
+
+    :param resource: CloudinaryResource: Stored resource.
+    :param transformation: Cloudinary transformation options, e.g. width=100, crop="fill".
+    :return: URL of the resource.
+    :doc-author: kagev
+    """
+    return build_url(resource.public_id, resource.version, resource.format, **transformation)
@@ -1,13 +1,22 @@
-from typing import List
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
 
-from sqlalchemy import and_
-from sqlalchemy.orm import Session
+from sqlalchemy import and_, func, select, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, selectinload
+from src.database.connection import read_only_bind
 from src.database.models import User, Comment, Image
 
 from ..schemas.comments import CommentModel
 
+# Everything CommentResponse reads: author and image are joined, image tags take one more query
+COMMENT_LOADERS = (
+    joinedload(Comment.user),
+    joinedload(Comment.image).selectinload(Image.tags),
+)
 
-async def create_comment(image_id: int, body: CommentModel, user: User, db: Session) -> Comment | None:
+
+async def create_comment(image_id: int, body: CommentModel, user: User, db: AsyncSession) -> Comment | None:
     """
     Creates new comment for specific Image by specific User.
 
@@ -18,39 +27,114 @@ async def create_comment(image_id: int, body: CommentModel, user: User, db: Sess
     :param user: User by whose comment will be created.
     :type user: User
     :param db: Database session.
-    :type db: Session
+    :type db: AsyncSession
     :return: Created comment or None if Image does not exist.
     :rtype: Comment | None
     """
 
-    image = db.query(Image).filter(Image.id == image_id).first()
+    result = await db.execute(
+        select(Image).options(selectinload(Image.tags)).filter(Image.id == image_id)
+    )
+    image = result.scalar()
     if image:
-        comment = Comment(body.model_dump())
+        comment = Comment(**body.model_dump())
         comment.user = user
         comment.image = image
         db.add(comment)
-        db.commit()
-        db.refresh(comment)
+        await db.execute(
+            update(Image)
+            .filter(Image.id == image_id)
+            .values(comment_count=Image.comment_count + 1)
+        )
+        await db.commit()
+        await db.refresh(comment, attribute_names=["created_at", "updated_at"])
         return comment
 
 
-async def get_comments(image_id: int, db: Session) -> List[Comment] | None:
+async def get_comments(
+    image_id: int,
+    db: AsyncSession,
+    limit: int,
+    after: Optional[Tuple[datetime, int]] = None,
+) -> List[Comment]:
     """
-    Gets list of comments of specific Image.
+    Gets one page of comments of specific Image, oldest first.
+    Pages are cut by keyset on (created_at, id) using ix_comments_image_id_created_at,
+    author and image of every comment are loaded with the page.
 
     :param image_id: ID of Image from which comments will be gotten.
     :type image_id: int
     :param db: Database session.
-    :type db: Session
-    :return: List of comments or None if Image does not exist.
-    :rtype: List[Comment] | None
+    :type db: AsyncSession
+    :param limit: Maximum number of comments on the page.
+    :type limit: int
+    :param after: (created_at, id) of the last comment of the previous page, None for the first page.
+    :type after: Tuple[datetime, int] | None
+    :return: List of comments.
+    :rtype: List[Comment]
     """
 
-    comments = db.query(Comment).filter(Comment.image_id == image_id).all()
-    return comments
+    stmt = select(Comment).options(*COMMENT_LOADERS).filter(Comment.image_id == image_id)
+    if after is not None:
+        stmt = stmt.filter(tuple_(Comment.created_at, Comment.id) > tuple_(*after))
+
+    result = await db.execute(
+        stmt.order_by(Comment.created_at, Comment.id).limit(limit),
+        bind_arguments=await read_only_bind(),
+    )
+    return list(result.scalars().unique())
+
 
+async def get_comment_previews(
+    image_ids: List[int], per_image: int, db: AsyncSession
+) -> Dict[int, List[Comment]]:
+    """
+    Gets the latest comments of every Image in one query.
+    Comments are ranked per image with a window function, only top per_image rows leave the database.
+    Total numbers of comments are kept in Image.comment_count and need no counting here.
+
+    :param image_ids: IDs of Images for which comments will be gotten.
+    :type image_ids: List[int]
+    :param per_image: Maximum number of comments per Image.
+    :type per_image: int
+    :param db: Database session.
+    :type db: AsyncSession
+    :return: Dictionary of image id to newest comments with loaded authors.
+    :rtype: Dict[int, List[Comment]]
+    """
 
-async def update_comment(comment_id: int, body: CommentModel, user: User, db: Session) -> Comment | None:
+    if not image_ids:
+        return {}
+
+    ranked = (
+        select(
+            Comment.id,
+            func.row_number()
+            .over(
+                partition_by=Comment.image_id,
+                order_by=(Comment.created_at.desc(), Comment.id.desc()),
+            )
+            .label("position"),
+        )
+        .filter(Comment.image_id.in_(image_ids))
+        .subquery()
+    )
+    result = await db.execute(
+        select(Comment)
+        .join(ranked, ranked.c.id == Comment.id)
+        .options(joinedload(Comment.user))
+        .filter(ranked.c.position <= per_image)
+        .order_by(ranked.c.position),
+        bind_arguments=await read_only_bind(),
+    )
+
+    previews = {}
+    for comment in result.scalars():
+        previews.setdefault(comment.image_id, []).append(comment)
+    return previews
+
+
+async def update_comment(comment_id: int, body: CommentModel, user: User, db: AsyncSession) -> Comment | None:
     """
     Updates specific comment by specific User.
 
@@ -61,19 +145,24 @@ async def update_comment(comment_id: int, body: CommentModel, user: User, db: Se
     :param user: User by whose comment will be updated.
     :type user: User
     :param db: Database session.
-    :type db: Session
+    :type db: AsyncSession
     :return: Updated comment or None if comment does not exist.
     :rtype: Comment | None
     """
 
-    comment = db.query(Comment).filter(and_(Comment.id == comment_id, Comment.user_id == user.id)).first()
+    result = await db.execute(
+        select(Comment)
+        .options(*COMMENT_LOADERS)
+        .filter(and_(Comment.id == comment_id, Comment.user_id == user.id))
+    )
+    comment = result.scalar()
     if comment:
         comment.content = body.content
-        db.commit()
+        await db.commit()
     return comment
 
 
-async def delete_comment(comment_id: int, user: User, db: Session) -> Comment | None:
+async def delete_comment(comment_id: int, user: User, db: AsyncSession) -> Comment | None:
     """
     Deletes specific comment by a specific user (ONLY BY MODER OR ADMIN).
 
@@ -82,13 +171,23 @@ async def delete_comment(comment_id: int, user: User, db: Session) -> Comment |
     :param user: User by whose comment will be deleted (ONLY MODER OR ADMIN).
     :type user: User
     :param db: Database session.
-    :type db: Session
+    :type db: AsyncSession
     :return: Deleted comment or None if comment does not exist.
     :rtype: Comment | None
     """
 
-    comment = db.query(Comment).filter(and_(Comment.id == comment_id, Comment.user_id == user.id)).first()
+    result = await db.execute(
+        select(Comment)
+        .options(*COMMENT_LOADERS)
+        .filter(and_(Comment.id == comment_id, Comment.user_id == user.id))
+    )
+    comment = result.scalar()
     if comment:
-        db.delete(comment)
-        db.commit()
+        await db.delete(comment)
+        await db.execute(
+            update(Image)
+            .filter(Image.id == comment.image_id)
+            .values(comment_count=Image.comment_count - 1)
+        )
+        await db.commit()
     return comment
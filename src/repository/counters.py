@@ -0,0 +1,49 @@
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.database.models import Comment, Image, ImageTagAssociation, Tag, User
+
+
+async def reconcile_counters(db: AsyncSession) -> dict:
+    """
+    Recounts the denormalized counters and fixes the rows where they drifted.
+
+    Counters are kept in the same transaction as the rows they count, so drift only comes from
+    changes made around the repository (manual SQL, restored backups). Only wrong rows are
+    written, a run over consistent tables just reads.
+
+    Parameters:
+    - db: SQLAlchemy database session object.
+
+    Returns:
+    - dict: number of fixed rows per table.
+    """
+    counters = {
+        "images": (
+            Image,
+            Image.comment_count,
+            select(func.count(Comment.id)).filter(Comment.image_id == Image.id),
+        ),
+        "tags": (
+            Tag,
+            Tag.image_count,
+            select(func.count()).filter(ImageTagAssociation.tag_id == Tag.id),
+        ),
+        "users": (
+            User,
+            User.image_count,
+            select(func.count(Image.id)).filter(Image.user_id == User.id),
+        ),
+    }
+    fixed = {}
+    for name, (model, counter, count) in counters.items():
+        count = count.scalar_subquery()
+        result = await db.execute(
+            update(model)
+            .filter(counter != count)
+            .values({counter: count})
+            .execution_options(synchronize_session=False)
+        )
+        fixed[name] = result.rowcount
+    await db.commit()
+    return fixed
@@ -1,13 +1,117 @@
-from sqlalchemy.orm import Session
-from sqlalchemy.exc import NoResultFound
-from src.database.models import Image, Tag
-from typing import List
-import shutil
-from sqlalchemy import and_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from src.database.connection import read_only_bind
+from src.database.models import Image, ImageTagAssociation, Tag, User, description_document
+from src.services import storage
+from datetime import datetime
+import re
+from typing import List, Optional, Tuple
+from sqlalchemy import and_, column, select, delete, func, literal_column, table, tuple_, update
+
+# External content FTS5 table of image descriptions, created for SQLite only
+images_fts = table("images_fts", column("rowid"), column("description"))
+
+
+async def resolve_tags(tag_names: List[str], db: AsyncSession) -> List[Tag]:
+    """
+    Gets tags by names, creating the missing ones.
+
+    Existing tags are fetched with one IN query, missing tags are inserted with a single
+    INSERT ... ON CONFLICT (name) DO NOTHING RETURNING. Tags inserted concurrently by another
+    request are not returned by the insert and are fetched with one more query.
+
+    Parameters:
+    - tag_names: names of the tags, duplicates and empty names are skipped.
+    - db: SQLAlchemy database session object.
+
+    Returns:
+    - List[Tag]: tags in the order of tag_names.
+    """
+    names = list(dict.fromkeys(name.strip() for name in tag_names if name and name.strip()))
+    if not names:
+        return []
+
+    result = await db.execute(select(Tag).filter(Tag.name.in_(names)))
+    found = {tag.name: tag for tag in result.scalars()}
+
+    missing = [name for name in names if name not in found]
+    if missing:
+        dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+        result = await db.scalars(
+            dialect.insert(Tag)
+            .on_conflict_do_nothing(index_elements=[Tag.name])
+            .returning(Tag),
+            [{"name": name} for name in missing],
+        )
+        found.update({tag.name: tag for tag in result})
+
+    conflicted = [name for name in names if name not in found]
+    if conflicted:
+        result = await db.execute(select(Tag).filter(Tag.name.in_(conflicted)))
+        found.update({tag.name: tag for tag in result.scalars()})
+
+    return [found[name] for name in names]
+
+
+async def lock_blob(file_hash: str, db: AsyncSession) -> None:
+    """
+    Locks the blob of file_hash until the end of the transaction.
+
+    Uploads and deletes of the same content take this lock, so a blob can't be removed
+    by the delete of its last reference while a new image with the same content is being created.
+    SQLite (tests) serializes writers anyway and needs no lock.
+
+    Parameters:
+    - file_hash: sha256 of the image content.
+    - db: SQLAlchemy database session object.
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        await db.execute(select(func.pg_advisory_xact_lock(func.hashtext(file_hash))))
+
+
+async def remove_unreferenced_blob(file_hash: str, db: AsyncSession) -> None:
+    """
+    Removes the blob of file_hash if no image references it.
+
+    The check runs in a new transaction under the blob lock, uploads of the same content wait for it
+    or are counted, and this transaction holds no row locks, so it can't deadlock with create_image.
+
+    Parameters:
+    - file_hash: sha256 of the image content.
+    - db: SQLAlchemy database session object without a transaction in progress.
+    """
+    await lock_blob(file_hash, db)
+    result = await db.execute(select(func.count(Image.id)).filter(Image.file_hash == file_hash))
+    if not result.scalar():
+        await storage.remove_blob(file_hash)
+    await db.commit()
+
+
+async def count_images(user_id: Optional[int], tag_ids: List[int], delta: int, db: AsyncSession) -> None:
+    """
+    Adds delta to the image counters of a user and of tags, in the transaction of the change.
+
+    Parameters:
+    - user_id: owner of the images, None to leave users unchanged.
+    - tag_ids: identifiers of the tags.
+    - delta: number of added (positive) or removed (negative) images.
+    - db: SQLAlchemy database session object.
+    """
+    if user_id is not None:
+        await db.execute(
+            update(User).filter(User.id == user_id).values(image_count=User.image_count + delta)
+        )
+    if tag_ids:
+        await db.execute(
+            update(Tag)
+            .filter(Tag.id.in_(tag_ids))
+            .values(image_count=Tag.image_count + delta)
+        )
 
 
 async def create_image(
-    file, user_id: int, description: str, tags: List[str], db: Session
+    file, user_id: int, description: str, tags: List[str], db: AsyncSession
 ) -> Image:
     """
     Creates an image, stores it on the server, and associates it with tags.
@@ -22,39 +126,50 @@ async def create_image(
     Returns:
     - Images: An Images object representing the generated image.
     """
-    # Creating an Image Object
-    image = Image(user_id=user_id, description=description)
-    db.add(image)
-    db.commit()
-    db.refresh(image)
-
-    # Iterate over tags and create or get from database
-    for tag_name in tags:
-        try:
-            # Trying to find a tag in the database
-            tag = db.query(Tag).filter(Tag.name == tag_name).one()
-        except NoResultFound:
-            # Create a new tag if not found
-            tag = Tag(name=tag_name)
-            db.add(tag)
-            db.commit()
-
-        # Attaching a tag to an image
-        image.tags.append(tag)
-
-    # Saving an image file on the server
-    with open(f"images/{image.id}_{file.filename}", "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-
-    # Updating the path to an image file in an Image object
-    image.path = f"images/{image.id}_{file.filename}"
-    db.commit()
+    # Release the connection held since authentication, the file copy below doesn't need it
+    if db.in_transaction():
+        await db.commit()
+
+    # Streaming the file into a temporary file, without any DB work in progress
+    stored = await storage.save_upload(file)
+
+    # Set once the blob was written by this upload, a failed upload has to remove it again
+    created = False
+    try:
+        # Getting existing tags and inserting missing ones in two statements
+        image_tags = await resolve_tags(tags, db)
+
+        # Creating an Image Object pointing to the content-addressed blob
+        image = Image(
+            user_id=user_id,
+            description=description,
+            tags=image_tags,
+            path=storage.blob_path(stored.sha256),
+            file_size=stored.size,
+            file_hash=stored.sha256,
+        )
+        db.add(image)
+        await db.flush()
+
+        # Same content is stored once, the file is only written if no image references it yet
+        await lock_blob(stored.sha256, db)
+        created = await storage.store_blob(stored)
+        # Counters are updated last, their rows stay locked only until the commit
+        await count_images(user_id, [tag.id for tag in image_tags], 1, db)
+        await db.commit()
+    except BaseException:
+        await db.rollback()
+        await storage.discard(stored.path)
+        if created:
+            # The lock ended with the transaction, an upload of the same content may have reused the blob
+            await remove_unreferenced_blob(stored.sha256, db)
+        raise
 
     # Returning an Image object
     return image
 
 
-async def get_image(image_id: int, user_id: int, db: Session):
+async def get_image(image_id: int, user_id: int, db: AsyncSession):
     """
         Retrieves an image by its ID and user ID.
 
@@ -66,15 +181,177 @@ async def get_image(image_id: int, user_id: int, db: Session):
         Returns:
         - Image: An Image object representing the requested image, or None if no image was found.
         """
-    return (
-        db.query(Image)
-        .filter(and_(Image.id == image_id, Image.user_id == user_id))
-        .first()
+    result = await db.execute(
+        select(Image)
+        .options(selectinload(Image.tags))
+        .filter(and_(Image.id == image_id, Image.user_id == user_id)),
+        bind_arguments=await read_only_bind(),
     )
+    return result.scalar()
+
+
+async def get_images_by_ids(image_ids: List[int], db: AsyncSession) -> List[Image]:
+    """
+    Retrieves images by their IDs, keeping the order of image_ids.
+
+    Parameters:
+    - image_ids: image identifiers, missing images are skipped.
+    - db: SQLAlchemy database session object.
+
+    Returns:
+    - List[Image]: found images with loaded tags.
+    """
+    if not image_ids:
+        return []
+    result = await db.execute(
+        select(Image).options(selectinload(Image.tags)).filter(Image.id.in_(image_ids)),
+        bind_arguments=await read_only_bind(),
+    )
+    images = {image.id: image for image in result.scalars()}
+    return [images[image_id] for image_id in image_ids if image_id in images]
+
+
+async def get_feed(
+    db: AsyncSession,
+    limit: int,
+    after: Optional[Tuple[datetime, int]] = None,
+    user_id: Optional[int] = None,
+    tag: Optional[str] = None,
+) -> List[Image]:
+    """
+    Retrieves one page of images, newest first.
+
+    Pages are cut by keyset on (created_at, id) instead of OFFSET, so every page is a short
+    backward scan of ix_images_created_at_id (ix_images_user_id_created_at_id for a user feed)
+    starting right after the last row of the previous page.
+
+    Parameters:
+    - db: SQLAlchemy database session object.
+    - limit: maximum number of images on the page.
+    - after: (created_at, id) of the last image of the previous page, None for the first page.
+    - user_id: only images of this user, None for every user.
+    - tag: only images with this tag, None for any tags.
+
+    Returns:
+    - List[Image]: images of the page with loaded tags.
+    """
+    stmt = select(Image).options(selectinload(Image.tags))
+    if user_id is not None:
+        stmt = stmt.filter(Image.user_id == user_id)
+    if tag is not None:
+        stmt = stmt.join(
+            ImageTagAssociation, ImageTagAssociation.image_id == Image.id
+        ).join(Tag, and_(Tag.id == ImageTagAssociation.tag_id, Tag.name == tag))
+    if after is not None:
+        stmt = stmt.filter(tuple_(Image.created_at, Image.id) < tuple_(*after))
+
+    result = await db.execute(
+        stmt.order_by(Image.created_at.desc(), Image.id.desc()).limit(limit),
+        bind_arguments=await read_only_bind(),
+    )
+    return list(result.scalars())
+
+
+def tags_filter(tags: List[str], match_all: bool):
+    """
+    Builds the filter of images having all or any of the tags.
+
+    Image ids are read from ix_image_tags_tag_id_image_id for each tag, so the cost depends
+    on the number of images with these tags, not on the size of the images table.
+
+    Parameters:
+    - tags: names of the tags.
+    - match_all: True - images with every tag, False - images with at least one of them.
+
+    Returns:
+    - filter clause on Image.id.
+    """
+    names = list(dict.fromkeys(tags))
+    image_ids = (
+        select(ImageTagAssociation.image_id)
+        .join(Tag, Tag.id == ImageTagAssociation.tag_id)
+        .filter(Tag.name.in_(names))
+    )
+    if match_all:
+        # Primary key of image_tags makes every (image, tag) pair unique
+        image_ids = image_ids.group_by(ImageTagAssociation.image_id).having(
+            func.count() == len(names)
+        )
+    return Image.id.in_(image_ids)
+
+
+def description_filter(text: str, dialect: str):
+    """
+    Builds the full-text filter of images whose description has every word of text.
+
+    PostgreSQL matches the GIN index ix_images_description_fts, SQLite the images_fts table.
+    Words are passed as plain terms, so the search syntax of the engines can't be injected.
+
+    Parameters:
+    - text: words to search for.
+    - dialect: name of the database dialect.
+
+    Returns:
+    - filter clause on Image.id, None if text has no words.
+    """
+    words = re.findall(r"\w+", text)
+    if not words:
+        return None
+    if dialect == "postgresql":
+        return description_document(Image.description).bool_op("@@")(
+            func.plainto_tsquery(literal_column("'english'::regconfig"), " ".join(words))
+        )
+    return Image.id.in_(
+        select(images_fts.c.rowid).filter(
+            images_fts.c.description.match(" ".join(f'"{word}"' for word in words))
+        )
+    )
+
+
+async def search_images(
+    db: AsyncSession,
+    limit: int,
+    after: Optional[Tuple[datetime, int]] = None,
+    tags: Optional[List[str]] = None,
+    match_all: bool = True,
+    text: Optional[str] = None,
+) -> List[Image]:
+    """
+    Searches images by tags and description, newest first.
+
+    Pages are cut by keyset on (created_at, id) like the feed.
+
+    Parameters:
+    - db: SQLAlchemy database session object.
+    - limit: maximum number of images on the page.
+    - after: (created_at, id) of the last image of the previous page, None for the first page.
+    - tags: only images with these tags, None for any tags.
+    - match_all: True - images must have every tag, False - any of the tags.
+    - text: words the description must contain, None for any description.
+
+    Returns:
+    - List[Image]: images of the page with loaded tags.
+    """
+    stmt = select(Image).options(selectinload(Image.tags))
+    if tags:
+        stmt = stmt.filter(tags_filter(tags, match_all))
+    if text:
+        condition = description_filter(text, db.get_bind().dialect.name)
+        if condition is None:
+            return []
+        stmt = stmt.filter(condition)
+    if after is not None:
+        stmt = stmt.filter(tuple_(Image.created_at, Image.id) < tuple_(*after))
+
+    result = await db.execute(
+        stmt.order_by(Image.created_at.desc(), Image.id.desc()).limit(limit),
+        bind_arguments=await read_only_bind(),
+    )
+    return list(result.scalars())
 
 
 async def change_description(
-    image_id: int, user_id: int, description: str, db: Session
+    image_id: int, user_id: int, description: str, db: AsyncSession
 ):
     """
     Changes the image description.
@@ -89,21 +366,57 @@ async def change_description(
     - Optional[Image]: An Image object representing the modified image, or None if no image was found.
     """
     # Search for an image by identifiers
-    image = (
-        db.query(Image)
+    result = await db.execute(
+        select(Image)
+        .options(selectinload(Image.tags))
         .filter(and_(Image.id == image_id, Image.user_id == user_id))
-        .first()
     )
+    image = result.scalar()
 
     # If an image is found, change the description and save the changes to the database
     if image:
         image.description = description
-        db.commit()
+        await db.commit()
 
     return image
 
 
-async def delte_image_by_id(image_id: int, user_id: int, db: Session) -> bool:
+async def update_tags(
+    image_id: int, user_id: int, tags: List[str], db: AsyncSession
+) -> Tuple[Optional[Image], List[str]]:
+    """
+    Replaces the tags of an image.
+
+    Parameters:
+    - image_id: image identifier.
+    - user_id: user identifier.
+    - tags: new list of tags of the image.
+    - db: SQLAlchemy database session object.
+
+    Returns:
+    - Tuple[Optional[Image], List[str]]: An Image object with the new tags, or None if no image was found,
+      and the names of the tags added to the image.
+    """
+    result = await db.execute(
+        select(Image)
+        .options(selectinload(Image.tags))
+        .filter(and_(Image.id == image_id, Image.user_id == user_id))
+    )
+    image = result.scalar()
+    if not image:
+        return None, []
+
+    old_ids = {tag.id for tag in image.tags}
+    image.tags = await resolve_tags(tags, db)
+    new_ids = {tag.id for tag in image.tags}
+    await count_images(None, list(old_ids - new_ids), -1, db)
+    await count_images(None, list(new_ids - old_ids), 1, db)
+    await db.commit()
+
+    return image, [tag.name for tag in image.tags if tag.id not in old_ids]
+
+
+async def delte_image_by_id(image_id: int, user_id: int, db: AsyncSession) -> bool:
     """
     Deletes an image by its ID and user ID.
 
@@ -115,15 +428,30 @@ async def delte_image_by_id(image_id: int, user_id: int, db: Session) -> bool:
     Returns:
     - bool: True if the image was successfully deleted, otherwise False.
     """
-    # Search and remove an image from the database
-    image = (
-        db.query(Image)
-        .filter(and_(Image.id == image_id, Image.user_id == user_id))
-        .delete()
+    image_filter = and_(Image.id == image_id, Image.user_id == user_id)
+
+    # Search and remove an image and its tag links from the database
+    result = await db.execute(
+        delete(ImageTagAssociation)
+        .filter(ImageTagAssociation.image_id.in_(select(Image.id).filter(image_filter)))
+        .returning(ImageTagAssociation.tag_id)
+    )
+    tag_ids = list(result.scalars())
+    result = await db.execute(
+        delete(Image).filter(image_filter).returning(Image.file_hash, Image.user_id)
     )
+    image = result.first()
+    if image is None:
+        await db.rollback()
+        return False
+    await count_images(image.user_id, tag_ids, -1, db)
 
     # Saving changes to the database
-    if image:
-        db.commit()
+    await db.commit()
 
-    return image
+    # Removing the blob when no other image references the same content.
+    # The file goes only after the commit, a rolled back delete keeps it.
+    if image.file_hash:
+        await remove_unreferenced_blob(image.file_hash, db)
+
+    return True
@@ -1,61 +1,209 @@
-from datetime import datetime, timedelta
+import asyncio
+import hashlib
+import logging
+import time
+from typing import Optional
 
-from sqlalchemy import select, delete
-from sqlalchemy.orm import Session
+from redis.exceptions import RedisError
 
 from config import settings
-from src.database.models import TokenBL
+from src.database.cache import redis_client
+from src.services.bloom_filter import BloomFilter
 
+BLACKLIST_PREFIX = "blacklist:"
+BLACKLIST_CHANNEL = "blacklist:revoked"
+# Seconds between attempts to restore the blacklist sync after Redis failed
+SYNC_RETRY_DELAY = 5
 
-async def add_token_to_blacklist(email: str, token: str, db: Session) -> bool:
+logger = logging.getLogger(__name__)
+
+# Per-process front for the Redis blacklist, a miss means the token was never revoked
+blacklist_filter = BloomFilter(
+    settings.blacklist_bloom_capacity, settings.blacklist_bloom_error_rate
+)
+# The filter is trusted only while subscribed to revocations of other workers
+blacklist_synced = False
+# Digests revoked while a new filter is being loaded, added to it when the scan ends
+rebuild_pending: Optional[set] = None
+# Tokens revoked while Redis was unavailable, digest -> (email, expires_at), saved when the sync is restored
+unsaved_revocations: dict[str, tuple[str, int]] = {}
+
+
+def token_digest(token: str) -> str:
     """
-    The function adding token in blacklist in the database.
-        It takes email from access token, token itself and add them into blacklist. Return True when it's done.
+    The token_digest function returns sha256 hex digest of token, used as blacklist key instead of full token.
+
+    :param token: str: User access token.
+    :return: Hex digest.
+    :doc-author: yarmel
+    """
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+async def add_token_to_blacklist(email: str, token: str, expires_at: int) -> bool:
+    """
+    The function adding token in Redis blacklist.
+        It takes email from access token, token itself and its expiration timestamp.
+        Key lives in Redis only for the token's remaining lifetime, so expired records clear themselves.
+        Other workers receive the token digest through pub/sub and add it to their Bloom filters.
+        If Redis is unavailable the token is revoked in this worker only and saved to Redis
+        when the blacklist sync is restored.
 
     :param email: str: User email.
     :param token: str: User access token.
-    :param db: Session: Get the database session
-    :return: True if it successful.
+    :param expires_at: int: Token "exp" claim, unix timestamp.
+    :return: True if it successful, False if token already blacklisted.
     :doc-author: yarmel
     """
-    token_exists = db.execute(select(TokenBL).filter(TokenBL.token == token)).scalar()
-    if token_exists:
-        return False
+    ttl = int(expires_at - time.time())
+    if ttl <= 0:
+        return True
+
+    digest = token_digest(token)
+    try:
+        if not await redis_client.set(BLACKLIST_PREFIX + digest, email, ex=ttl, nx=True):
+            return False
+    except RedisError:
+        logger.warning("Redis is unavailable, token revoked in this worker only")
+        if digest in unsaved_revocations:
+            return False
+        remember_revoked(digest)
+        unsaved_revocations[digest] = (email, expires_at)
+        return True
 
-    tokens_table = TokenBL()
-    tokens_table.email = email
-    tokens_table.token = token
-    db.add(tokens_table)
-    db.commit()
+    remember_revoked(digest)
+    try:
+        await redis_client.publish(BLACKLIST_CHANNEL, digest)
+    except RedisError:
+        # The key is saved, other workers pick it up on their next rebuild
+        pass
     return True
 
 
-async def is_token_blacklisted(token: str, db: Session) -> bool:
+def remember_revoked(digest: str) -> None:
+    blacklist_filter.add(digest)
+    if rebuild_pending is not None:
+        rebuild_pending.add(digest)
+
+
+async def is_token_blacklisted(token: str) -> bool:
     """
-    The function checking if token exists in database blacklist.
-        It takes token from user and try to find it in database, return True if successful.
+    The function checking if token exists in blacklist.
+        Bloom filter answers "not revoked" without network, only possible hits are confirmed in Redis.
+        While the sync with other workers is down every token is checked in Redis.
+        If Redis is unavailable the Bloom filter of this worker decides, so only tokens
+        revoked in this worker or loaded before the outage are rejected.
 
     :param token: str: User access token.
-    :param db: Session: Get the database session
-    :return: True if it successful.
+    :return: True if token blacklisted.
     :doc-author: yarmel
     """
-    if db.execute(select(TokenBL).filter(TokenBL.token == token)).scalar():
-        return True
+    digest = token_digest(token)
+    if blacklist_synced and digest not in blacklist_filter:
+        return False
+    try:
+        return bool(await redis_client.exists(BLACKLIST_PREFIX + digest))
+    except RedisError:
+        logger.warning("Redis is unavailable, token checked against the local blacklist")
+        return digest in blacklist_filter
+
+
+async def save_revocations() -> None:
+    """
+    The function saving tokens revoked during a Redis outage to Redis and announcing them to other workers.
+        Tokens that expired meanwhile are dropped.
+
+    :return: None.
+    :doc-author: yarmel
+    """
+    for digest, (email, expires_at) in list(unsaved_revocations.items()):
+        ttl = int(expires_at - time.time())
+        if ttl > 0:
+            await redis_client.set(BLACKLIST_PREFIX + digest, email, ex=ttl, nx=True)
+            await redis_client.publish(BLACKLIST_CHANNEL, digest)
+        del unsaved_revocations[digest]
+
+
+async def load_blacklist() -> BloomFilter:
+    """
+    The function building a new Bloom filter from blacklist keys that are still alive in Redis.
+
+    :return: Filled BloomFilter.
+    :doc-author: yarmel
+    """
+    bloom = BloomFilter(settings.blacklist_bloom_capacity, settings.blacklist_bloom_error_rate)
+    async for key in redis_client.scan_iter(match=BLACKLIST_PREFIX + "*", count=1000):
+        bloom.add(key[len(BLACKLIST_PREFIX):])
+    return bloom
+
+
+async def rebuild_blacklist() -> None:
+    """
+    The function replacing the Bloom filter with a new one loaded from Redis.
+        Tokens revoked while the keys are scanned may be missed by the scan,
+        they are collected meanwhile and added to the new filter.
+
+    :return: None.
+    :doc-author: yarmel
+    """
+    global blacklist_filter, rebuild_pending
+
+    rebuild_pending = set()
+    try:
+        bloom = await load_blacklist()
+        for digest in rebuild_pending:
+            bloom.add(digest)
+        blacklist_filter = bloom
+    finally:
+        rebuild_pending = None
 
 
-async def clear_expires_records(db: Session):
+async def sync_blacklist() -> None:
     """
-    The function checking if token exists in database blacklist.
-        Just clear expires access tokens from blacklist in database.
+    The function keeping the Bloom filter in sync with other workers until cancelled.
+        Subscription starts before the scan, so tokens revoked during the scan are not missed.
+        When the filter is over capacity it's rebuilt, expired tokens are dropped on rebuild.
+        If Redis fails, the failure is logged and the sync starts over after SYNC_RETRY_DELAY,
+        revocations missed meanwhile are picked up by the rebuild and tokens revoked
+        in this worker meanwhile are saved to Redis before it.
 
-    :param db: Session: Get the database session
     :return: None.
     :doc-author: yarmel
     """
+    global blacklist_synced
 
-    # We remove tokens from the database that were added before their expiration date
+    while True:
+        pubsub = redis_client.pubsub()
+        try:
+            await pubsub.subscribe(BLACKLIST_CHANNEL)
+            await save_revocations()
+            await rebuild_blacklist()
+            blacklist_synced = True
+            async for message in pubsub.listen():
+                if message["type"] != "message":
+                    continue
+                remember_revoked(message["data"])
+                if blacklist_filter.saturated:
+                    await rebuild_blacklist()
+        except Exception:
+            logger.exception("Token blacklist sync failed, retrying in %s s", SYNC_RETRY_DELAY)
+        else:
+            logger.warning("Token blacklist subscription closed, retrying in %s s", SYNC_RETRY_DELAY)
+        finally:
+            blacklist_synced = False
+            try:
+                await pubsub.reset()
+            except Exception:
+                pass
+        await asyncio.sleep(SYNC_RETRY_DELAY)
 
-    expired_time = datetime.utcnow() - timedelta(minutes=settings.expires_delta_access_token)
-    db.execute(delete(TokenBL).where(TokenBL.added_at < expired_time))
-    db.commit()
+
+async def start_blacklist_sync() -> asyncio.Task:
+    """
+    The function starting the blacklist sync in the background.
+        Redis isn't awaited here, until the sync is up tokens are checked in Redis directly.
+
+    :return: Task running sync_blacklist.
+    :doc-author: yarmel
+    """
+    return asyncio.create_task(sync_blacklist())
@@ -1,224 +1,423 @@
+import asyncio
+import logging
 from typing import Optional
 
-from sqlalchemy import select, func, update
-from sqlalchemy.orm import Session
+from redis.exceptions import RedisError
+from sqlalchemy import or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import make_transient_to_detached
 
+from config import settings
+from src.database.cache import redis_client
 from src.database.models import User
 from src.schemas.users import UserModel, UserDb, UserProfileUpdate
+from src.services.ttl_cache import TTLCache
 
+USER_CACHE_CHANNEL = "users:invalidate"
+# Seconds between attempts to restore the user cache sync after Redis failed
+SYNC_RETRY_DELAY = 5
 
-async def create_user(body: UserModel, db: Session) -> User:
+logger = logging.getLogger(__name__)
+
+# Detached User snapshots by email for get_current_user
+user_cache = TTLCache(settings.auth_cache_size, settings.auth_cache_ttl)
+# Snapshots are served only while invalidations of other workers are received
+user_cache_synced = False
+# Incremented by every invalidation, a snapshot loaded before one is not cached
+user_cache_generation = 0
+
+
+# Set once this worker saw a user created, later users can't be the first one
+users_exist = False
+
+
+async def create_user(body: UserModel, db: AsyncSession) -> User:
     """
     The function adding user in database.
         It takes user data and add it in database, return dictionary if successful.
+        The first user of the database becomes admin: until this worker saw a user created,
+        is_admin is set by NOT EXISTS in the INSERT itself, which stops at the first row,
+        afterwards new users are inserted as plain users without looking at the table.
 
     :param body: UserModel: User model object, which is validated by pydantic.
-    :param db: Session: Get the database session
+    :param db: AsyncSession: Get the database session
     :return: A dictionary with the user.
     :doc-author: yarmel
     """
+    global users_exist
+
     user = User(**body.dict())
+    if not users_exist:
+        user.is_admin = ~select(User.id).exists()
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
+    users_exist = True
 
     return user
 
 
-async def users_count(db: Session) -> int:
+async def find_registered(email: str, username: str, db: AsyncSession) -> tuple[bool, bool]:
     """
-    The function count users in database.
-        Just return count of user in database.
+    The function checking if email and username are already taken, with one query.
+        Both columns are unique, so at most two rows can match.
 
-    :param db: Session: Get the database session
-    :return: int value with count of users.
+    :param email: str: User email.
+    :param username: str: User username.
+    :param db: AsyncSession: Get the database session
+    :return: Whether the email and whether the username are registered.
     :doc-author: yarmel
     """
-    return int(db.execute(func.count(User.id)).scalar())
-
-
-async def get_user_by_email(email: str, db: Session) -> Optional[User]:
+    result = await db.execute(
+        select(User.email, User.username)
+        .filter(or_(User.email == email, User.username == username))
+        .limit(2)
+    )
+    rows = result.all()
+    return (
+        any(row.email == email for row in rows),
+        any(row.username == username for row in rows),
+    )
+
+
+async def get_user_by_email(email: str, db: AsyncSession) -> Optional[User]:
     """
     The function count users in database.
         It will try to find user in database by using email.
 
     :param email: str: User email.
-    :param db: Session: Get the database session
+    :param db: AsyncSession: Get the database session
     :return: User data.
     :doc-author: yarmel
     """
-    return db.execute(select(User).filter(User.email == email)).scalar()
+    # Login right after signup and checks before an update must see the latest row, so no replica
+    result = await db.execute(select(User).filter(User.email == email))
+    return result.scalar()
 
 
-async def get_user_by_username(username: str, db: Session) -> Optional[User]:
+async def get_user_by_username(username: str, db: AsyncSession) -> Optional[User]:
     """
     The function count users in database.
         It will try to find user in database by using email.
 
     :param username: str: User username.
-    :param db: Session: Get the database session
+    :param db: AsyncSession: Get the database session
     :return: User data.
     :doc-author: yarmel
     """
-    return db.execute(select(User).filter(User.username == username)).scalar()
+    result = await db.execute(select(User).filter(User.username == username))
+    return result.scalar()
 
 
-async def update_token(user: User, token: str | None, db: Session) -> None:
+async def get_cached_user_by_email(email: str, db: AsyncSession) -> Optional[User]:
+    """
+    The function getting authenticated user by email through the in-process user cache.
+        On a miss user is loaded from the primary database and a detached snapshot is cached,
+        a lagging replica could return the row as it was before the last invalidation.
+        On a hit the snapshot is merged into the session without a query.
+        A row loaded while the user was invalidated may already be stale, it's returned but not cached.
+
+    :param email: str: User email.
+    :param db: AsyncSession: Get the database session
+    :return: User data.
+    :doc-author: yarmel
+    """
+    snapshot = user_cache.get(email) if user_cache_synced else None
+    if snapshot is not None:
+        return await db.merge(snapshot, load=False)
+
+    generation = user_cache_generation
+    result = await db.execute(select(User).filter(User.email == email))
+    user = result.scalar()
+    if user is not None and user_cache_synced and generation == user_cache_generation:
+        snapshot = User(**{attr.key: getattr(user, attr.key) for attr in User.__mapper__.column_attrs})
+        make_transient_to_detached(snapshot)
+        user_cache.set(email, snapshot)
+    return user
+
+
+async def invalidate_user(user: User) -> None:
+    """
+    The function dropping cached snapshots of user in this and other workers.
+        Snapshots are matched by id, so entries under an old email are dropped as well.
+        If Redis is unavailable other workers drop the snapshot when its TTL ends.
+
+    :param user: User: User which data was changed.
+    :return: None.
+    :doc-author: yarmel
+    """
+    drop_cached_user(user.id)
+    try:
+        await redis_client.publish(USER_CACHE_CHANNEL, user.id)
+    except RedisError:
+        pass
+
+
+def drop_cached_user(user_id: int) -> None:
+    global user_cache_generation
+
+    user_cache_generation += 1
+    user_cache.remove_if(lambda cached: cached.id == user_id)
+
+
+async def sync_user_cache() -> None:
+    """
+    The function listening for user invalidations published by other workers until cancelled.
+        If Redis fails, the failure is logged and the sync starts over after SYNC_RETRY_DELAY.
+        Invalidations may be missed meanwhile, so the cache is bypassed until the subscription
+        is back and cleared when it is.
+
+    :return: None.
+    :doc-author: yarmel
+    """
+    global user_cache_synced, user_cache_generation
+
+    while True:
+        pubsub = redis_client.pubsub()
+        try:
+            await pubsub.subscribe(USER_CACHE_CHANNEL)
+            user_cache.clear()
+            # Invalidations missed during the outage may concern loads still in progress
+            user_cache_generation += 1
+            user_cache_synced = True
+            async for message in pubsub.listen():
+                if message["type"] == "message":
+                    drop_cached_user(int(message["data"]))
+        except Exception:
+            logger.exception("User cache sync failed, retrying in %s s", SYNC_RETRY_DELAY)
+        else:
+            logger.warning("User cache subscription closed, retrying in %s s", SYNC_RETRY_DELAY)
+        finally:
+            user_cache_synced = False
+            try:
+                await pubsub.reset()
+            except Exception:
+                pass
+        await asyncio.sleep(SYNC_RETRY_DELAY)
+
+
+async def start_user_cache_sync() -> asyncio.Task:
+    """
+    The function starting the user cache sync in the background, Redis isn't awaited here.
+
+    :return: Task running sync_user_cache.
+    :doc-author: yarmel
+    """
+    return asyncio.create_task(sync_user_cache())
+
+
+async def update_token(user: User, token: str | None, db: AsyncSession) -> None:
     """
     The function update user token in database.
-        It will update user token in database.
+        It will store the hash of the jti of the new refresh token.
+
+    :param user: User: User object from database.
+    :param token: str | None: Hash of the refresh token jti, None to revoke it.
+    :param db: AsyncSession: Get the database session
+    :return: None.
+    :doc-author: yarmel
+    """
+    user.refresh_token_hash = token
+    await db.commit()
+
+
+async def rotate_token(email: str, token: str, new_token: str, db: AsyncSession) -> bool:
+    """
+    The function replacing refresh token of a user if the presented one is still valid.
+        Lookup, comparison and rotation are one UPDATE ... RETURNING, so the same refresh token
+        can't be used twice, even by concurrent requests.
+
+    :param email: str: User email from the refresh token.
+    :param token: str: Hash of the jti of the presented refresh token.
+    :param new_token: str: Hash of the jti of the new refresh token.
+    :param db: AsyncSession: Get the database session
+    :return: True if the token was rotated, False if the user or the token is unknown.
+    :doc-author: yarmel
+    """
+    result = await db.execute(
+        update(User)
+        .filter(User.email == email, User.refresh_token_hash == token)
+        .values(refresh_token_hash=new_token)
+        .returning(User.id)
+        .execution_options(synchronize_session=False)
+    )
+    rotated = result.scalar() is not None
+    await db.commit()
+    return rotated
 
-    :param user: User: User email.
-    :param token: str | None: Token.
-    :param db: Session: Get the database session
+
+async def revoke_token(email: str, db: AsyncSession) -> None:
+    """
+    The function revoking refresh token of a user, e.g. when a used token is presented again.
+
+    :param email: str: User email.
+    :param db: AsyncSession: Get the database session
     :return: None.
     :doc-author: yarmel
     """
-    user.refresh_token = token
-    db.commit()
+    await db.execute(
+        update(User)
+        .filter(User.email == email)
+        .values(refresh_token_hash=None)
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
 
 
-async def assign_admin_role(user: User, db: Session) -> User:
+async def assign_admin_role(user: User, db: AsyncSession) -> User:
     """
     The assign_admin_role assigning admin role to a user in the database.
 
     :param user: User: User object from database.
-    :param db: Session: Access the database.
+    :param db: AsyncSession: Access the database.
     :return: User object after assigned.
     :doc-author: yarmel
     """
     user.is_admin = True
-    db.commit()
+    await db.commit()
+    await invalidate_user(user)
     return user
 
 
-async def remove_admin_role(user: User, db: Session) -> User:
+async def remove_admin_role(user: User, db: AsyncSession) -> User:
     """
     The remove_admin_role function removes admin role from a user in the database.
 
     :param user: User: User object from database.
-    :param db: Session: Access the database.
+    :param db: AsyncSession: Access the database.
     :return: User object after removing.
     :doc-author: yarmel
     """
     user.is_admin = False
-    db.commit()
+    await db.commit()
+    await invalidate_user(user)
     return user
 
 
-async def assign_moderator_role(user: User, db: Session) -> User:
+async def assign_moderator_role(user: User, db: AsyncSession) -> User:
     """
     The assign_moderator_role assigning moderator role to a user in the database.
 
     :param user: User: User object from database.
-    :param db: Session: Access the database.
+    :param db: AsyncSession: Access the database.
     :return: User object after assigned.
     :doc-author: yarmel
     """
     user.is_moderator = True
-    db.commit()
+    await db.commit()
+    await invalidate_user(user)
     return user
 
 
-async def remove_moderator_role(user: User, db: Session) -> User:
+async def remove_moderator_role(user: User, db: AsyncSession) -> User:
     """
     The remove_moderator_role function removes moderator role from a user in the database.
 
     :param user: User: User object from database.
-    :param db: Session: Access the database.
+    :param db: AsyncSession: Access the database.
     :return: User object after removing.
     :doc-author: yarmel
     """
     user.is_moderator = False
-    db.commit()
+    await db.commit()
+    await invalidate_user(user)
     return user
 
 
-async def edit_user(username: str, body: UserProfileUpdate, db: Session) -> Optional[User]:
+async def edit_user(username: str, body: UserProfileUpdate, db: AsyncSession) -> Optional[User]:
     """
     The edit_user function updates a user in the database.
 
     :param username: str: Username string from user input.
     :param body: UserDb: Pass the data to be updated.
-    :param db: Session: Access the database.
+    :param db: AsyncSession: Access the database.
     :return: User object after updating.
     :doc-author: yarmel
     """
     user_body = {key: val for key, val in body.dict().items() if val is not None}
 
-    user = db.execute(
+    result = await db.execute(
         update(User)
         .values(**user_body)
         .filter((User.username == username))
         .returning(User)
-    ).scalar()
+    )
+    user = result.scalar()
 
-    db.commit()
+    await db.commit()
+    if user is not None:
+        await invalidate_user(user)
 
     return user
 
 
-async def update_user(user: User, body: UserDb, db: Session) -> Optional[User]:
+async def update_user(user: User, body: UserDb, db: AsyncSession) -> Optional[User]:
     """
     The update_user function updates a user in the database.
 
     :param user: User: User object from database.
     :param body: UserDb: Pass the data to be updated.
-    :param db: Session: Access the database.
+    :param db: AsyncSession: Access the database.
     :return: User object after updating.
     :doc-author: yarmel
     """
     user_body = {key: val for key, val in body.dict().items() if val is not None}
 
-    user = db.execute(
+    result = await db.execute(
         update(User)
         .values(**user_body)
         .filter((User.email == user.email))
         .returning(User)
-    ).scalar()
+    )
+    user = result.scalar()
 
-    db.commit()
+    await db.commit()
+    if user is not None:
+        await invalidate_user(user)
 
     return user
 
 
-async def add_ban_user(user: User, db: Session) -> User:
+async def add_ban_user(user: User, db: AsyncSession) -> User:
     """
     The add_ban_user function add a ban status to a user in database.
 
     :param user: User: User object from database.
-    :param db: Session: Access the database.
+    :param db: AsyncSession: Access the database.
     :return: User object after adding.
     :doc-author: yarmel
     """
     user.is_banned = True
-    db.commit()
+    await db.commit()
+    await invalidate_user(user)
     return user
 
 
-async def remove_ban_user(user: User, db: Session) -> User:
+async def remove_ban_user(user: User, db: AsyncSession) -> User:
     """
     The remove_ban_user function removes a ban status from user in database.
 
     :param user: User: User object from database.
-    :param db: Session: Access the database.
+    :param db: AsyncSession: Access the database.
     :return: User object after removing.
     :doc-author: yarmel
     """
     user.is_banned = False
-    db.commit()
+    await db.commit()
+    await invalidate_user(user)
     return user
 
 
-async def delete_user(user: User, db: Session) -> Optional[User]:
+async def delete_user(user: User, db: AsyncSession) -> Optional[User]:
     """
     The delete_user function delete a user from the database.
 
     :param user: User: User object from database.
-    :param db: Session: Access the database.
+    :param db: AsyncSession: Access the database.
     :return: User object before deleted.
     :doc-author: yarmel
     """
-    db.delete(user)
-    db.commit()
+    await db.delete(user)
+    await db.commit()
+    await invalidate_user(user)
     return user
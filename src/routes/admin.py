@@ -1,38 +1,76 @@
-from fastapi import APIRouter, Depends
-from fastapi_limiter.depends import RateLimiter
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, status
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.database.connection import get_db
+from src.database.connection import get_db, get_pool_stats
 from src.database.models import User
-from src.repository import token as token_repository
 from src.repository import users as users_repository
+from src.schemas.jobs import JobCreated
 from src.schemas.users import (
     UserDb,
     UserResponse,
 )
+from src.services import qr as qr_services
 from src.services.auth import auth_service, TokenData
+from src.services.jobs import QUEUED, job_queue
 from src.services.users import users_service
+from src.services.rate_limit import RateLimiter
 
 router = APIRouter(prefix="/admin", tags=["admin"])
 
 
-@router.patch("/clear")
-async def clear_expires_tokens(
+@router.get("/pool")
+async def pool_stats(
         current_user: User = Depends(auth_service.get_current_user),
-        db: Session = Depends(get_db),
 ):
     """
-    The clear_expires_tokens function clear expires access tokens from database.
+    The pool_stats function returns usage of the database connection pool.
+        Shows checked out and overflow connections, timeouts and a histogram of checkout wait times.
         Only for admins users.
 
-        :param db: Session: Access the database.
         :param current_user: User: Get the current user from the auth_service.
-        :return: A dictionary with result of operation.
+        :return: A dictionary with pool statistics.
         :doc-author: yarmel
     """
-    if users_service.admin_check(current_user):
-        await token_repository.clear_expires_records(db)
-        return {"result": "Old blacklisted records was deleted"}
+    if await users_service.admin_check(current_user):
+        return get_pool_stats()
+
+
+@router.get("/workers")
+async def workers_stats(
+        current_user: User = Depends(auth_service.get_current_user),
+):
+    """
+    The workers_stats function returns load of the worker pools used for blocking work.
+        Shows running calls, queue depth and calls rejected with 503.
+        Only for admins users.
+
+        :param current_user: User: Get the current user from the auth_service.
+        :return: A dictionary with worker pools statistics.
+        :doc-author: yarmel
+    """
+    if await users_service.admin_check(current_user):
+        return {
+            "password_hashing": auth_service.password_pool.stats(),
+            "qr_rendering": qr_services.qr_render_pool.stats(),
+        }
+
+
+@router.post("/counters", response_model=JobCreated, status_code=status.HTTP_202_ACCEPTED)
+async def reconcile_counters(
+        current_user: User = Depends(auth_service.get_current_user),
+):
+    """
+    The reconcile_counters function starts a job recounting comments per image and images per tag and user.
+        Counters are kept on every change, the job only fixes drift after changes made outside the API.
+        Only for admins users.
+
+        :param current_user: User: Get the current user from the auth_service.
+        :return: Id of the background job, its result holds the number of fixed rows per table.
+        :doc-author: yarmel
+    """
+    if await users_service.admin_check(current_user):
+        job_id = await job_queue.enqueue("counters", {}, current_user.id)
+        return {"job_id": job_id, "status": QUEUED}
 
 
 @router.patch("/assign", response_model=UserResponse)
@@ -41,7 +79,7 @@ async def assign_role(
         admin: bool = False,
         moderator: bool = False,
         current_user: User = Depends(auth_service.get_current_user),
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
 ):
     """
     The function assign role for a user in the database. Only for admins users.
@@ -53,7 +91,7 @@ async def assign_role(
         :param admin: bool: Check for admin role.
         :param moderator: bool: Check for moderator role.
         :param current_user: User: Get the current user from the auth_service.
-        :param db: Session: Access the database.
+        :param db: AsyncSession: Access the database.
         :return: A dictionary with user with new role.
         :doc-author: yarmel
     """
@@ -81,7 +119,7 @@ async def ban_user(
         username: str,
         banned: bool = True,
         current_user: TokenData = Depends(auth_service.get_current_user),
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
 ):
     """
     The ban_user function set a user status in the database.
@@ -89,7 +127,7 @@ async def ban_user(
 
         :param username: str: Specify a username for updating.
         :param banned: bool: Check for user status. Banned or active user.
-        :param db: Session: Access the database.
+        :param db: AsyncSession: Access the database.
         :param current_user: User: Get the current user from the auth_service.
         :return: A UserResponse model with updated user.
         :doc-author: yarmel
@@ -112,14 +150,14 @@ async def ban_user(
 async def get_user_data(
         username: str,
         current_user: User = Depends(auth_service.get_current_user),
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
 ):
     """
     The get_user_data function takes a user data from database.
         Only for admins users.
 
         :param username: str: Specify a username for updating.
-        :param db: Session: Access the database.
+        :param db: AsyncSession: Access the database.
         :param current_user: User: Get the current user from the auth_service.
         :return: A UserResponse model with updated user.
         :doc-author: yarmel
@@ -138,7 +176,7 @@ async def update_user_data(
         username: str,
         body: UserDb,
         current_user: User = Depends(auth_service.get_current_user),
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
 ):
     """
     WARNING! Dangerous instrument! The update_user_data function updates a user in the database.
@@ -146,7 +184,7 @@ async def update_user_data(
 
         :param username: str: Specify a username for updating.
         :param body: UserDb: Specify the type of data that will be passed in the body.
-        :param db: Session: Access the database.
+        :param db: AsyncSession: Access the database.
         :param current_user: User: Get the current user from the auth_service.
         :return: A UserResponse model with updated user.
         :doc-author: yarmel
@@ -165,14 +203,14 @@ async def update_user_data(
 async def delete_user(
         username: str,
         current_user: TokenData = Depends(auth_service.get_current_user),
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
 ):
     """
     The delete_user function delete a user from database.
         Only for admins users.
 
         :param username: str: Specify a username for deleting.
-        :param db: Session: Access the database.
+        :param db: AsyncSession: Access the database.
         :param current_user: User: Get the current user from the auth_service.
         :return: A UserResponse model with deleted user.
         :doc-author: yarmel
@@ -1,31 +1,49 @@
-from fastapi import APIRouter, UploadFile, File
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File, status
 from fastapi.responses import JSONResponse
-from src.services.cloudinary import upload_image, transform_img, optimize_media
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.database.connection import get_db
+from src.repository import cloudinary as repository_cloudinary
+from src.schemas.cloudinary import CloudinaryResource, CloudinaryResourcePage
+from src.schemas.jobs import JobCreated
+from src.services.cloudinary import upload_image
+from src.services.jobs import QUEUED, job_queue
 
 router = APIRouter(prefix="/cloudinary", tags=["cloudinary"])
 
 
 # uploading an image to Cloudinary
 @router.post("/upload/")
-async def upload_image_route(file: UploadFile = File(...)) -> object:
+async def upload_image_route(
+    file: UploadFile = File(...), db: AsyncSession = Depends(get_db)
+) -> object:
     """
     The upload_image function takes a file, uploads it to Cloudinary, and returns the URL of the uploaded image.
 
         :param file: BinaryIO: Pass in the file to be uploaded
         :param return_size: tuple[int, int]: Set the width and height of the image
         :param auth: Auth: Authentication service instance
+        :param db: AsyncSession: Database session, the upload response is stored in cloudinary_resources
         :return: The URL of the uploaded image
         :doc-author: kagev
     """
 
     if file.content_type.startswith("image"):
-        image_url = upload_image(file.file)
+        response = await upload_image(await file.read())
+        resource = await repository_cloudinary.save_resource(response, db)
+        image_url = {
+            "image id": resource.public_id,
+            "URL": repository_cloudinary.resource_url(resource),
+            "presets": resource.presets,
+        }
         return {"image_url": image_url}
     return JSONResponse(status_code=415, content="Unsupported Media Type")
 
 
 # Image transformation
-@router.post("/transform/")
+@router.post("/transform/", response_model=JobCreated, status_code=status.HTTP_202_ACCEPTED)
 async def transform_image(public_id: str, width: int, height: int, crop: str) -> object:
     """
     The transform_img function takes a Cloudinary public_id and an optional quality parameter to optimize the image.
@@ -38,17 +56,19 @@ async def transform_image(public_id: str, width: int, height: int, crop: str) ->
             :type height: int
             :param crop: Cropping modes: If the requested dimensions have a different aspect ratio than the original, these modes crop out part of the image. EXAMPLE: fill, lfill, fill_pad, crop,thumb
             :type crop: str
-            :return: The returns us images from Cloudinary transformed_url
+            :return: Id of the background job, its result holds the transformed url
             :doc-author: kagev
     """
 
-    transformed_url = transform_img(public_id, width, height, crop)
+    job_id = await job_queue.enqueue(
+        "transform", {"public_id": public_id, "width": width, "height": height, "crop": crop}
+    )
 
-    return {"transformed_url": transformed_url}
+    return {"job_id": job_id, "status": QUEUED}
 
 
 # Media optimization
-@router.post("/optimize/")
+@router.post("/optimize/", response_model=JobCreated, status_code=status.HTTP_202_ACCEPTED)
 async def optimize_image(public_id: str, quality: int = 80) -> object:
     """
     Service for optimizing an image.
@@ -57,9 +77,77 @@ async def optimize_image(public_id: str, quality: int = 80) -> object:
             :type public_id: str
             :param quality: The desired quality of the optimized image.
             :type quality: int
-            :return: The result of the optimization.
+            :return: Id of the background job, its result holds the optimized url.
+            :rtype: dict
+    """
+
+    job_id = await job_queue.enqueue("optimize", {"public_id": public_id, "quality": quality})
+    return {"job_id": job_id, "status": QUEUED}
+
+
+@router.get("/resources/", response_model=CloudinaryResourcePage)
+async def list_resources(
+    tag: Optional[str] = None,
+    cursor: Optional[int] = None,
+    limit: int = Query(50, ge=1, le=500),
+    db: AsyncSession = Depends(get_db),
+) -> object:
+    """
+    Lists uploaded resources from cloudinary_resources, newest first, without Admin API calls.
+
+            :param tag: Only resources with this tag.
+            :type tag: str
+            :param cursor: next_cursor of the previous page, omitted for the first page.
+            :type cursor: int
+            :param limit: Number of resources on the page.
+            :type limit: int
+            :return: Resources and the cursor of the next page.
+            :rtype: dict
+    """
+
+    resources = await repository_cloudinary.list_resources(db, limit + 1, cursor, tag)
+    next_cursor = None
+    if len(resources) > limit:
+        resources = resources[:limit]
+        next_cursor = resources[-1].id
+    return {"items": resources, "next_cursor": next_cursor}
+
+
+@router.get("/presets/{preset}/{public_id:path}")
+async def get_preset_url(preset: str, public_id: str, db: AsyncSession = Depends(get_db)) -> object:
+    """
+    Returns the URL of a transformation preset generated at upload, no transformation call is made.
+
+            :param preset: Name of the preset, e.g. thumbnail, card, avatar or optimized.
+            :type preset: str
+            :param public_id: Public ID of the resource.
+            :type public_id: str
+            :return: URL of the transformed image.
+            :rtype: dict
+    """
+
+    resource = await repository_cloudinary.get_resource(public_id, db)
+    if resource is None or preset not in (resource.presets or {}):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Preset not found"
+        )
+    return {"public_id": public_id, "preset": preset, "url": resource.presets[preset]}
+
+
+@router.get("/resources/{public_id:path}", response_model=CloudinaryResource)
+async def get_resource(public_id: str, db: AsyncSession = Depends(get_db)) -> object:
+    """
+    Returns stored metadata of an uploaded resource without Admin API calls.
+
+            :param public_id: Public ID of the resource.
+            :type public_id: str
+            :return: Metadata of the resource.
             :rtype: dict
     """
 
-    result = optimize_media(public_id, quality)
-    return {"result": result}
+    resource = await repository_cloudinary.get_resource(public_id, db)
+    if resource is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Resource not found"
+        )
+    return resource
@@ -1,13 +1,15 @@
-from typing import List
+from typing import Optional
 
-from fastapi import APIRouter, HTTPException, Depends, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, HTTPException, Depends, Query, status
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from ..schemas.comments import CommentModel, CommentResponse
+from ..schemas.comments import CommentModel, CommentPageResponse, CommentResponse
 from src.database.connection import get_db
 from src.database.models import User
 from src.repository import comments as repository_comments
 from src.services.auth import auth_service
+from src.services.leaderboard import trending_images
+from src.services.pagination import decode_cursor, encode_cursor
 
 router = APIRouter(prefix="/comments", tags=["comments"])
 
@@ -17,27 +19,33 @@ async def create_comment(
         image_id: int,
         body: CommentModel,
         current_user: User = Depends(auth_service.get_current_user),
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
 ):
     comment = await repository_comments.create_comment(image_id, body, current_user, db)
     if comment is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="image not found"
         )
+    await trending_images.record([image_id])
     return comment
 
 
-@router.get("/{image_id}", response_model=List[CommentResponse])
+@router.get("/{image_id}", response_model=CommentPageResponse)
 async def get_comments(
         image_id: int,
-        db: Session = Depends(get_db),
+        cursor: Optional[str] = None,
+        limit: int = Query(20, ge=1, le=100),
+        db: AsyncSession = Depends(get_db),
 ):
-    comment = await repository_comments.get_comments(image_id, db)
-    if comment is None:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND, detail="Image not found"
-        )
-    return comment
+    after = decode_cursor(cursor) if cursor else None
+
+    # One extra row tells whether there is a next page without another query
+    comments = await repository_comments.get_comments(image_id, db, limit + 1, after)
+    next_cursor = None
+    if len(comments) > limit:
+        comments = comments[:limit]
+        next_cursor = encode_cursor(comments[-1].created_at, comments[-1].id)
+    return {"items": comments, "next_cursor": next_cursor}
 
 
 @router.patch("/{comment_id}", response_model=CommentResponse)
@@ -45,7 +53,7 @@ async def update_comment(
         comment_id: int,
         body: CommentModel,
         current_user: User = Depends(auth_service.get_current_user),
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
 ):
     comment = await repository_comments.update_comment(
         comment_id, body, current_user, db
@@ -70,7 +78,7 @@ async def update_comment(
 async def delete_comment(
         comment_id: int,
         current_user: User = Depends(auth_service.get_current_user),
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
 ):
     comment = await repository_comments.delete_comment(comment_id, current_user, db)
     if comment is None:
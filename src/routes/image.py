@@ -1,22 +1,52 @@
-from fastapi import APIRouter, Depends, status, UploadFile, File, Form, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, Depends, status, UploadFile, File, Form, HTTPException, Query
+from fastapi.responses import FileResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Literal, Optional
 from src.database.models import User
 from src.database.connection import get_db
 from src.repository import image as repository_image
 from src.services.auth import auth_service
-from ..schemas.image import ImageModel
+from src.services.jobs import job_queue
+from src.services.leaderboard import popular_tags, trending_images
+from src.services.pagination import decode_cursor, encode_cursor
+from src.services.transform import TransformParams, transform_image
+from ..schemas.image import ImageFeedModel, ImageModel, MAX_TAGS, TrendingImageModel
 
 
 router = APIRouter(prefix="/images", tags=["images"])
 
 
+def feed_page(images: list, limit: int) -> dict:
+    """
+    Builds a page of ImageFeedModel from limit + 1 images, the extra one only marks the next page.
+    """
+    next_cursor = None
+    if len(images) > limit:
+        images = images[:limit]
+        next_cursor = encode_cursor(images[-1].created_at, images[-1].id)
+
+    return {
+        "items": [
+            {
+                "id": image.id,
+                "path": image.path,
+                "user_id": image.user_id,
+                "description": image.description,
+                "tags": [image_tag.name for image_tag in image.tags],
+                "comment_count": image.comment_count,
+            }
+            for image in images
+        ],
+        "next_cursor": next_cursor,
+    }
+
+
 @router.post("/uploadimage/", response_model=ImageModel)
 async def create_image(
     file: UploadFile = File(),
     description: str = Form(),
     tags: List[str] = Form([]),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(auth_service.get_current_user),
 ) -> ImageModel:
     """
@@ -30,23 +60,135 @@ async def create_image(
         :return: ImageModel: модель изображения с полями id, user_id, description и tags.
     """
 
+    if len(set(tags)) > MAX_TAGS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"An image can have at most {MAX_TAGS} tags",
+        )
+
     # Попытка создать изображение
     image = await repository_image.create_image(
         file, current_user.id, description, tags, db
     )
+    await popular_tags.record(tag.name for tag in image.tags)
+    # Thumbnail is rendered by a job worker, the upload doesn't wait for it
+    # and doesn't fail without it, the image is already saved
+    thumbnail_job = await job_queue.try_enqueue(
+        "thumbnail", {"file_hash": image.file_hash}, current_user.id
+    )
     return {
         "id": image.id,
         "user_id": image.user_id,
+        "path": image.path,
         "description": description,
         "tags": [tag.name for tag in image.tags],
+        "thumbnail_job": thumbnail_job,
     }
 
 
+@router.get("/feed", response_model=ImageFeedModel)
+async def get_feed(
+    user_id: Optional[int] = None,
+    tag: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    current_user: User = Depends(auth_service.get_current_user),
+    db: AsyncSession = Depends(get_db),
+) -> ImageFeedModel:
+    """
+    Endpoint for listing images, newest first.
+    Parameters:
+        :param user_id: only images of this user.
+        :param tag: only images with this tag.
+        :param cursor: next_cursor of the previous page, omitted for the first page.
+        :param limit: number of images on the page.
+        :param current_user: a user object representing the currently authenticated user.
+        :param db: SQLAlchemy database session object.
+        :return: images of the page and the cursor of the next page, None on the last page.
+    Raises:
+        HTTPException: 400 Bad Request, if the cursor is malformed.
+    """
+    after = decode_cursor(cursor) if cursor else None
+
+    # One extra row tells whether there is a next page without another query
+    images = await repository_image.get_feed(db, limit + 1, after, user_id, tag)
+    return feed_page(images, limit)
+
+
+@router.get("/search", response_model=ImageFeedModel)
+async def search_images(
+    tags: List[str] = Query([]),
+    match: Literal["all", "any"] = "all",
+    q: Optional[str] = Query(None, min_length=1, max_length=200),
+    cursor: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    current_user: User = Depends(auth_service.get_current_user),
+    db: AsyncSession = Depends(get_db),
+) -> ImageFeedModel:
+    """
+    Endpoint for searching images by tags and description, newest first.
+    Parameters:
+        :param tags: tag names, repeat the parameter for several tags.
+        :param match: all - images with every tag, any - images with at least one of the tags.
+        :param q: words the description must contain.
+        :param cursor: next_cursor of the previous page, omitted for the first page.
+        :param limit: number of images on the page.
+        :param current_user: a user object representing the currently authenticated user.
+        :param db: SQLAlchemy database session object.
+        :return: images of the page and the cursor of the next page, None on the last page.
+    Raises:
+        HTTPException: 400 Bad Request, if the cursor is malformed or there are too many tags.
+    """
+    if len(set(tags)) > MAX_TAGS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Search by at most {MAX_TAGS} tags",
+        )
+    after = decode_cursor(cursor) if cursor else None
+
+    images = await repository_image.search_images(
+        db, limit + 1, after, tags, match == "all", q
+    )
+    return feed_page(images, limit)
+
+
+@router.get("/trending", response_model=List[TrendingImageModel])
+async def get_trending(
+    limit: int = Query(20, ge=1, le=100),
+    current_user: User = Depends(auth_service.get_current_user),
+    db: AsyncSession = Depends(get_db),
+) -> List[TrendingImageModel]:
+    """
+    Endpoint for the most commented images of late, a comment loses half its weight every half-life.
+    Parameters:
+        :param limit: number of images.
+        :param current_user: a user object representing the currently authenticated user.
+        :param db: SQLAlchemy database session object.
+        :return: images with their scores, highest first.
+    Raises:
+        HTTPException: 503 Service Unavailable, if the leaderboard can't be read.
+    """
+    ranking = dict(await trending_images.top(limit))
+    images = await repository_image.get_images_by_ids([int(image_id) for image_id in ranking], db)
+    return [
+        {
+            "id": image.id,
+            "path": image.path,
+            "user_id": image.user_id,
+            "description": image.description,
+            "tags": [tag.name for tag in image.tags],
+            "comment_count": image.comment_count,
+            "score": ranking[str(image.id)],
+        }
+        for image in images
+    ]
+
+
 @router.get("/getimage/{image_id}", response_model=ImageModel)
 async def get_image(
     image_id: int,
     current_user: User = Depends(auth_service.get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ) -> ImageModel:
     """
     Endpoint for retrieving an image by its ID.
@@ -61,13 +203,13 @@ async def get_image(
     """
 
 
-    image = await repository_image.get_image(image_id, db, user_id=current_user.id)
+    image = await repository_image.get_image(image_id, current_user.id, db)
     if not image:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Image not found"
         )
     elif not (
-        current_user.role in ("admin", "moderator") or current_user.id == image.user_id
+        current_user.is_admin or current_user.is_moderator or current_user.id == image.user_id
     ):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -75,19 +217,59 @@ async def get_image(
         )
 
     return {
+        "id": image.id,
         "path": image.path,
         "user_id": image.user_id,
         "description": image.description,
         "tags": [tag.name for tag in image.tags],
+        "comment_count": image.comment_count,
     }
 
 
+@router.get("/transform/{image_id}", response_class=FileResponse)
+async def get_transformed_image(
+    image_id: int,
+    width: int = Query(ge=1, le=4096),
+    height: int = Query(ge=1, le=4096),
+    crop: Literal["fill", "lfill", "fill_pad", "crop", "thumb"] = "fill",
+    radius: Optional[str] = Query(None, pattern=r"^(max|\d{1,4})$"),
+    quality: int = Query(80, ge=1, le=100),
+    current_user: User = Depends(auth_service.get_current_user),
+    db: AsyncSession = Depends(get_db),
+) -> FileResponse:
+    """
+    Endpoint for a resized copy of an image, rendered locally with the crop modes of Cloudinary.
+    Parameters:
+        :param image_id: image ID.
+        :param width: width of the result.
+        :param height: height of the result.
+        :param crop: fill, lfill, fill_pad, crop or thumb.
+        :param radius: corner radius in pixels or "max" for a circle or an ellipse.
+        :param quality: JPEG quality.
+        :param current_user: a user object representing the currently authenticated user.
+        :param db: SQLAlchemy database session object.
+        :return: transformed image file, cached on disk after the first request.
+    Raises:
+        HTTPException: 404 Not Found, if the image is not found.
+    """
+    image = await repository_image.get_image(image_id, current_user.id, db)
+    if not image or not image.file_hash:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Image not found"
+        )
+
+    path = await transform_image(
+        image.file_hash, TransformParams(width, height, crop, radius, quality)
+    )
+    return FileResponse(path, headers={"Cache-Control": "private, max-age=86400"})
+
+
 @router.put("/updateimage/{iamge_id}", response_model=ImageModel)
 async def update_image(
     image_id: int,
     description: str = Form(),
     current_user: User = Depends(auth_service.get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ) -> dict:
     """
     Endpoint for updating the image description.
@@ -102,28 +284,72 @@ async def update_image(
         HTTPException: 404 Not Found, if the image is not found.
     """
 
-    image = await repository_image.get_image(image_id, db, user_id=current_user.id)
+    image = await repository_image.get_image(image_id, current_user.id, db)
     if not image:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Image not found"
         )
     elif not (
-        current_user.role in ("admin", "moderator") or current_user.id == image.user_id
+        current_user.is_admin or current_user.is_moderator or current_user.id == image.user_id
     ):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="You are not allowed to perform this action",
         )
 
-    description = await repository_image.change_description(image_id, description, db)
+    description = await repository_image.change_description(
+        image_id, current_user.id, description, db
+    )
 
     return {"message": "Image update successesful"}
 
 
+@router.put("/updatetags/{image_id}", response_model=ImageModel)
+async def update_tags(
+    image_id: int,
+    tags: List[str] = Form([]),
+    current_user: User = Depends(auth_service.get_current_user),
+    db: AsyncSession = Depends(get_db),
+) -> ImageModel:
+    """
+    Endpoint for replacing the image tags.
+    Parameters:
+        :param image_id: image id
+        :param tags: new list of tags, missing tags are created.
+        :param current_user: a user object representing the currently authenticated user.
+        :param db: SQLAlchemy database session object.
+        :return: image model with the new tags.
+    Raises:
+        HTTPException: 400 Bad Request, if more than MAX_TAGS tags are given.
+        HTTPException: 404 Not Found, if the image is not found.
+    """
+    if len(set(tags)) > MAX_TAGS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"An image can have at most {MAX_TAGS} tags",
+        )
+
+    image, added_tags = await repository_image.update_tags(image_id, current_user.id, tags, db)
+    if not image:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Image not found"
+        )
+    await popular_tags.record(added_tags)
+
+    return {
+        "id": image.id,
+        "path": image.path,
+        "user_id": image.user_id,
+        "description": image.description,
+        "tags": [tag.name for tag in image.tags],
+        "comment_count": image.comment_count,
+    }
+
+
 @router.delete("/deleteimage/{image_id}", response_model=ImageModel)
 async def delete_image(
     image_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(auth_service.get_current_user),
 ) -> dict:
     """
@@ -147,13 +373,15 @@ async def delete_image(
             status_code=status.HTTP_404_NOT_FOUND, detail="Image not found"
         )
     elif not (
-        current_user.role in ("admin", "moderator") or current_user.id == image.user_id
+        current_user.is_admin or current_user.is_moderator or current_user.id == image.user_id
     ):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="You are not allowed to perform this action",
         )
 
-    image = await repository_image.delte_image_by_id(image_id, db)
+    image = await repository_image.delte_image_by_id(image_id, current_user.id, db)
+    if image:
+        await trending_images.remove([image_id])
 
     return {"message": "Image deleted successfully"}
@@ -0,0 +1,28 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+
+from src.database.models import User
+from src.schemas.jobs import JobModel
+from src.services.auth import auth_service
+from src.services.jobs import job_queue
+
+router = APIRouter(prefix="/jobs", tags=["jobs"])
+
+
+@router.get("/{job_id}", response_model=JobModel)
+async def get_job(
+    job_id: str,
+    current_user: User = Depends(auth_service.get_current_user),
+):
+    """
+    The get_job function returns status and result of a background job.
+        Jobs of other users are hidden, anonymous jobs are visible to everyone who knows the id.
+
+    :param job_id: str: Id returned when the job was queued.
+    :param current_user: User: Get the current user from the auth_service.
+    :return: Job status, result of a finished job or error of a failed one.
+    :doc-author: yarmel
+    """
+    job = await job_queue.get_status(job_id)
+    if job is None or job.get("user_id") not in (None, current_user.id):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    return job
@@ -1,14 +1,24 @@
-from fastapi import APIRouter, Depends, Request
+from typing import Literal
+
+import anyio
+from fastapi import APIRouter, Depends, Header, Request, Response, status
 from fastapi.responses import HTMLResponse
 from fastapi.templating import Jinja2Templates
 
+from src.schemas.jobs import JobCreated
+from src.schemas.qr import QRBatchModel
 from src.services import qr as qr_services
+from src.services.jobs import QUEUED, job_queue
 from src.database.models import User
 from src.services.auth import auth_service
 
 router = APIRouter(prefix="/qr", tags=["qr"])
 templates = Jinja2Templates(directory="src/templates/qr")
 
+# QR-code of a url never changes, browsers may keep it for a day.
+# The endpoint needs a token, so shared caches must not store it
+QR_MAX_AGE = 24 * 60 * 60
+
 
 @router.post("/generate/", response_class=HTMLResponse)
 async def generate_qr_code(
@@ -27,8 +37,81 @@ async def generate_qr_code(
         :doc-author: yarmel
     """
     if current_user:
-        qr_code = await qr_services.generate_qr_code(image_url)
-        qr_image = await qr_services.generate_qr_url(qr_code)
+        qr_image = qr_services.qr_data_url(await qr_services.get_qr_code(image_url))
         return templates.TemplateResponse(
             "result.html", {"request": request, "qr_image": qr_image}
         )
+
+
+@router.get("/code/", response_class=Response)
+async def get_qr_code(
+    image_url: str,
+    image_format: Literal["png", "svg"] = "png",
+    if_none_match: str | None = Header(None),
+    current_user: User = Depends(auth_service.get_current_user),
+):
+    """
+    The get_qr_code returns the QR-code of image url as a raw PNG or SVG image.
+        The same url always gives the same code, so it's served from cache with an ETag
+        and clients revalidating with If-None-Match get 304 without a body.
+
+        :param image_url: str: url to image for code generation.
+        :param image_format: str: "png" or "svg".
+        :param if_none_match: str: ETag of the copy the client already has.
+        :param current_user: User: Get the current user from the auth_service.
+        :return: QR-code image.
+        :doc-author: yarmel
+    """
+    etag = f'"{qr_services.qr_cache_key(image_url, image_format)}"'
+    headers = {"ETag": etag, "Cache-Control": f"private, max-age={QR_MAX_AGE}"}
+    if if_none_match and etag in if_none_match:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    content = await qr_services.get_qr_code(image_url, image_format)
+    return Response(
+        content, media_type=qr_services.QR_FORMATS[image_format], headers=headers
+    )
+
+
+@router.post("/batch/", response_class=Response)
+async def get_qr_codes_archive(
+    body: QRBatchModel,
+    current_user: User = Depends(auth_service.get_current_user),
+):
+    """
+    The get_qr_codes_archive returns QR-codes of many image urls as one ZIP archive.
+        Codes missing in cache are rendered in parallel in the QR process pool.
+        The archive has index.txt with the url of every file.
+
+        :param body: QRBatchModel: urls and format of the codes.
+        :param current_user: User: Get the current user from the auth_service.
+        :return: ZIP archive with the QR-codes.
+        :doc-author: yarmel
+    """
+    contents = await qr_services.get_qr_codes(body.image_urls, body.image_format)
+    archive = await anyio.to_thread.run_sync(
+        qr_services.build_qr_archive, body.image_urls, contents, body.image_format
+    )
+    return Response(
+        archive,
+        media_type="application/zip",
+        headers={"Content-Disposition": 'attachment; filename="qr_codes.zip"'},
+    )
+
+
+@router.post("/jobs/", response_model=JobCreated, status_code=status.HTTP_202_ACCEPTED)
+async def queue_qr_code(
+    image_url: str,
+    current_user: User = Depends(auth_service.get_current_user),
+):
+    """
+    The queue_qr_code schedules QR-code generation in a background job.
+        Result of the job holds the QR-code as data url, see /api/jobs/{job_id}.
+
+        :param image_url: str: url to image for code generation.
+        :param current_user: User: Get the current user from the auth_service.
+        :return: Id of the background job.
+        :doc-author: yarmel
+    """
+    job_id = await job_queue.enqueue("qr", {"image_url": image_url}, current_user.id)
+    return {"job_id": job_id, "status": QUEUED}
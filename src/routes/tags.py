@@ -0,0 +1,27 @@
+from typing import List
+
+from fastapi import APIRouter, Depends, Query
+
+from src.database.models import User
+from src.schemas.image import PopularTagModel
+from src.services.auth import auth_service
+from src.services.leaderboard import popular_tags
+
+router = APIRouter(prefix="/tags", tags=["tags"])
+
+
+@router.get("/popular", response_model=List[PopularTagModel])
+async def get_popular_tags(
+    limit: int = Query(20, ge=1, le=100),
+    current_user: User = Depends(auth_service.get_current_user),
+):
+    """
+    The get_popular_tags function returns the tags used by most of the recently uploaded images.
+        Every upload adds to its tags, older uploads weigh less, halving every half-life.
+
+    :param limit: int: Number of tags.
+    :param current_user: User: Get the current user from the auth_service.
+    :return: Tags with their scores, highest first.
+    :doc-author: yarmel
+    """
+    return [{"name": name, "score": score} for name, score in await popular_tags.top(limit)]
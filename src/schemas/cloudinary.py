@@ -1,19 +1,37 @@
-from pydantic import BaseModel
-from typing import List, Optional
+from datetime import datetime
+
+from pydantic import BaseModel, ConfigDict, field_validator
+from typing import Dict, List, Optional
 
 
 class CloudinaryResource(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
     public_id: str
-    format: Optional[str]
-    version: Optional[int]
-    resource_type: Optional[str]
-    created_at: Optional[str]
-    tags: Optional[List[str]]
-    bytes: Optional[int]
-    width: Optional[int]
-    height: Optional[int]
-    url: Optional[str]
-    secure_url: Optional[str]
-    next_cursor: Optional[str]
-    transformation: Optional[str]
-    pages: Optional[str]
+    format: Optional[str] = None
+    version: Optional[int] = None
+    resource_type: Optional[str] = None
+    created_at: Optional[datetime] = None
+    tags: Optional[List[str]] = None
+    bytes: Optional[int] = None
+    width: Optional[int] = None
+    height: Optional[int] = None
+    url: Optional[str] = None
+    secure_url: Optional[str] = None
+    next_cursor: Optional[str] = None
+    transformation: Optional[str] = None
+    pages: Optional[str] = None
+    presets: Optional[Dict[str, str]] = None
+
+    @field_validator("tags", mode="before")
+    @classmethod
+    def split_tags(cls, tags):
+        # cloudinary_resources.tags keeps the tags comma separated
+        if isinstance(tags, str):
+            return [tag for tag in tags.split(",") if tag]
+        return tags
+
+
+class CloudinaryResourcePage(BaseModel):
+    items: List[CloudinaryResource]
+    next_cursor: Optional[int] = None
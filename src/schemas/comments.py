@@ -1,3 +1,5 @@
+from typing import List, Optional
+
 from pydantic import BaseModel, ConfigDict, Field
 
 from datetime import datetime
@@ -14,8 +16,13 @@ class CommentResponse(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
     id: int
-    content: int
+    content: str
     user: UserDb
     image: ImageModel
     created_at: datetime
-    updated_at: datetime
\ No newline at end of file
+    updated_at: datetime
+
+
+class CommentPageResponse(BaseModel):
+    items: List[CommentResponse]
+    next_cursor: Optional[str] = None
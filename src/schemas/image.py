@@ -1,21 +1,48 @@
-from pydantic import BaseModel, Field
+from typing import List, Optional
+
+from pydantic import BaseModel, Field, field_validator
+
+MAX_TAGS = 5
 
 
 class ImageModel(BaseModel):
     id: int
     user_id: int
-    path: str
-    description: str
-    tags: str = Field(min_length=0, max_length=5)
+    path: Optional[str] = None
+    description: Optional[str] = None
+    tags: List[str] = Field(default=[], max_length=MAX_TAGS)
+    comment_count: int = 0
+    thumbnail_job: Optional[str] = None
 
     class Config:
         # orm_mode = True
         from_attributes = True
 
+    @field_validator("tags", mode="before")
+    @classmethod
+    def tag_names(cls, tags):
+        # Image.tags of the ORM object holds Tag rows, the API returns their names
+        return [getattr(tag, "name", tag) for tag in tags]
+
+
+class ImageFeedModel(BaseModel):
+    items: List[ImageModel]
+    next_cursor: Optional[str] = None
+
+
+class TrendingImageModel(ImageModel):
+    score: float
+
+
+class PopularTagModel(BaseModel):
+    name: str
+    score: float
+
 
 class TagModel(BaseModel):
     id: int
     name: str
+    image_count: int = 0
 
     class Config:
         # orm_mode = True
@@ -0,0 +1,18 @@
+from typing import Any, Optional
+
+from pydantic import BaseModel
+
+
+class JobCreated(BaseModel):
+    job_id: str
+    status: str
+
+
+class JobModel(BaseModel):
+    id: str
+    kind: str
+    status: str
+    result: Optional[dict[str, Any]] = None
+    error: Optional[str] = None
+    created_at: float
+    updated_at: float
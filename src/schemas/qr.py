@@ -0,0 +1,14 @@
+from typing import Annotated, List, Literal
+
+from pydantic import BaseModel, Field
+
+MAX_QR_BATCH = 500
+# Bytes a version 40 QR-code holds with the lowest error correction
+MAX_QR_DATA = 2953
+
+
+class QRBatchModel(BaseModel):
+    image_urls: List[Annotated[str, Field(min_length=1, max_length=MAX_QR_DATA)]] = Field(
+        min_length=1, max_length=MAX_QR_BATCH
+    )
+    image_format: Literal["png", "svg"] = "png"
@@ -44,4 +44,5 @@ class UserProfileUpdate(BaseModel):
 class UserProfileResponse(BaseModel):
     username: str
     created_at: datetime
+    image_count: int = 0
     about: str = "Lorem ipsum dolor sit amet, consectetur adipiscing elit."
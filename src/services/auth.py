@@ -1,3 +1,6 @@
+import hashlib
+import time
+import uuid
 from datetime import datetime, timedelta
 from typing import Optional
 
@@ -6,17 +9,22 @@ from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from pydantic import BaseModel
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from config import settings
 from src.database.connection import get_db
 from src.database.models import User
 from src.repository import token as token_repository
+from src.repository import users as users_repository
+from src.services.ttl_cache import TTLCache
 from src.services.users import users_service
+from src.services.worker_pool import BoundedExecutor
 
 
 class TokenData(BaseModel):
     email: Optional[str]
+    exp: Optional[int] = None
+    jti: Optional[str] = None
 
 
 class Auth:
@@ -27,12 +35,19 @@ class Auth:
     expires_delta_refresh_token = settings.expires_delta_refresh_token
 
     oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
+    # Decoded access tokens, blacklist is still checked before every lookup
+    token_cache = TTLCache(settings.auth_cache_size, settings.auth_cache_ttl)
 
-    def verify_password(self, plain_password, hashed_password) -> bool:
-        return self.pwd_context.verify(plain_password, hashed_password)
+    # bcrypt takes ~250 ms of CPU, it runs in threads so the event loop keeps serving requests
+    password_pool = BoundedExecutor(
+        settings.password_hash_workers, settings.password_hash_queue, "bcrypt"
+    )
 
-    def get_password_hash(self, password: str) -> str:
-        return self.pwd_context.hash(password)
+    async def verify_password(self, plain_password, hashed_password) -> bool:
+        return await self.password_pool.run(self.pwd_context.verify, plain_password, hashed_password)
+
+    async def get_password_hash(self, password: str) -> str:
+        return await self.password_pool.run(self.pwd_context.hash, password)
 
     def __decode_jwt(self, token: str) -> dict:
         return jwt.decode(token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
@@ -64,14 +79,31 @@ class Auth:
 
         return self.__encode_jwt(data, datetime.utcnow(), expire, "refresh_token")
 
-    async def get_data_from_access_token(
-            self, access_token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)
-    ) -> TokenData:
-        if not await token_repository.is_token_blacklisted(access_token, db):
+    @staticmethod
+    def hash_jti(jti: str) -> str:
+        return hashlib.sha256(jti.encode()).hexdigest()
+
+    def new_jti(self) -> tuple[str, str]:
+        """
+        The new_jti function returns a random id for a refresh token and its hash to store.
+            Only one refresh token per user is valid, the one whose jti hash is stored.
+        """
+        jti = uuid.uuid4().hex
+        return jti, self.hash_jti(jti)
+
+    async def get_data_from_access_token(self, access_token: str = Depends(oauth2_scheme)) -> TokenData:
+        if not await token_repository.is_token_blacklisted(access_token):
+            token_data = self.token_cache.get(access_token)
+            if token_data is not None:
+                return token_data
             try:
                 payload = self.__decode_jwt(access_token)
                 if payload.get("scope") == "access_token":
-                    return TokenData(**payload)
+                    token_data = TokenData(**payload)
+                    self.token_cache.set(access_token, token_data, ttl=min(
+                        self.token_cache.ttl, token_data.exp - time.time()
+                    ))
+                    return token_data
 
                 raise HTTPException(
                     status_code=status.HTTP_401_UNAUTHORIZED,
@@ -92,9 +124,7 @@ class Auth:
             payload = self.__decode_jwt(refresh_token)
 
             if payload.get("scope") == "refresh_token":
-                user_email = payload.get("email")
-                user_role = payload.get("role")
-                return TokenData(email=user_email, role=user_role)
+                return TokenData(email=payload.get("email"), jti=payload.get("jti"))
 
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
@@ -107,10 +137,15 @@ class Auth:
             )
 
     async def get_current_user(
-            self, access_token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)
+            self, access_token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)
     ) -> User:
-        token_data = await self.get_data_from_access_token(access_token, db)
-        current_user = await users_service.get_user_by_email(token_data.email, db)
+        token_data = await self.get_data_from_access_token(access_token)
+        current_user = await users_repository.get_cached_user_by_email(token_data.email, db)
+        if current_user is None:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Could not validate credentials",
+            )
         if await users_service.user_check(current_user):
             return current_user
 
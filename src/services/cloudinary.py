@@ -1,8 +1,13 @@
+import asyncio
+import random
+import time
 import uuid
-from typing import BinaryIO
+
 import cloudinary
-from cloudinary.api import resource
-from cloudinary.uploader import upload
+import httpx
+from cloudinary.utils import api_sign_request, build_eager
+from fastapi import HTTPException, status
+
 from config import settings
 
 
@@ -15,28 +20,161 @@ cloudinary.config(
 )
 
 
-def upload_image(file: BinaryIO) -> str:
+class CloudinaryClient:
+    """
+    Async client of the Cloudinary Upload API.
+        Requests are sent with httpx, so a slow Cloudinary call only suspends its own request.
+        At most max_concurrency calls are in flight per worker, the rest wait for the semaphore.
+        Timeouts, connection errors, 429 and 5xx responses are retried with exponential backoff and full jitter.
+    """
+    RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+    def __init__(
+        self,
+        cloud_name: str,
+        api_key: str,
+        api_secret: str,
+        base_url: str = "https://api.cloudinary.com/v1_1",
+        max_concurrency: int = 8,
+        timeout: float = 30,
+        retries: int = 3,
+        backoff: float = 0.5,
+    ):
+        self.cloud_name = cloud_name
+        self.api_key = api_key
+        self.api_secret = api_secret
+        self.base_url = base_url.rstrip("/")
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self._client: httpx.AsyncClient | None = None
+        self._semaphore: asyncio.Semaphore | None = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # Created on first use, inside the running event loop
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.max_concurrency),
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._client
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def sign(self, params: dict) -> dict:
+        """
+        The sign function adds timestamp, api key and signature to the request parameters.
+
+        :param params: dict: Parameters of the Upload API call.
+        :return: Signed parameters.
+        :doc-author: kagev
+        """
+        params = {
+            key: str(value).lower() if isinstance(value, bool) else value
+            for key, value in params.items()
+            if value is not None
+        }
+        params["timestamp"] = int(time.time())
+        params["signature"] = api_sign_request(params, self.api_secret)
+        params["api_key"] = self.api_key
+        return params
+
+    async def call(self, action: str, params: dict, file: bytes | None = None) -> dict:
+        """
+        The call function sends a signed request to the Upload API and retries transient failures.
+
+        :param action: str: Upload API action, e.g. "upload" or "explicit".
+        :param params: dict: Parameters of the call.
+        :param file: bytes: File content for the upload action.
+        :return: Decoded JSON response of Cloudinary.
+        :doc-author: kagev
+        """
+        url = f"{self.base_url}/{self.cloud_name}/image/{action}"
+        files = {"file": ("file", file)} if file is not None else None
+        client = self.client
+
+        for attempt in range(self.retries + 1):
+            last_attempt = attempt == self.retries
+            try:
+                async with self._semaphore:
+                    # Signed per attempt, Cloudinary rejects stale timestamps
+                    response = await client.post(url, data=self.sign(params), files=files)
+            except httpx.TimeoutException:
+                if last_attempt:
+                    raise HTTPException(
+                        status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+                        detail="Cloudinary did not respond in time",
+                    )
+            except httpx.TransportError as error:
+                if last_attempt:
+                    raise HTTPException(
+                        status_code=status.HTTP_502_BAD_GATEWAY,
+                        detail=f"Cloudinary is unreachable: {error}",
+                    )
+            else:
+                if response.status_code not in self.RETRY_STATUSES or last_attempt:
+                    break
+            await asyncio.sleep(random.uniform(0, self.backoff * 2 ** attempt))
+
+        if response.is_error:
+            try:
+                message = response.json()["error"]["message"]
+            except (ValueError, KeyError, TypeError):
+                message = response.text
+            raise HTTPException(
+                status_code=status.HTTP_502_BAD_GATEWAY,
+                detail=f"Cloudinary error: {message}",
+            )
+        return response.json()
+
+    async def upload(self, file: bytes, **params) -> dict:
+        return await self.call("upload", params, file=file)
+
+    async def explicit(self, public_id: str, eager: list[dict], **params) -> dict:
+        params.update(public_id=public_id, type="upload", eager=build_eager(eager))
+        return await self.call("explicit", params)
+
+
+cloudinary_client = CloudinaryClient(
+    settings.cloudinary_name,
+    settings.cloudinary_api,
+    settings.cloudinary_api_secret,
+    base_url=settings.cloudinary_api_url,
+    max_concurrency=settings.cloudinary_max_concurrency,
+    timeout=settings.cloudinary_timeout,
+    retries=settings.cloudinary_retries,
+)
+
+
+async def upload_image(file: bytes) -> dict:
     """
-    The upload_image function takes a file, uploads it to Cloudinary, and returns the URL of the uploaded image.
+    The upload_image function takes a file and uploads it to Cloudinary.
+        The upload response has all metadata of the resource, store it instead of asking the Admin API later.
+        Eager transformations of settings.cloudinary_presets are requested with the upload.
 
-    :param file: BinaryIO: Pass in the file to be uploaded
-    :param return_size: tuple[int, int]: Set the width and height of the image
-    :param auth: Auth: Authentication service instance
-    :return: The URL of the uploaded image
+    :param file: bytes: Content of the file to be uploaded
+    :return: Upload response of Cloudinary
     :doc-author: kagev
     """
     file_id = settings.cloudinary_folder + "/" + f"avatar_{uuid.uuid4()}"
-    upload(file, public_id=file_id, tag="web_project", overwrite=True)
-    img_url = cloudinary.CloudinaryImage(file_id).build_url(
-        # width=return_size[0],
-        # height=return_size[1],
-        # crop="fill",
-        version=resource(file_id)["version"],
+    # Presets are rendered by Cloudinary in the background, the upload doesn't wait for them
+    return await cloudinary_client.upload(
+        file,
+        public_id=file_id,
+        tags="web_project",
+        overwrite=True,
+        eager=build_eager(list(settings.cloudinary_presets.values())),
+        eager_async=True,
     )
-    return {"image id": file_id, "URL": img_url}
 
 
-def transform_img(public_id, width, height, crop):
+async def transform_img(public_id, width, height, crop):
     """
     The transform_img function takes a Cloudinary public_id and an optional quality parameter to optimize the image.
 
@@ -53,9 +191,8 @@ def transform_img(public_id, width, height, crop):
     :doc-author: kagev
     """
 
-    transformed_url = cloudinary.uploader.explicit(
+    transformed_url = await cloudinary_client.explicit(
         public_id,
-        type="upload",
         eager=[
             {"gravity": "auto", "height": height, "width": width, "crop": crop},
             {"fetch_format": "auto"},
@@ -66,7 +203,7 @@ def transform_img(public_id, width, height, crop):
     return transformed_url["secure_url"]
 
 
-def optimize_media(public_id, quality=80):
+async def optimize_media(public_id, quality=80):
     """
     The optimize_media function takes a Cloudinary public_id and an optional quality parameter to optimize the image.
 
@@ -77,9 +214,8 @@ def optimize_media(public_id, quality=80):
     """
     # Set quality for optimization
 
-    optimize_img = cloudinary.uploader.explicit(
+    optimize_img = await cloudinary_client.explicit(
         public_id,
-        type="upload",
         eager=[
             {"quality": quality},
         ],
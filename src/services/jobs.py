@@ -0,0 +1,317 @@
+import asyncio
+import json
+import logging
+import multiprocessing
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from functools import partial
+from typing import Awaitable, Callable, Optional
+
+import anyio
+import pika
+from fastapi import HTTPException, status
+from pika.exceptions import AMQPError
+from redis.exceptions import RedisError
+
+from config import settings
+from src.database.cache import redis_client
+from src.database.connection import AsyncSessionLocal
+from src.repository.counters import reconcile_counters
+from src.services import qr as qr_services
+from src.services import storage
+from src.services.cloudinary import optimize_media, transform_img
+from src.services.ttl_cache import TTLCache
+from src.services.worker_pool import BoundedExecutor
+
+logger = logging.getLogger(__name__)
+
+JOB_PREFIX = "job:"
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+async def thumbnail_job(file_hash: str) -> dict:
+    return {"path": await anyio.to_thread.run_sync(storage.make_thumbnail, file_hash)}
+
+
+async def optimize_job(public_id: str, quality: int = 80) -> dict:
+    return {"url": await optimize_media(public_id, quality)}
+
+
+async def transform_job(public_id: str, width: int, height: int, crop: str) -> dict:
+    return {"url": await transform_img(public_id, width, height, crop)}
+
+
+async def qr_job(image_url: str) -> dict:
+    return {"qr_image": qr_services.qr_data_url(await qr_services.get_qr_code(image_url))}
+
+
+async def counters_job() -> dict:
+    async with AsyncSessionLocal() as db:
+        return {"fixed": await reconcile_counters(db)}
+
+
+# Job kind -> coroutine function called with the job payload as keyword arguments
+HANDLERS: dict[str, Callable[..., Awaitable[dict]]] = {
+    "thumbnail": thumbnail_job,
+    "optimize": optimize_job,
+    "transform": transform_job,
+    "qr": qr_job,
+    "counters": counters_job,
+}
+
+
+class MemoryJobStore:
+    """
+    Job records kept in memory of the current process, used with the local backend.
+        Like in Redis, records expire settings.job_ttl seconds after their last update,
+        at most settings.job_store_size records are kept.
+    """
+
+    def __init__(self, ttl: int = settings.job_ttl, maxsize: int = settings.job_store_size):
+        self.jobs = TTLCache(maxsize, ttl)
+
+    async def save(self, job_id: str, **fields) -> None:
+        job = self.jobs.get(job_id) or {"id": job_id}
+        job.update(fields, updated_at=time.time())
+        self.jobs.set(job_id, job)
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        job = self.jobs.get(job_id)
+        return dict(job) if job else None
+
+
+class RedisJobStore:
+    """
+    Job records kept in Redis hashes, shared by the API workers and the job workers.
+        Records expire settings.job_ttl seconds after their last update.
+    """
+
+    def __init__(self, ttl: int = settings.job_ttl):
+        self.ttl = ttl
+
+    async def save(self, job_id: str, **fields) -> None:
+        fields.update(id=job_id, updated_at=time.time())
+        key = JOB_PREFIX + job_id
+        async with redis_client.pipeline(transaction=True) as pipe:
+            pipe.hset(key, mapping={name: json.dumps(value) for name, value in fields.items()})
+            pipe.expire(key, self.ttl)
+            await pipe.execute()
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        job = await redis_client.hgetall(JOB_PREFIX + job_id)
+        return {name: json.loads(value) for name, value in job.items()} or None
+
+
+async def run_job(store, job_id: str, kind: str, payload: dict) -> None:
+    """
+    The run_job function runs the handler of the job and records its status and result.
+        Failures are stored on the job instead of being raised, so a bad job can't stop the worker.
+
+    :param store: Job store to record the status in.
+    :param job_id: str: Job id.
+    :param kind: str: Job kind, key of HANDLERS.
+    :param payload: dict: Keyword arguments of the handler.
+    :return: None.
+    """
+    await store.save(job_id, status=RUNNING)
+    try:
+        result = await HANDLERS[kind](**payload)
+    except Exception as error:
+        logger.exception("Job %s (%s) failed", job_id, kind)
+        detail = getattr(error, "detail", None) or str(error) or type(error).__name__
+        await store.save(job_id, status=FAILED, error=detail)
+    else:
+        await store.save(job_id, status=DONE, result=result)
+
+
+class JobQueue(ABC):
+    """
+    Base of the job queue backends: records the job as queued, then hands it to the backend.
+    """
+    store = None
+
+    async def enqueue(self, kind: str, payload: dict, user_id: Optional[int] = None) -> str:
+        """
+        The enqueue function schedules a job and returns right away.
+
+        :param kind: str: Job kind, key of HANDLERS.
+        :param payload: dict: Keyword arguments of the handler, must be JSON serializable.
+        :param user_id: int: Owner of the job, None for anonymous jobs.
+        :return: Job id to query the status with.
+        """
+        if kind not in HANDLERS:
+            raise ValueError(f"Unknown job kind: {kind}")
+        job_id = uuid.uuid4().hex
+        await self.store.save(
+            job_id, kind=kind, status=QUEUED, user_id=user_id, created_at=time.time()
+        )
+        await self.submit({"id": job_id, "kind": kind, "payload": payload})
+        return job_id
+
+    async def try_enqueue(self, kind: str, payload: dict, user_id: Optional[int] = None) -> Optional[str]:
+        """
+        The try_enqueue function schedules a job the request can succeed without.
+            Used after the request already committed its changes, a queue outage is logged instead of raised.
+
+        :param kind: str: Job kind, key of HANDLERS.
+        :param payload: dict: Keyword arguments of the handler, must be JSON serializable.
+        :param user_id: int: Owner of the job, None for anonymous jobs.
+        :return: Job id, None if the job could not be scheduled.
+        """
+        try:
+            return await self.enqueue(kind, payload, user_id)
+        except (HTTPException, RedisError):
+            logger.warning("Job %s was not scheduled, the queue is unavailable", kind, exc_info=True)
+            return None
+
+    @abstractmethod
+    async def submit(self, message: dict) -> None:
+        """
+        The submit function hands a queued job message to the backend.
+
+        :param message: dict: Job id, kind and payload.
+        :return: None.
+        """
+
+    async def get_status(self, job_id: str) -> Optional[dict]:
+        return await self.store.get(job_id)
+
+
+class LocalJobQueue(JobQueue):
+    """
+    In-process backend: jobs run as tasks on the event loop of the API worker.
+        No broker or Redis is needed, meant for tests and local development.
+    """
+
+    def __init__(self):
+        self.store = MemoryJobStore()
+        self.tasks: set[asyncio.Task] = set()
+
+    async def submit(self, message: dict) -> None:
+        task = asyncio.create_task(
+            run_job(self.store, message["id"], message["kind"], message["payload"])
+        )
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def join(self) -> None:
+        while self.tasks:
+            await asyncio.gather(*self.tasks)
+
+
+class AMQPJobQueue(JobQueue):
+    """
+    LavinaMQ backend: jobs are published to a durable queue and run by worker.py processes.
+        pika connections are not thread-safe, so all publishing goes through one dedicated thread.
+    """
+
+    def __init__(self, url: str, queue: str):
+        self.store = RedisJobStore()
+        self.url = url
+        self.queue = queue
+        self.publisher = BoundedExecutor(1, settings.job_publish_queue, "amqp")
+        self._connection = None
+        self._channel = None
+
+    def _publish(self, body: bytes) -> None:
+        for attempt in range(2):
+            try:
+                if self._channel is None or self._channel.is_closed:
+                    self._connection = pika.BlockingConnection(pika.URLParameters(self.url))
+                    self._channel = self._connection.channel()
+                    self._channel.queue_declare(queue=self.queue, durable=True)
+                self._channel.basic_publish(
+                    exchange="",
+                    routing_key=self.queue,
+                    body=body,
+                    properties=pika.BasicProperties(
+                        content_type="application/json",
+                        delivery_mode=pika.DeliveryMode.Persistent,
+                    ),
+                )
+                return
+            except AMQPError:
+                # Idle connections get dropped by the broker, reconnect once
+                self._channel = None
+                if attempt:
+                    raise
+
+    async def submit(self, message: dict) -> None:
+        try:
+            await self.publisher.run(self._publish, json.dumps(message).encode())
+        except AMQPError as error:
+            logger.exception("Publishing job %s failed", message["id"])
+            await self.store.save(message["id"], status=FAILED, error=f"Queue is unavailable: {error}")
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Job queue is unavailable, try again later",
+                headers={"Retry-After": "5"},
+            )
+
+
+def consume(url: str, queue: str) -> None:
+    """
+    The consume function runs jobs from the queue one by one until the process is stopped.
+        A message is acknowledged after its job finished, so jobs of a crashed worker are redelivered.
+        Jobs run on an event loop in a separate thread, the connection thread keeps sending
+        heartbeats meanwhile and acks through add_callback_threadsafe, pika isn't thread-safe.
+
+    :param url: str: AMQP url of the broker.
+    :param queue: str: Queue name.
+    :return: None.
+    """
+    loop = asyncio.new_event_loop()
+    runner = threading.Thread(target=loop.run_forever, name="jobs", daemon=True)
+    runner.start()
+    store = RedisJobStore()
+    connection = pika.BlockingConnection(pika.URLParameters(url))
+    channel = connection.channel()
+    channel.queue_declare(queue=queue, durable=True)
+    channel.basic_qos(prefetch_count=1)
+
+    def on_message(channel, method, properties, body):
+        message = json.loads(body)
+        future = asyncio.run_coroutine_threadsafe(
+            run_job(store, message["id"], message["kind"], message["payload"]), loop
+        )
+        future.add_done_callback(lambda _: connection.add_callback_threadsafe(
+            partial(channel.basic_ack, delivery_tag=method.delivery_tag)
+        ))
+
+    channel.basic_consume(queue=queue, on_message_callback=on_message)
+    try:
+        channel.start_consuming()
+    finally:
+        connection.close()
+        loop.call_soon_threadsafe(loop.stop)
+        runner.join()
+        loop.close()
+
+
+def run_workers(processes: int = settings.job_worker_processes) -> None:
+    """
+    The run_workers function starts processes consuming the job queue and waits for them.
+
+    :param processes: int: Number of worker processes.
+    :return: None.
+    """
+    workers = [
+        multiprocessing.Process(target=consume, args=(settings.lavina_url, settings.job_queue))
+        for _ in range(processes)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+
+if settings.job_backend == "amqp":
+    job_queue = AMQPJobQueue(settings.lavina_url, settings.job_queue)
+else:
+    job_queue = LocalJobQueue()
@@ -0,0 +1,128 @@
+import time
+from typing import Iterable, Optional
+
+from fastapi import HTTPException, status
+from redis.exceptions import RedisError
+
+from config import settings
+from src.database.cache import redis_client
+
+LEADERBOARD_PREFIX = "leaderboard:"
+# 2024-01-01 UTC, start of the first generation
+EPOCH = 1704067200
+# Half-lives per generation, increments stay below 2 ** GENERATION
+GENERATION = 32
+
+
+class Leaderboard:
+    """
+    Time-decayed ranking kept in a Redis sorted set.
+        Instead of decaying every score, new events weigh more: an event adds 2 ** (age of the
+        generation / half_life), so an event one half-life old counts half of a new one, and a read
+        is a single ZREVRANGE. To keep weights bounded, every GENERATION half-lives scores move
+        to a new key scaled down by 2 ** -GENERATION, the move is done once by whichever worker
+        touches the new generation first.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        half_life: int = settings.leaderboard_half_life,
+        size: int = settings.leaderboard_size,
+    ):
+        self.prefix = f"{LEADERBOARD_PREFIX}{name}:"
+        self.half_life = half_life
+        self.size = size
+        # Generations are kept until the next one is carried over, with some slack
+        self.ttl = 3 * GENERATION * half_life
+        self.current: Optional[int] = None
+
+    def position(self, now: float) -> tuple[int, float]:
+        """
+        The position function returns the generation of the moment and its age in half-lives.
+        """
+        elapsed = (now - EPOCH) / self.half_life
+        generation = int(elapsed // GENERATION)
+        return generation, elapsed - generation * GENERATION
+
+    async def rollover(self, generation: int) -> str:
+        """
+        The rollover function carries scores of the previous generation into generation once.
+
+        :param generation: int: Current generation.
+        :return: Key of the sorted set of generation.
+        """
+        key = f"{self.prefix}{generation}"
+        if generation != self.current:
+            if await redis_client.set(f"{key}:carried", 1, nx=True, ex=self.ttl):
+                try:
+                    # The new key is a source too, events recorded before the carry-over are kept
+                    await redis_client.zunionstore(
+                        key, {key: 1, f"{self.prefix}{generation - 1}": 2.0 ** -GENERATION}
+                    )
+                    await redis_client.expire(key, self.ttl)
+                except RedisError:
+                    await redis_client.delete(f"{key}:carried")
+                    raise
+            self.current = generation
+        return key
+
+    async def record(self, members: Iterable, amount: float = 1) -> None:
+        """
+        The record function adds an event for every member, e.g. a comment for an image.
+            Leaderboards are best effort, events are dropped while Redis is unavailable.
+
+        :param members: Iterable: Ids or names of the members.
+        :param amount: float: Weight of the event.
+        :return: None.
+        """
+        members = list(members)
+        if not members:
+            return
+        generation, age = self.position(time.time())
+        increment = amount * 2.0 ** age
+        try:
+            key = await self.rollover(generation)
+            async with redis_client.pipeline(transaction=False) as pipe:
+                for member in members:
+                    pipe.zincrby(key, increment, member)
+                # Members past the size of the leaderboard are dropped, lowest scores first
+                pipe.zremrangebyrank(key, 0, -self.size - 1)
+                pipe.expire(key, self.ttl)
+                await pipe.execute()
+        except RedisError:
+            pass
+
+    async def remove(self, members: Iterable) -> None:
+        members = list(members)
+        if not members:
+            return
+        generation, _ = self.position(time.time())
+        try:
+            await redis_client.zrem(f"{self.prefix}{generation}", *members)
+        except RedisError:
+            pass
+
+    async def top(self, limit: int) -> list[tuple[str, float]]:
+        """
+        The top function returns the highest ranked members.
+
+        :param limit: int: Number of members.
+        :return: (member, score) pairs, the score is the number of events weighted by their age.
+        """
+        generation, age = self.position(time.time())
+        try:
+            key = await self.rollover(generation)
+            members = await redis_client.zrevrange(key, 0, limit - 1, withscores=True)
+        except RedisError:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Leaderboard is unavailable, try again later",
+            )
+        scale = 2.0 ** -age
+        return [(member, score * scale) for member, score in members]
+
+
+# Images ranked by comments, tags ranked by images using them
+trending_images = Leaderboard("images")
+popular_tags = Leaderboard("tags")
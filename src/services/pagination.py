@@ -0,0 +1,32 @@
+import base64
+from datetime import datetime
+
+from fastapi import HTTPException, status
+
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    """
+    The encode_cursor function packs the keyset position of the last row on a page into an opaque string.
+
+    :param created_at: datetime: created_at of the last row.
+    :param row_id: int: id of the last row.
+    :return: Cursor for the next page.
+    """
+    raw = f"{created_at.isoformat()}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    """
+    The decode_cursor function unpacks a cursor made by encode_cursor.
+
+    :param cursor: str: Cursor from the client.
+    :return: Tuple of created_at and id of the last row of the previous page.
+    """
+    try:
+        created_at, row_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), int(row_id)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor"
+        )
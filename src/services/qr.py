@@ -1,10 +1,50 @@
-import qrcode
-from qrcode.image.base import BaseImage
-from io import BytesIO
+import asyncio
+import hashlib
+import multiprocessing
+import zipfile
 from base64 import b64encode
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from io import BytesIO
+
+import qrcode
+from fastapi import HTTPException, status
+from qrcode.exceptions import DataOverflowError
+from qrcode.image.svg import SvgPathImage
+from redis.exceptions import RedisError
+
+from config import settings
+from src.database.cache import redis_binary_client
+from src.services.ttl_cache import TTLCache
+from src.services.worker_pool import BoundedExecutor
+
+QR_FORMATS = {"png": "image/png", "svg": "image/svg+xml"}
+QR_PREFIX = "qr:"
+# Part of the cache key, bump when rendering parameters change
+QR_VERSION = "1"
+
+qr_cache = TTLCache(settings.qr_cache_size, settings.qr_cache_ttl)
 
+# Rendering is pure CPU, threads would be serialized by the GIL, processes render in parallel.
+# Workers are spawned, forking the API process could copy a lock held by another thread.
+qr_render_pool = BoundedExecutor(
+    settings.qr_render_workers,
+    settings.qr_render_queue,
+    "qr",
+    executor_class=partial(ProcessPoolExecutor, mp_context=multiprocessing.get_context("spawn")),
+)
 
-async def generate_qr_code(image_url: str):
+
+def render_qr_code(image_url: str, image_format: str = "png") -> bytes:
+    """
+    The render_qr_code function builds the QR matrix for image_url and encodes it as PNG or SVG.
+        Pure CPU work, call it outside the event loop.
+
+    :param image_url: str: Data of the QR-code.
+    :param image_format: str: "png" or "svg".
+    :return: Encoded image.
+    :doc-author: yarmel
+    """
     qr = qrcode.QRCode(
         version=1,
         error_correction=qrcode.constants.ERROR_CORRECT_L,
@@ -12,15 +52,153 @@ async def generate_qr_code(image_url: str):
         border=4,
     )
     qr.add_data(image_url)
-    qr.make(fit=True)
+    try:
+        qr.make(fit=True)
+    except (DataOverflowError, ValueError):
+        # qrcode fails with ValueError for versions past 40 instead of DataOverflowError
+        raise DataOverflowError(image_url)
+
+    buffer = BytesIO()
+    if image_format == "svg":
+        qr.make_image(image_factory=SvgPathImage).save(buffer)
+    else:
+        qr.make_image(fill_color="black", back_color="white").save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def too_long(error: DataOverflowError) -> HTTPException:
+    image_url = str(error)
+    return HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail=f"Image url doesn't fit into a QR-code ({len(image_url.encode())} bytes): {image_url[:100]}",
+    )
+
+
+def render_qr_codes(image_urls: list[str], image_format: str = "png") -> list[bytes]:
+    return [render_qr_code(image_url, image_format) for image_url in image_urls]
+
+
+def qr_cache_key(image_url: str, image_format: str) -> str:
+    """
+    The qr_cache_key function returns the content key of a QR-code, also used as its ETag.
+
+    :param image_url: str: Data of the QR-code.
+    :param image_format: str: "png" or "svg".
+    :return: Hex digest.
+    :doc-author: yarmel
+    """
+    return hashlib.sha256(f"{QR_VERSION}:{image_format}:{image_url}".encode()).hexdigest()
+
+
+async def get_qr_code(image_url: str, image_format: str = "png") -> bytes:
+    """
+    The get_qr_code function returns the encoded QR-code for image_url.
+        Codes are looked up in the in-process LRU cache, then in Redis, and rendered in qr_render_pool only on a miss.
+        Redis errors are ignored, the code is rendered instead.
+        A url too long for a QR-code gives 400.
+
+    :param image_url: str: Data of the QR-code.
+    :param image_format: str: "png" or "svg".
+    :return: Encoded image.
+    :doc-author: yarmel
+    """
+    key = qr_cache_key(image_url, image_format)
+    content = qr_cache.get(key)
+    if content is not None:
+        return content
+
+    try:
+        content = await redis_binary_client.get(QR_PREFIX + key)
+    except RedisError:
+        content = None
+
+    if content is None:
+        try:
+            content = await qr_render_pool.run(render_qr_code, image_url, image_format)
+        except DataOverflowError as error:
+            raise too_long(error)
+        try:
+            await redis_binary_client.set(QR_PREFIX + key, content, ex=settings.qr_cache_ttl)
+        except RedisError:
+            pass
+
+    qr_cache.set(key, content)
+    return content
+
+
+async def get_qr_codes(image_urls: list[str], image_format: str = "png") -> list[bytes]:
+    """
+    The get_qr_codes function returns encoded QR-codes for many urls at once.
+        Redis is asked for all codes missing in memory with one MGET, and the rest are split
+        into one chunk per worker of qr_render_pool, so a batch renders on every core
+        and takes only as many pool slots as there are workers.
+
+    :param image_urls: list[str]: Data of the QR-codes.
+    :param image_format: str: "png" or "svg".
+    :return: Encoded images in the order of image_urls.
+    :doc-author: yarmel
+    """
+    keys = {image_url: qr_cache_key(image_url, image_format) for image_url in image_urls}
+    found = {}
+    for image_url, key in keys.items():
+        content = qr_cache.get(key)
+        if content is not None:
+            found[image_url] = content
+
+    missing = [image_url for image_url in keys if image_url not in found]
+    if missing:
+        try:
+            cached = await redis_binary_client.mget([QR_PREFIX + keys[url] for url in missing])
+        except RedisError:
+            cached = [None] * len(missing)
+        found.update((url, content) for url, content in zip(missing, cached) if content is not None)
+
+    missing = [image_url for image_url in missing if image_url not in found]
+    if missing:
+        chunk_size = -(-len(missing) // qr_render_pool.max_workers)
+        chunks = [missing[i:i + chunk_size] for i in range(0, len(missing), chunk_size)]
+        try:
+            rendered = await asyncio.gather(
+                *(qr_render_pool.run(render_qr_codes, chunk, image_format) for chunk in chunks)
+            )
+        except DataOverflowError as error:
+            raise too_long(error)
+        for chunk, contents in zip(chunks, rendered):
+            found.update(zip(chunk, contents))
+        try:
+            async with redis_binary_client.pipeline(transaction=False) as pipe:
+                for image_url in missing:
+                    pipe.set(QR_PREFIX + keys[image_url], found[image_url], ex=settings.qr_cache_ttl)
+                await pipe.execute()
+        except RedisError:
+            pass
+
+    for image_url, key in keys.items():
+        qr_cache.set(key, found[image_url])
+    return [found[image_url] for image_url in image_urls]
+
 
-    qr_code = qr.make_image(fill_color="black", back_color="white")
+def build_qr_archive(image_urls: list[str], contents: list[bytes], image_format: str) -> bytes:
+    """
+    The build_qr_archive function packs QR-codes into a ZIP with an index of their urls.
+        Images are stored without compression, PNG is already compressed.
 
-    return qr_code
+    :param image_urls: list[str]: Urls of the codes.
+    :param contents: list[bytes]: Encoded codes in the order of image_urls.
+    :param image_format: str: "png" or "svg".
+    :return: ZIP archive.
+    :doc-author: yarmel
+    """
+    buffer = BytesIO()
+    index = []
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_STORED) as archive:
+        for number, (image_url, content) in enumerate(zip(image_urls, contents), start=1):
+            name = f"qr_{number:04d}.{image_format}"
+            archive.writestr(name, content)
+            index.append(f"{name}\t{image_url}")
+        archive.writestr("index.txt", "\n".join(index) + "\n")
+    return buffer.getvalue()
 
 
-async def generate_qr_url(qr_code: BaseImage):
-    image_io = BytesIO()
-    qr_code.save(image_io, 'PNG')
-    data_url = 'data:image/png;base64,' + b64encode(image_io.getvalue()).decode('ascii')
-    return data_url
+def qr_data_url(content: bytes) -> str:
+    return 'data:image/png;base64,' + b64encode(content).decode('ascii')
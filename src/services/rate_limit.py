@@ -0,0 +1,66 @@
+import time
+from collections import OrderedDict
+
+from fastapi import Request, Response
+from fastapi_limiter import default_identifier, http_default_callback
+from fastapi_limiter.depends import RateLimiter as RedisRateLimiter
+
+from config import settings
+
+
+class TokenBucketLimiter:
+    """
+    In-process token buckets, one per client and route.
+        A bucket holds up to `times` tokens and refills at times / period tokens per second,
+        every request takes one token. Nothing is shared between workers, so with N workers
+        a client may get up to N times the limit.
+    """
+
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        # Least recently used buckets first, evicted when there are more than max_keys
+        self.buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+
+    def hit(self, key: str, times: int, period: float) -> float:
+        """
+        The hit function takes a token from the bucket of key.
+
+        :param key: str: Client and route key.
+        :param times: int: Bucket size, requests allowed per period.
+        :param period: float: Period in seconds.
+        :return: 0 if the request is allowed, otherwise seconds until the next token.
+        """
+        now = time.monotonic()
+        tokens, updated = self.buckets.get(key, (times, now))
+        tokens = min(times, tokens + (now - updated) * times / period)
+        self.buckets[key] = (tokens - 1 if tokens >= 1 else tokens, now)
+        self.buckets.move_to_end(key)
+        if len(self.buckets) > self.max_keys:
+            # An evicted client starts again with a full bucket
+            self.buckets.popitem(last=False)
+        if tokens < 1:
+            return (1 - tokens) * period / times
+        return 0
+
+
+local_limiter = TokenBucketLimiter(settings.rate_limit_max_keys)
+
+
+class RateLimiter(RedisRateLimiter):
+    """
+    Drop-in replacement of fastapi_limiter RateLimiter with a pluggable backend.
+        RATE_LIMIT_BACKEND=local checks an in-process token bucket, no network and no Redis needed.
+        RATE_LIMIT_BACKEND=redis keeps the global fixed window of fastapi_limiter.
+    """
+
+    async def __call__(self, request: Request, response: Response):
+        if settings.rate_limit_backend == "redis":
+            return await super().__call__(request, response)
+
+        identifier = self.identifier or default_identifier
+        callback = self.callback or http_default_callback
+        # id(self) tells apart limiters of the same path, without scanning the app routes
+        key = f"{await identifier(request)}:{id(self)}"
+        retry_after = local_limiter.hit(key, self.times, self.milliseconds / 1000)
+        if retry_after:
+            return await callback(request, response, int(retry_after * 1000) + 1)
@@ -0,0 +1,135 @@
+import hashlib
+import shutil
+import uuid
+from pathlib import Path
+from typing import NamedTuple
+
+import anyio
+from fastapi import HTTPException, UploadFile, status
+from PIL import Image as PILImage
+
+from config import settings
+
+IMAGES_DIR = Path("images")
+BLOBS_DIR = "sha256"
+THUMBS_DIR = "thumbs"
+DERIVED_DIR = "derived"
+THUMBNAIL_SIZE = (256, 256)
+CHUNK_SIZE = 1024 * 1024
+
+
+class StoredFile(NamedTuple):
+    path: str
+    size: int
+    sha256: str
+
+
+async def save_upload(file: UploadFile, max_size: int = settings.image_max_size) -> StoredFile:
+    """
+    The save_upload function streams an uploaded file into a temporary file under images/.
+        Chunks are read and written in worker threads, size and sha256 are computed on the fly.
+        Files over max_size are rejected before or during the copy, partial files are removed.
+
+    :param file: UploadFile: Uploaded file.
+    :param max_size: int: Max file size in bytes.
+    :return: StoredFile with temporary path, size and sha256 hex digest.
+    :doc-author: kagev
+    """
+    if file.size is not None and file.size > max_size:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Image is larger than {max_size} bytes",
+        )
+
+    await anyio.Path(IMAGES_DIR).mkdir(parents=True, exist_ok=True)
+    temp_path = IMAGES_DIR / f".upload-{uuid.uuid4().hex}.tmp"
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        async with await anyio.open_file(temp_path, "wb") as buffer:
+            while chunk := await file.read(CHUNK_SIZE):
+                size += len(chunk)
+                if size > max_size:
+                    raise HTTPException(
+                        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                        detail=f"Image is larger than {max_size} bytes",
+                    )
+                digest.update(chunk)
+                await buffer.write(chunk)
+    except BaseException:
+        await discard(str(temp_path))
+        raise
+
+    return StoredFile(str(temp_path), size, digest.hexdigest())
+
+
+def blob_path(sha256: str) -> str:
+    """
+    The blob_path function returns content-addressed path of a file, sharded by first hash bytes.
+        Example: images/sha256/ab/cd/abcd...
+
+    :param sha256: str: Hex digest of file content.
+    :return: Path of the blob.
+    :doc-author: kagev
+    """
+    return str(IMAGES_DIR / BLOBS_DIR / sha256[:2] / sha256[2:4] / sha256)
+
+
+async def store_blob(stored: StoredFile) -> bool:
+    """
+    The store_blob function moves an uploaded temporary file to its content-addressed path.
+        When the same content is already stored the temporary file is dropped instead, nothing is written.
+
+    :param stored: StoredFile: Result of save_upload.
+    :return: True if the blob was written, False if the same content was already stored.
+    :doc-author: kagev
+    """
+    path = anyio.Path(blob_path(stored.sha256))
+    if await path.exists():
+        await discard(stored.path)
+        return False
+    await path.parent.mkdir(parents=True, exist_ok=True)
+    await anyio.Path(stored.path).rename(path)
+    return True
+
+
+def thumbnail_path(sha256: str) -> str:
+    return str(IMAGES_DIR / THUMBS_DIR / sha256[:2] / sha256[2:4] / f"{sha256}.jpg")
+
+
+def derived_dir(sha256: str) -> str:
+    return str(IMAGES_DIR / DERIVED_DIR / sha256[:2] / sha256)
+
+
+def make_thumbnail(sha256: str, size: tuple[int, int] = THUMBNAIL_SIZE) -> str:
+    """
+    The make_thumbnail function renders a JPEG thumbnail of a stored blob, once per content.
+        Blocking, meant to run in a job worker or a thread.
+
+    :param sha256: str: Hex digest of the blob.
+    :param size: tuple[int, int]: Max width and height of the thumbnail.
+    :return: Path of the thumbnail.
+    :doc-author: kagev
+    """
+    path = Path(thumbnail_path(sha256))
+    if path.exists():
+        return str(path)
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = path.with_suffix(f".{uuid.uuid4().hex}.tmp")
+    with PILImage.open(blob_path(sha256)) as image:
+        image.thumbnail(size)
+        image.convert("RGB").save(temp_path, "JPEG", quality=85)
+    temp_path.replace(path)
+    return str(path)
+
+
+async def remove_blob(sha256: str) -> None:
+    await discard(blob_path(sha256))
+    await discard(thumbnail_path(sha256))
+    await anyio.to_thread.run_sync(shutil.rmtree, derived_dir(sha256), True)
+
+
+async def discard(path: str | None) -> None:
+    if path:
+        await anyio.Path(path).unlink(missing_ok=True)
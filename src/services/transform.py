@@ -0,0 +1,146 @@
+import uuid
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+from fastapi import HTTPException, status
+from PIL import Image as PILImage, ImageChops, ImageDraw, ImageOps, UnidentifiedImageError
+
+from config import settings
+from src.services import storage
+from src.services.worker_pool import BoundedExecutor
+
+CROP_MODES = ("fill", "lfill", "fill_pad", "crop", "thumb")
+
+# Pillow releases the GIL while resampling and encoding, threads are enough here
+transform_pool = BoundedExecutor(settings.transform_workers, settings.transform_queue, "transform")
+
+
+class TransformParams(NamedTuple):
+    width: int
+    height: int
+    crop: str = "fill"
+    radius: Optional[str] = None
+    quality: int = 80
+
+    @property
+    def key(self) -> str:
+        """
+        Cloudinary-like transformation string, e.g. w_200,h_100,c_fill,r_max,q_80.
+            Same parameters always give the same key, it names the derivative file.
+        """
+        parts = [f"w_{self.width}", f"h_{self.height}", f"c_{self.crop}"]
+        if self.radius:
+            parts.append(f"r_{self.radius}")
+        parts.append(f"q_{self.quality}")
+        return ",".join(parts)
+
+
+def resize(image: PILImage.Image, params: TransformParams) -> PILImage.Image:
+    """
+    The resize function applies the crop mode of Cloudinary to the image, gravity is always the center.
+        fill, thumb - scale to cover width x height and cut the overflow.
+        lfill - like fill, but never upscales, a small image is only cut to the aspect ratio.
+        fill_pad - scale to fit into width x height and pad the rest.
+        crop - cut a width x height region of the original, no scaling.
+
+    :param image: PILImage.Image: Source image.
+    :param params: TransformParams: Transformation parameters.
+    :return: Resized image.
+    :doc-author: kagev
+    """
+    size = (params.width, params.height)
+    if params.crop in ("fill", "thumb"):
+        return ImageOps.fit(image, size, PILImage.LANCZOS)
+    if params.crop == "lfill":
+        scale = min(1.0, image.width / params.width, image.height / params.height)
+        size = (max(1, round(params.width * scale)), max(1, round(params.height * scale)))
+        return ImageOps.fit(image, size, PILImage.LANCZOS)
+    if params.crop == "fill_pad":
+        if image.mode not in ("RGBA", "LA"):
+            image = image.convert("RGBA")
+        return ImageOps.pad(image, size, PILImage.LANCZOS, color=(0, 0, 0, 0))
+    if params.crop == "crop":
+        width, height = min(params.width, image.width), min(params.height, image.height)
+        left, top = (image.width - width) // 2, (image.height - height) // 2
+        return image.crop((left, top, left + width, top + height))
+    raise ValueError(f"Unknown crop mode: {params.crop}")
+
+
+def round_corners(image: PILImage.Image, radius: str) -> PILImage.Image:
+    radius = min(image.size) // 2 if radius == "max" else int(radius)
+    mask = PILImage.new("L", image.size, 0)
+    ImageDraw.Draw(mask).rounded_rectangle((0, 0, image.width - 1, image.height - 1), radius, fill=255)
+    image = image.convert("RGBA")
+    image.putalpha(ImageChops.multiply(image.getchannel("A"), mask))
+    return image
+
+
+def render(source: str, params: TransformParams, target: Path) -> None:
+    with PILImage.open(source) as image:
+        image = ImageOps.exif_transpose(image)
+        image = resize(image, params)
+        if params.radius:
+            image = round_corners(image, params.radius)
+
+        if target.suffix == ".png":
+            image.save(target, "PNG", optimize=True)
+        else:
+            image.convert("RGB").save(target, "JPEG", quality=params.quality, optimize=True)
+
+
+def derivative_path(sha256: str, params: TransformParams, has_alpha: bool) -> Path:
+    extension = "png" if has_alpha or params.radius or params.crop == "fill_pad" else "jpg"
+    return Path(storage.derived_dir(sha256)) / f"{params.key}.{extension}"
+
+
+def transform_blob(sha256: str, params: TransformParams) -> str:
+    """
+    The transform_blob function returns the path of the transformed copy of a stored blob.
+        Derivatives are cached on disk by source hash and parameters and rendered only once,
+        renders are written to a temporary file and renamed, so readers never see a partial file.
+        Blocking, call it through transform_pool.
+
+    :param sha256: str: Hex digest of the source blob.
+    :param params: TransformParams: Transformation parameters.
+    :return: Path of the derivative.
+    :doc-author: kagev
+    """
+    source = storage.blob_path(sha256)
+    for has_alpha in (False, True):
+        path = derivative_path(sha256, params, has_alpha)
+        if path.exists():
+            return str(path)
+
+    with PILImage.open(source) as image:
+        has_alpha = image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info
+    path = derivative_path(sha256, params, has_alpha)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = path.with_name(f".{uuid.uuid4().hex}{path.suffix}")
+    try:
+        render(source, params, temp_path)
+        temp_path.replace(path)
+    finally:
+        temp_path.unlink(missing_ok=True)
+    return str(path)
+
+
+async def transform_image(sha256: str, params: TransformParams) -> str:
+    """
+    The transform_image function renders or finds the derivative of a blob in transform_pool.
+
+    :param sha256: str: Hex digest of the source blob.
+    :param params: TransformParams: Transformation parameters.
+    :return: Path of the derivative.
+    :doc-author: kagev
+    """
+    try:
+        return await transform_pool.run(transform_blob, sha256, params)
+    except FileNotFoundError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Image file not found"
+        )
+    except (UnidentifiedImageError, PILImage.DecompressionBombError):
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="Image file can't be transformed",
+        )
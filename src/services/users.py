@@ -1,5 +1,5 @@
 from fastapi import HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.database.connection import get_db, user
 from src.database.models import User
@@ -7,7 +7,7 @@ from src.repository import users as users_repository
 
 
 class Users:
-	async def get_user_by_email(self, user_email: str, db: Session = get_db) -> User:
+	async def get_user_by_email(self, user_email: str, db: AsyncSession = get_db) -> User:
 		"""
 
 		:rtype: object
@@ -23,7 +23,7 @@ class Users:
 			)
 		return user
 
-	async def get_user_by_username(self, username: str, db: Session = get_db) -> User:
+	async def get_user_by_username(self, username: str, db: AsyncSession = get_db) -> User:
 		"""
 
 		:rtype: object
@@ -0,0 +1,71 @@
+import asyncio
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Any, Callable
+
+from fastapi import HTTPException, status
+
+
+class BoundedExecutor:
+    """
+    Runs blocking or CPU-heavy calls outside the event loop with a limit on waiting work.
+        At most max_workers calls run at once and max_queue more may wait for a worker.
+        Calls over that limit are rejected with HTTP 503 instead of piling up behind the pool.
+    """
+
+    def __init__(
+            self,
+            max_workers: int,
+            max_queue: int,
+            name: str,
+            executor_class: type[Executor] = ThreadPoolExecutor,
+    ):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.executor_class = executor_class
+        self._executor = None
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+
+    @property
+    def executor(self) -> Executor:
+        if self._executor is None:
+            if self.executor_class is ThreadPoolExecutor:
+                self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix=self.name)
+            else:
+                self._executor = self.executor_class(self.max_workers)
+        return self._executor
+
+    async def run(self, func: Callable, *args) -> Any:
+        """
+        The run function calls func(*args) in the pool and waits for the result.
+
+        :param func: Callable: Blocking function, must be picklable for process pools.
+        :param args: Positional arguments for func.
+        :return: Result of func.
+        """
+        if self.in_flight >= self.max_workers + self.max_queue:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Server is busy, try again later",
+                headers={"Retry-After": "1"},
+            )
+
+        self.in_flight += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+        finally:
+            self.in_flight -= 1
+            self.completed += 1
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "queue_depth": max(0, self.in_flight - self.max_workers),
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
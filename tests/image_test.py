@@ -1,22 +1,34 @@
+import tempfile
 import unittest
-from src.database.models import User, Image
-from src.repository.image import create_image, get_image, change_description, delte_image_by_id
-from sqlalchemy.orm import Session
-from unittest.mock import MagicMock
+from pathlib import Path
+from fastapi import UploadFile
+from src.database.models import User, Image, Tag
+from src.repository.image import create_image, get_image, get_feed, change_description, delte_image_by_id, resolve_tags
+from src.services import storage
+from sqlalchemy.ext.asyncio import AsyncSession
+from unittest.mock import MagicMock, patch
 from io import BytesIO
+from datetime import datetime
 
 
 class TestImage(unittest.IsolatedAsyncioTestCase):
     def setUp(self) -> None:
-        self.session = MagicMock(spec=Session)
+        self.session = MagicMock(spec=AsyncSession)
+        self.session.execute.return_value = MagicMock()
+        self.session.scalars.side_effect = lambda statement, params: [Tag(name=item["name"]) for item in params]
         self.user = User(id=1)
+        self.images_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.images_dir.cleanup)
+        patcher = patch.object(storage, "IMAGES_DIR", Path(self.images_dir.name))
+        patcher.start()
+        self.addCleanup(patcher.stop)
 
     async def test_create_image(self):
         #создание тестовх данных
         user_id = 1
         description = 'Test image'
         tags = ['tags1', 'tags2']
-        file = BytesIO(b'Test image')
+        file = UploadFile(BytesIO(b'Test image'), filename='test.png')
 
         # Вызов тестируемой функции
         image =await create_image(file, user_id, description, tags, db=self.session)
@@ -33,7 +45,7 @@ class TestImage(unittest.IsolatedAsyncioTestCase):
         user_id = 1
         description = 'Test image'
         tags = ['tags1', 'tags2']
-        file = BytesIO(b'Test image')
+        file = UploadFile(BytesIO(b'Test image'), filename='test.png')
 
         # Создание изображения в базе данных
         image =await create_image(file, user_id, description, tags, db=self.session)
@@ -50,7 +62,7 @@ class TestImage(unittest.IsolatedAsyncioTestCase):
         user_id = 1
         description = "Test image"
         tags = ["tag1", "tag2"]
-        file = BytesIO(b'Test image content')
+        file = UploadFile(BytesIO(b'Test image content'), filename='test.png')
 
         # Создание изображения в базе данных
         image =await create_image(file, user_id, description, tags, db=self.session)
@@ -70,7 +82,7 @@ class TestImage(unittest.IsolatedAsyncioTestCase):
         user_id = 1
         description = "Test image"
         tags = ["tag1", "tag2"]
-        file = BytesIO(b'Test image content')
+        file = UploadFile(BytesIO(b'Test image content'), filename='test.png')
 
         # Создание изображения в базе данных
         image =await create_image(file, user_id, description, tags, db=self.session)
@@ -84,5 +96,27 @@ class TestImage(unittest.IsolatedAsyncioTestCase):
         self.assertIsNone(self.session.query(Image).filter(Image.id == image_id).first())
 
 
+    async def test_resolve_tags(self):
+        self.session.execute.return_value.scalars.return_value = [Tag(name='old')]
+
+        tags = await resolve_tags(['new', 'old', 'new', ' '], db=self.session)
+
+        self.assertEqual([tag.name for tag in tags], ['new', 'old'])
+        self.session.execute.assert_called_once()
+        self.assertEqual(self.session.scalars.call_args.args[1], [{'name': 'new'}])
+
+
+    async def test_get_feed(self):
+        images = [Image(id=2, user_id=1), Image(id=1, user_id=1)]
+        self.session.execute.return_value.scalars.return_value = images
+
+        result = await get_feed(self.session, 2, (datetime(2023, 10, 1), 3), user_id=1, tag='cat')
+
+        self.assertEqual(result, images)
+        statement = str(self.session.execute.call_args.args[0])
+        self.assertIn('(images.created_at, images.id) < (', statement)
+        self.assertIn('ORDER BY images.created_at DESC, images.id DESC', statement)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,22 @@
+import unittest
+
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from src.database.models import Base
+
+
+class SQLiteTestCase(unittest.IsolatedAsyncioTestCase):
+    """
+    Repository tests against a fresh in-memory SQLite database.
+        Every test gets its own engine with all tables created and an open session in self.session.
+    """
+
+    async def asyncSetUp(self):
+        self.engine = create_async_engine("sqlite+aiosqlite://")
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        self.session = async_sessionmaker(self.engine, expire_on_commit=False)()
+
+    async def asyncTearDown(self):
+        await self.session.close()
+        await self.engine.dispose()
@@ -77,8 +77,13 @@ class TestRefreshToken:
     def test_refresh_token_was_successfully(self, client, session, user):
         # Test a valid token refresh request
         db_user = session.scalar(select(User).filter(User.email == user['email']))
+        jti, db_user.refresh_token_hash = auth_service.new_jti()
+        session.commit()
+        refresh_token = asyncio.run(
+            auth_service.create_refresh_token(data={"email": user['email'], "jti": jti})
+        )
 
-        headers = {"Authorization": f"Bearer {db_user.refresh_token}"}
+        headers = {"Authorization": f"Bearer {refresh_token}"}
         response = client.get(self.url_path, headers=headers)
 
         assert response.status_code == status.HTTP_200_OK
@@ -0,0 +1,115 @@
+import asyncio
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import AsyncMock, MagicMock
+
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import QueuePool
+
+from src.database.connection import PoolStats, ReplicaRouter
+
+
+class TestPoolStats(unittest.TestCase):
+    def setUp(self):
+        self.stats = PoolStats()
+        self.pool = MagicMock(spec=QueuePool)
+        self.pool.size.return_value = 5
+        self.pool.checkedin.return_value = 3
+        self.pool.checkedout.return_value = 2
+        self.pool.overflow.return_value = -3
+
+    def test_observe_fills_buckets(self):
+        self.stats.observe(0.0005)
+        self.stats.observe(0.02)
+        self.stats.observe(10)
+
+        self.assertEqual(self.stats.waits, 3)
+        self.assertEqual(self.stats.histogram[0], 1)
+        self.assertEqual(self.stats.histogram[3], 1)
+        self.assertEqual(self.stats.histogram[-1], 1)
+        self.assertEqual(self.stats.max_wait, 10)
+
+    def test_snapshot(self):
+        self.stats.observe(0.002)
+        self.stats.timeouts = 1
+
+        result = self.stats.snapshot(self.pool)
+
+        self.assertEqual(result["size"], 5)
+        self.assertEqual(result["checked_out"], 2)
+        self.assertEqual(result["overflow"], -3)
+        self.assertEqual(result["timeouts"], 1)
+        self.assertEqual(result["avg_wait_ms"], 2.0)
+        self.assertEqual(result["wait_histogram"]["<=5ms"], 1)
+        self.assertEqual(sum(result["wait_histogram"].values()), 1)
+
+    def test_snapshot_without_waits(self):
+        result = self.stats.snapshot(self.pool)
+
+        self.assertEqual(result["avg_wait_ms"], 0.0)
+        self.assertEqual(result["waits"], 0)
+
+
+class TestReplicaRouter(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.first = create_async_engine(f"sqlite+aiosqlite:///{Path(self.tmp.name) / 'first.db'}")
+        self.second = create_async_engine(f"sqlite+aiosqlite:///{Path(self.tmp.name) / 'second.db'}")
+        self.missing = create_async_engine(f"sqlite+aiosqlite:///{Path(self.tmp.name) / 'no' / 'such.db'}")
+
+    async def asyncTearDown(self):
+        for engine in (self.first, self.second, self.missing):
+            await engine.dispose()
+        self.tmp.cleanup()
+
+    async def test_without_replicas_uses_primary(self):
+        router = ReplicaRouter([], max_lag=1, check_interval=5)
+
+        self.assertIsNone(await router.get_replica())
+
+    async def test_round_robin(self):
+        router = ReplicaRouter([self.first, self.second], max_lag=1, check_interval=5)
+        await router.refresh()
+
+        picked = {await router.get_replica() for _ in range(4)}
+
+        self.assertEqual(picked, {self.first, self.second})
+
+    async def test_unreachable_replica_is_skipped(self):
+        router = ReplicaRouter([self.missing, self.second], max_lag=1, check_interval=5)
+        await router.refresh()
+
+        for _ in range(3):
+            self.assertIs(await router.get_replica(), self.second)
+        self.assertIsNone(router.lags[self.missing])
+
+    async def test_lagging_replicas_fall_back_to_primary(self):
+        router = ReplicaRouter([self.first, self.second], max_lag=1, check_interval=5)
+        await router.refresh()
+        router.lags = {self.first: 3.0, self.second: 10.0}
+
+        self.assertIsNone(await router.get_replica())
+
+    async def test_probe_runs_in_background(self):
+        router = ReplicaRouter([self.first], max_lag=1, check_interval=5)
+
+        # Nothing is known yet, the request goes to the primary and doesn't wait for the probe
+        self.assertIsNone(await router.get_replica())
+        await router._refresh_task
+
+        self.assertIs(await router.get_replica(), self.first)
+
+    async def test_hanging_replica_times_out(self):
+        hanging = MagicMock()
+        hanging.connect.return_value.__aenter__ = AsyncMock(side_effect=asyncio.Event().wait)
+        router = ReplicaRouter([hanging, self.second], max_lag=1, check_interval=5, probe_timeout=0.05)
+
+        await asyncio.wait_for(router.refresh(), 1)
+
+        self.assertIsNone(router.lags[hanging])
+        self.assertEqual(router.lags[self.second], 0.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
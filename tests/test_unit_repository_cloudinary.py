@@ -0,0 +1,54 @@
+import unittest
+from unittest.mock import patch
+
+from config import settings
+from src.repository.cloudinary import get_resource, list_resources, resource_url, save_resource
+from tests.sqlite_case import SQLiteTestCase
+
+
+class TestCloudinaryResources(SQLiteTestCase):
+    async def test_save_and_overwrite(self):
+        first = await save_resource({"public_id": "folder/a", "version": 1, "format": "jpg", "tags": ["x"]}, self.session)
+        second = await save_resource({"public_id": "folder/a", "version": 2, "format": "png", "tags": ["y", "z"]}, self.session)
+
+        self.assertEqual(first.id, second.id)
+        self.assertEqual(second.version, 2)
+        self.assertEqual(second.tags, "y,z")
+        self.assertEqual(await list_resources(self.session, 10, tag="x"), [])
+        self.assertIn("/v2/folder/a.png", resource_url(second))
+
+    async def test_get_resource(self):
+        await save_resource({"public_id": "folder/a", "version": 1}, self.session)
+
+        self.assertEqual((await get_resource("folder/a", self.session)).version, 1)
+        self.assertIsNone(await get_resource("folder/missing", self.session))
+
+    async def test_list_resources(self):
+        for number in range(4):
+            await save_resource(
+                {"public_id": f"folder/{number}", "tags": ["even" if number % 2 == 0 else "odd"]},
+                self.session,
+            )
+
+        everything = await list_resources(self.session, 10)
+        even = await list_resources(self.session, 10, tag="even")
+        next_page = await list_resources(self.session, 2, before_id=everything[1].id)
+
+        self.assertEqual([r.public_id for r in everything], ["folder/3", "folder/2", "folder/1", "folder/0"])
+        self.assertEqual([r.public_id for r in even], ["folder/2", "folder/0"])
+        self.assertEqual([r.public_id for r in next_page], ["folder/1", "folder/0"])
+
+
+    async def test_presets_stored(self):
+        presets = {"thumbnail": {"width": 150, "height": 150, "crop": "thumb"}, "optimized": {"quality": "auto"}}
+
+        with patch.object(settings, "cloudinary_presets", presets):
+            resource = await save_resource({"public_id": "folder/a", "version": 7, "format": "jpg"}, self.session)
+
+        self.assertEqual(set(resource.presets), {"thumbnail", "optimized"})
+        self.assertIn("/c_thumb,h_150,w_150/v7/folder/a.jpg", resource.presets["thumbnail"])
+        self.assertIn("/q_auto/v7/folder/a.jpg", resource.presets["optimized"])
+
+
+if __name__ == '__main__':
+    unittest.main()
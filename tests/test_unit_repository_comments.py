@@ -0,0 +1,67 @@
+import unittest
+from datetime import datetime
+from unittest.mock import MagicMock
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.database.models import Comment, Image, User
+from src.repository.comments import create_comment, get_comment_previews, get_comments
+from src.schemas.comments import CommentModel
+
+
+class TestComments(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.session = MagicMock(spec=AsyncSession)
+        self.session.execute.return_value = MagicMock()
+        self.user = User(id=1)
+
+    async def test_create_comment(self):
+        image = Image(id=1, user_id=1)
+        self.session.execute.return_value.scalar.return_value = image
+
+        result = await create_comment(1, CommentModel(content="nice"), self.user, self.session)
+
+        self.assertEqual(result.content, "nice")
+        self.assertIs(result.user, self.user)
+        self.assertIs(result.image, image)
+        self.session.commit.assert_called_once()
+
+    async def test_create_comment_image_not_found(self):
+        self.session.execute.return_value.scalar.return_value = None
+
+        result = await create_comment(1, CommentModel(content="nice"), self.user, self.session)
+
+        self.assertIsNone(result)
+        self.session.add.assert_not_called()
+
+    async def test_get_comments(self):
+        comments = [Comment(id=4), Comment(id=5)]
+        self.session.execute.return_value.scalars.return_value.unique.return_value = comments
+
+        result = await get_comments(1, self.session, 2, (datetime(2023, 10, 1), 3))
+
+        self.assertEqual(result, comments)
+        statement = str(self.session.execute.call_args.args[0])
+        self.assertIn("(comments.created_at, comments.id) > (", statement)
+        self.assertIn("ORDER BY comments.created_at, comments.id", statement)
+        self.assertIn("JOIN users", statement)
+
+    async def test_get_comment_previews(self):
+        first, second, other = Comment(id=1, image_id=1), Comment(id=2, image_id=1), Comment(id=3, image_id=2)
+        self.session.execute.return_value.scalars.return_value = [second, other, first]
+
+        result = await get_comment_previews([1, 2, 3], 2, self.session)
+
+        self.assertEqual(result, {1: [second, first], 2: [other]})
+        statement = str(self.session.execute.call_args.args[0])
+        self.assertIn("row_number() OVER (PARTITION BY comments.image_id", statement)
+
+    async def test_get_comment_previews_without_images(self):
+        result = await get_comment_previews([], 2, self.session)
+
+        self.assertEqual(result, {})
+        self.session.execute.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+import io
+import tempfile
+import unittest
+from datetime import datetime
+from pathlib import Path
+from unittest.mock import AsyncMock, patch
+
+from fastapi import UploadFile
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.exc import SQLAlchemyError
+
+from src.database.models import Comment, Image, Tag, User
+from src.repository.comments import create_comment, delete_comment
+from src.repository.counters import reconcile_counters
+from src.repository import image as image_repository
+from src.repository.image import create_image, delte_image_by_id, resolve_tags, update_tags
+from src.schemas.comments import CommentModel
+from src.services import storage
+from tests.sqlite_case import SQLiteTestCase
+
+
+class TestCounters(SQLiteTestCase):
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        self.user = User(id=1, username="user", email="user@example.com", password="x", image_count=1)
+        self.session.add(self.user)
+        self.session.add(Image(
+            id=1, user_id=1, tags=await resolve_tags(["cat", "dog"], self.session),
+            created_at=datetime(2023, 10, 1),
+        ))
+        await self.session.flush()
+        for tag in await resolve_tags(["cat", "dog"], self.session):
+            tag.image_count = 1
+        await self.session.commit()
+
+    async def counts(self) -> dict:
+        tags = await self.session.execute(select(Tag.name, Tag.image_count))
+        return {
+            "comments": await self.session.scalar(select(Image.comment_count).filter(Image.id == 1)),
+            "tags": dict(tags.all()),
+            "user": await self.session.scalar(select(User.image_count).filter(User.id == 1)),
+        }
+
+    async def test_comments(self):
+        first = await create_comment(1, CommentModel(content="first"), self.user, self.session)
+        await create_comment(1, CommentModel(content="second"), self.user, self.session)
+        self.assertEqual((await self.counts())["comments"], 2)
+
+        await delete_comment(first.id, self.user, self.session)
+        self.assertEqual((await self.counts())["comments"], 1)
+
+    async def test_update_tags(self):
+        _, added = await update_tags(1, 1, ["dog", "bird"], self.session)
+
+        self.assertEqual(added, ["bird"])
+        self.assertEqual((await self.counts())["tags"], {"cat": 0, "dog": 1, "bird": 1})
+
+    async def test_delete_image(self):
+        self.assertTrue(await delte_image_by_id(1, 1, self.session))
+
+        self.assertEqual(await self.counts(), {"comments": None, "tags": {"cat": 0, "dog": 0}, "user": 0})
+
+    async def test_delete_image_removes_blob_after_commit(self):
+        await self.session.execute(update(Image).filter(Image.id == 1).values(file_hash="ab" * 32))
+        await self.session.commit()
+
+        with patch.object(storage, "remove_blob", AsyncMock()) as remove_blob, \
+                patch.object(self.session, "commit", AsyncMock(side_effect=SQLAlchemyError)):
+            with self.assertRaises(SQLAlchemyError):
+                await delte_image_by_id(1, 1, self.session)
+        remove_blob.assert_not_awaited()
+        await self.session.rollback()
+
+        with patch.object(storage, "remove_blob", AsyncMock()) as remove_blob:
+            self.assertTrue(await delte_image_by_id(1, 1, self.session))
+        remove_blob.assert_awaited_once_with("ab" * 32)
+
+    async def test_failed_upload_removes_new_blob(self):
+        with tempfile.TemporaryDirectory() as images_dir, \
+                patch.object(storage, "IMAGES_DIR", Path(images_dir)), \
+                patch.object(image_repository, "count_images", AsyncMock(side_effect=SQLAlchemyError)):
+            with self.assertRaises(SQLAlchemyError):
+                await create_image(UploadFile(io.BytesIO(b"content")), 1, "new", ["cat"], self.session)
+
+            self.assertEqual([path for path in Path(images_dir).rglob("*") if path.is_file()], [])
+        self.assertEqual(await self.session.scalar(select(func.count(Image.id))), 1)
+
+    async def test_reconcile(self):
+        await self.session.execute(insert(Comment), [
+            {"content": "raw", "user_id": 1, "image_id": 1} for _ in range(3)
+        ])
+        await self.session.execute(update(Tag).filter(Tag.name == "cat").values(image_count=7))
+        await self.session.commit()
+
+        self.assertEqual(await reconcile_counters(self.session), {"images": 1, "tags": 1, "users": 0})
+        self.assertEqual(await self.counts(), {"comments": 3, "tags": {"cat": 1, "dog": 1}, "user": 1})
+        self.assertEqual(await reconcile_counters(self.session), {"images": 0, "tags": 0, "users": 0})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import unittest
+from datetime import datetime
+
+from sqlalchemy import update
+
+from src.database.models import Image, User
+from src.repository.image import resolve_tags, search_images
+from tests.sqlite_case import SQLiteTestCase
+
+
+class TestSearchImages(SQLiteTestCase):
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        self.session.add(User(id=1, username="user", email="user@example.com", password="x"))
+        for number, (description, tags) in enumerate([
+            ("A black cat on the sofa", ["cat", "home"]),
+            ("Dog in the park", ["dog", "park"]),
+            ("Cat and dog playing", ["cat", "dog"]),
+            ("Empty park at night", ["park"]),
+        ], start=1):
+            self.session.add(Image(
+                id=number, user_id=1, description=description,
+                tags=await resolve_tags(tags, self.session),
+                created_at=datetime(2023, 10, number),
+            ))
+        await self.session.commit()
+
+    async def search(self, **kwargs):
+        return [image.id for image in await search_images(self.session, 10, **kwargs)]
+
+    async def test_tags_all(self):
+        self.assertEqual(await self.search(tags=["cat", "dog"]), [3])
+        self.assertEqual(await self.search(tags=["cat", "cat"]), [3, 1])
+
+    async def test_tags_any(self):
+        self.assertEqual(await self.search(tags=["home", "dog"], match_all=False), [3, 2, 1])
+
+    async def test_description(self):
+        self.assertEqual(await self.search(text="cat"), [3, 1])
+        self.assertEqual(await self.search(text="park dog"), [2])
+        self.assertEqual(await self.search(text='" OR *'), [])
+
+    async def test_description_follows_updates(self):
+        await self.session.execute(
+            update(Image).filter(Image.id == 4).values(description="Cat in the park")
+        )
+        await self.session.commit()
+
+        self.assertEqual(await self.search(text="cat park"), [4])
+        self.assertEqual(await self.search(text="night"), [])
+
+    async def test_combined_with_cursor(self):
+        self.assertEqual(
+            await self.search(tags=["park"], text="park", after=(datetime(2023, 10, 4), 4)), [2]
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
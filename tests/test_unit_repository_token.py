@@ -0,0 +1,159 @@
+import asyncio
+import time
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from redis.exceptions import ConnectionError
+
+from src.repository import token as token_repository
+from src.services.bloom_filter import BloomFilter
+
+
+class TestRepositoryToken(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        patcher = patch.object(token_repository, "redis_client", new=AsyncMock())
+        self.redis = patcher.start()
+        self.addCleanup(patcher.stop)
+        bloom_patcher = patch.object(token_repository, "blacklist_filter", new=BloomFilter(100))
+        self.bloom = bloom_patcher.start()
+        self.addCleanup(bloom_patcher.stop)
+        synced_patcher = patch.object(token_repository, "blacklist_synced", new=True)
+        synced_patcher.start()
+        self.addCleanup(synced_patcher.stop)
+        unsaved_patcher = patch.dict(token_repository.unsaved_revocations, clear=True)
+        unsaved_patcher.start()
+        self.addCleanup(unsaved_patcher.stop)
+
+    async def test_add_token_to_blacklist(self):
+        self.redis.set.return_value = True
+        expires_at = int(time.time()) + 600
+
+        result = await token_repository.add_token_to_blacklist("email@example.com", "token", expires_at)
+
+        self.assertTrue(result)
+        key = token_repository.BLACKLIST_PREFIX + token_repository.token_digest("token")
+        args, kwargs = self.redis.set.call_args
+        self.assertEqual(args, (key, "email@example.com"))
+        self.assertTrue(kwargs["nx"])
+        self.assertAlmostEqual(kwargs["ex"], 600, delta=2)
+        self.redis.publish.assert_awaited_once()
+        self.assertIn(token_repository.token_digest("token"), self.bloom)
+
+    async def test_add_token_already_blacklisted(self):
+        self.redis.set.return_value = None
+
+        result = await token_repository.add_token_to_blacklist("email@example.com", "token", int(time.time()) + 600)
+
+        self.assertFalse(result)
+        self.redis.publish.assert_not_awaited()
+
+    async def test_add_expired_token(self):
+        result = await token_repository.add_token_to_blacklist("email@example.com", "token", int(time.time()) - 1)
+
+        self.assertTrue(result)
+        self.redis.set.assert_not_awaited()
+
+    async def test_is_token_blacklisted_bloom_miss(self):
+        result = await token_repository.is_token_blacklisted("token")
+
+        self.assertFalse(result)
+        self.redis.exists.assert_not_awaited()
+
+    async def test_is_token_blacklisted_bloom_hit(self):
+        self.bloom.add(token_repository.token_digest("token"))
+        self.redis.exists.return_value = 1
+
+        result = await token_repository.is_token_blacklisted("token")
+
+        self.assertTrue(result)
+        self.redis.exists.assert_awaited_once()
+
+    async def test_is_token_blacklisted_without_sync(self):
+        token_repository.blacklist_synced = False
+        self.redis.exists.return_value = 1
+
+        result = await token_repository.is_token_blacklisted("token")
+
+        self.assertTrue(result)
+        self.redis.exists.assert_awaited_once()
+
+    async def test_redis_unreachable(self):
+        token_repository.blacklist_synced = False
+        self.redis.set.side_effect = ConnectionError("connection refused")
+        self.redis.exists.side_effect = ConnectionError("connection refused")
+        expires_at = int(time.time()) + 600
+
+        with self.assertLogs(token_repository.logger, "WARNING"):
+            added = await token_repository.add_token_to_blacklist("email@example.com", "token", expires_at)
+            added_again = await token_repository.add_token_to_blacklist("email@example.com", "token", expires_at)
+            revoked = await token_repository.is_token_blacklisted("token")
+            other = await token_repository.is_token_blacklisted("other")
+
+        self.assertTrue(added)
+        self.assertFalse(added_again)
+        self.assertTrue(revoked)
+        self.assertFalse(other)
+
+        self.redis.set.side_effect = None
+        await token_repository.save_revocations()
+
+        key = token_repository.BLACKLIST_PREFIX + token_repository.token_digest("token")
+        self.assertEqual(self.redis.set.call_args.args, (key, "email@example.com"))
+        self.redis.publish.assert_awaited_once_with(
+            token_repository.BLACKLIST_CHANNEL, token_repository.token_digest("token")
+        )
+        self.assertEqual(token_repository.unsaved_revocations, {})
+
+    async def test_rebuild_keeps_tokens_revoked_during_scan(self):
+        async def scan_iter(**kwargs):
+            yield token_repository.BLACKLIST_PREFIX + "old"
+            token_repository.remember_revoked("new")
+
+        self.redis.scan_iter = scan_iter
+
+        await token_repository.rebuild_blacklist()
+
+        self.assertIn("old", token_repository.blacklist_filter)
+        self.assertIn("new", token_repository.blacklist_filter)
+        self.assertIsNone(token_repository.rebuild_pending)
+
+    async def test_sync_recovers_after_connection_loss(self):
+        async def broken():
+            raise ConnectionError("connection lost")
+            yield
+
+        async def messages():
+            yield {"type": "subscribe", "data": 1}
+            yield {"type": "message", "data": "revoked"}
+            await asyncio.Event().wait()
+
+        first, second = MagicMock(), MagicMock()
+        first.subscribe = second.subscribe = AsyncMock()
+        first.reset = second.reset = AsyncMock()
+        first.listen = broken
+        second.listen = messages
+        self.redis.pubsub = MagicMock(side_effect=[first, second])
+        self.redis.scan_iter = MagicMock(side_effect=lambda **kwargs: self.empty_scan())
+
+        with patch.object(token_repository, "SYNC_RETRY_DELAY", 0), \
+                self.assertLogs(token_repository.logger, "ERROR"):
+            task = asyncio.create_task(token_repository.sync_blacklist())
+            for _ in range(20):
+                await asyncio.sleep(0)
+            self.assertTrue(token_repository.blacklist_synced)
+            self.assertIn("revoked", token_repository.blacklist_filter)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        self.assertFalse(token_repository.blacklist_synced)
+        self.assertEqual(self.redis.scan_iter.call_count, 2)
+
+    @staticmethod
+    async def empty_scan():
+        return
+        yield
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,16 +1,27 @@
+import asyncio
 import unittest
-from unittest.mock import MagicMock
+from unittest.mock import AsyncMock, MagicMock, patch
 
-from sqlalchemy.orm import Session
+from redis.exceptions import RedisError
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.database.models import User
 from src.schemas.users import UserModel, UserProfileUpdate
 from src.repository import users as users_repository
+from tests.sqlite_case import SQLiteTestCase
 
 
 class TestRepositoryUsers(unittest.IsolatedAsyncioTestCase):
     def setUp(self):
-        self.session = MagicMock(spec=Session)
+        self.session = MagicMock(spec=AsyncSession)
+        self.session.execute.return_value = MagicMock()
+        patcher = patch.object(users_repository, "redis_client", new=AsyncMock())
+        self.redis = patcher.start()
+        self.addCleanup(patcher.stop)
+        users_repository.user_cache.clear()
+        synced_patcher = patch.object(users_repository, "user_cache_synced", new=True)
+        synced_patcher.start()
+        self.addCleanup(synced_patcher.stop)
         self.test_user = User(
             username="username",
             email="email@example.com",
@@ -23,6 +34,7 @@ class TestRepositoryUsers(unittest.IsolatedAsyncioTestCase):
         self.user_profile_update_body = UserProfileUpdate(
             username="username",
             email="email@example.com",
+            about="about",
         )
 
     async def test_create_user(self):
@@ -39,12 +51,16 @@ class TestRepositoryUsers(unittest.IsolatedAsyncioTestCase):
         self.session.commit.assert_called_once()
         self.session.refresh.assert_called_once_with(result)
 
-    async def test_users_count(self):
-        self.session.execute.return_value.scalar.return_value = 1
+    async def test_find_registered(self):
+        self.session.execute.return_value.all.return_value = [
+            MagicMock(email="email@example.com", username="other"),
+        ]
 
-        result = await users_repository.users_count(db=self.session)
+        result = await users_repository.find_registered("email@example.com", "username", self.session)
 
-        self.assertEqual(result, 1)
+        self.assertEqual(result, (True, False))
+        statement = str(self.session.execute.call_args.args[0])
+        self.assertIn("users.email = :email_1 OR users.username = :username_1", statement)
 
     async def test_get_user_by_email_found(self):
         mock_user = User()
@@ -84,7 +100,7 @@ class TestRepositoryUsers(unittest.IsolatedAsyncioTestCase):
         result = await users_repository.update_token(user=mock_user, token=new_token, db=self.session)
 
         self.assertIsNone(result)
-        self.assertEqual(mock_user.refresh_token, new_token)
+        self.assertEqual(mock_user.refresh_token_hash, new_token)
         self.session.commit.assert_called_once()
 
     async def test_assign_admin_role(self):
@@ -157,5 +173,123 @@ class TestRepositoryUsers(unittest.IsolatedAsyncioTestCase):
         self.session.commit.assert_called_once()
 
 
+    async def test_get_cached_user_by_email(self):
+        db_user = User(id=1, username="username", email="email@example.com")
+        self.session.execute.return_value.scalar.return_value = db_user
+
+        result = await users_repository.get_cached_user_by_email("email@example.com", self.session)
+        self.assertIs(result, db_user)
+
+        self.session.merge.return_value = db_user
+        await users_repository.get_cached_user_by_email("email@example.com", self.session)
+
+        self.session.execute.assert_called_once()
+        self.assertNotIn("bind_arguments", self.session.execute.call_args.kwargs)
+        snapshot = self.session.merge.call_args.args[0]
+        self.assertIsNot(snapshot, db_user)
+        self.assertEqual(snapshot.username, "username")
+        self.assertEqual(self.session.merge.call_args.kwargs, {"load": False})
+
+    async def test_get_cached_user_without_sync(self):
+        users_repository.user_cache_synced = False
+        db_user = User(id=1, username="username", email="email@example.com")
+        self.session.execute.return_value.scalar.return_value = db_user
+
+        await users_repository.get_cached_user_by_email("email@example.com", self.session)
+        await users_repository.get_cached_user_by_email("email@example.com", self.session)
+
+        self.assertEqual(self.session.execute.call_count, 2)
+        self.assertIsNone(users_repository.user_cache.get("email@example.com"))
+
+    async def test_get_cached_user_invalidated_during_load(self):
+        stale_user = User(id=1, username="username", email="email@example.com", is_banned=False)
+
+        async def execute(*args, **kwargs):
+            # A ban commits and is invalidated after the row was read, before it's cached
+            await users_repository.invalidate_user(stale_user)
+            result = MagicMock()
+            result.scalar.return_value = stale_user
+            return result
+
+        self.session.execute.side_effect = execute
+
+        result = await users_repository.get_cached_user_by_email("email@example.com", self.session)
+
+        self.assertIs(result, stale_user)
+        self.assertIsNone(users_repository.user_cache.get("email@example.com"))
+
+    async def test_user_cache_sync_retries(self):
+        pubsub = MagicMock()
+        pubsub.subscribe = AsyncMock(side_effect=[RedisError("down"), None])
+        pubsub.reset = AsyncMock()
+
+        async def messages():
+            yield {"type": "message", "data": "1"}
+            await asyncio.Event().wait()
+
+        pubsub.listen = messages
+        self.redis.pubsub = MagicMock(return_value=pubsub)
+        users_repository.user_cache_synced = False
+        users_repository.user_cache.set("email@example.com", User(id=1))
+
+        with patch.object(users_repository, "SYNC_RETRY_DELAY", 0), \
+                self.assertLogs(users_repository.logger, "ERROR"):
+            task = asyncio.create_task(users_repository.sync_user_cache())
+            for _ in range(10):
+                await asyncio.sleep(0)
+            self.assertTrue(users_repository.user_cache_synced)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        self.assertIsNone(users_repository.user_cache.get("email@example.com"))
+        self.assertFalse(users_repository.user_cache_synced)
+
+    async def test_add_ban_user_invalidates_cache(self):
+        mock_user = User(id=1, email="email@example.com")
+        users_repository.user_cache.set("email@example.com", mock_user)
+
+        await users_repository.add_ban_user(mock_user, db=self.session)
+
+        self.assertIsNone(users_repository.user_cache.get("email@example.com"))
+        self.redis.publish.assert_awaited_once_with(users_repository.USER_CACHE_CHANNEL, 1)
+
+
+class TestRepositoryUsersSQLite(SQLiteTestCase):
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        patcher = patch.object(users_repository, "redis_client", new=AsyncMock())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        users_repository.user_cache.clear()
+
+    async def test_create_user_first_admin(self):
+        with patch.object(users_repository, "users_exist", False):
+            first = await users_repository.create_user(
+                UserModel(username="username", email="email@example.com", password="qwerty_123"), self.session
+            )
+            # Another worker hasn't seen any signup yet, the database decides
+            users_repository.users_exist = False
+            second = await users_repository.create_user(
+                UserModel(username="second", email="second@example.com", password="x"), self.session
+            )
+
+        self.assertTrue(first.is_admin)
+        self.assertFalse(second.is_admin)
+
+    async def test_rotate_token(self):
+        self.session.add(User(username="username", email="email@example.com", password="x", refresh_token_hash="old"))
+        await self.session.commit()
+
+        rotated = await users_repository.rotate_token("email@example.com", "old", "new", self.session)
+        reused = await users_repository.rotate_token("email@example.com", "old", "other", self.session)
+        await users_repository.revoke_token("email@example.com", self.session)
+        revoked = await users_repository.rotate_token("email@example.com", "new", "other", self.session)
+
+        self.assertTrue(rotated)
+        self.assertFalse(reused)
+        self.assertFalse(revoked)
+
+
 if __name__ == '__main__':
     unittest.main()
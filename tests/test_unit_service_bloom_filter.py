@@ -0,0 +1,39 @@
+import unittest
+
+from src.services.bloom_filter import BloomFilter
+
+
+class TestBloomFilter(unittest.TestCase):
+    def setUp(self):
+        self.bloom = BloomFilter(capacity=1000, error_rate=0.01)
+
+    def test_added_items_are_found(self):
+        items = [f"token_{i}" for i in range(1000)]
+        for item in items:
+            self.bloom.add(item)
+
+        self.assertTrue(all(item in self.bloom for item in items))
+        self.assertEqual(self.bloom.count, 1000)
+        self.assertFalse(self.bloom.saturated)
+
+    def test_false_positive_rate(self):
+        for i in range(1000):
+            self.bloom.add(f"token_{i}")
+
+        false_positives = sum(f"other_{i}" in self.bloom for i in range(10000))
+
+        self.assertLess(false_positives / 10000, 0.03)
+
+    def test_empty_filter(self):
+        self.assertNotIn("token", self.bloom)
+
+    def test_saturated(self):
+        bloom = BloomFilter(capacity=2)
+        for item in ("a", "b", "c"):
+            bloom.add(item)
+
+        self.assertTrue(bloom.saturated)
+
+
+if __name__ == '__main__':
+    unittest.main()
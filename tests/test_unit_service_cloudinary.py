@@ -1,33 +1,113 @@
-import io
+import json
+import threading
+import time
 import unittest
-from unittest.mock import patch, Mock
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
 
-from src.services.cloudinary import upload_image
+from fastapi import HTTPException
 
-from config import settings
+from src.services import cloudinary as cloudinary_service
+from src.services.cloudinary import CloudinaryClient
 
 
-class TestServiceCloudinary(unittest.TestCase):
-    @patch('src.services.cloudinary.upload')
-    @patch('src.services.cloudinary.cloudinary.CloudinaryImage.build_url')
-    @patch('src.services.cloudinary.resource')
-    def test_upload_image(self, mock_resource, mock_build_url, mock_upload):
-        mock_resource.return_value = {'version': '1234'}
-        mock_build_url.return_value = 'https://cloudinary.com/image.jpg'
-        mock_upload.return_value = Mock()
+class MockCloudinary(BaseHTTPRequestHandler):
+    """
+    Local stand-in for the Upload API, answers with the queued (delay, status, body) responses.
+    """
+    responses = []
+    requests = []
 
-        test_file = io.BytesIO(b'test')
-        result = upload_image(
-            file=test_file,
-            user_id=1,
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        self.requests.append((self.path, body))
+        delay, code, payload = self.responses.pop(0) if self.responses else (0, 200, {})
+        time.sleep(delay)
+        content = json.dumps(payload).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestServiceCloudinary(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        MockCloudinary.responses = []
+        MockCloudinary.requests = []
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), MockCloudinary)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.client = CloudinaryClient(
+            "demo", "key", "secret",
+            base_url=f"http://127.0.0.1:{self.server.server_port}",
+            max_concurrency=2, timeout=0.5, retries=2, backoff=0.01,
         )
 
-        public_id = settings.cloudinary_folder + 'avatar_1'
+    async def asyncTearDown(self):
+        await self.client.close()
+
+    async def test_upload_image(self):
+        MockCloudinary.responses = [(0, 200, {"version": 1234, "public_id": "folder/avatar"})]
+
+        with patch.object(cloudinary_service, "cloudinary_client", self.client):
+            result = await cloudinary_service.upload_image(b"test")
+
+        self.assertEqual(result["version"], 1234)
+        self.assertEqual(len(MockCloudinary.requests), 1)
+        path, body = MockCloudinary.requests[0]
+        self.assertEqual(path, "/demo/image/upload")
+        self.assertIn(b'name="signature"', body)
+        self.assertIn(b"test", body)
+        self.assertIn(b'name="eager"', body)
+        self.assertIn(b'name="eager_async"\r\n\r\ntrue', body)
+
+    async def test_explicit_sends_eager(self):
+        MockCloudinary.responses = [(0, 200, {"secure_url": "https://res/image.jpg"})]
+
+        result = await self.client.explicit("sample", [{"quality": 80}])
+
+        self.assertEqual(result["secure_url"], "https://res/image.jpg")
+        self.assertIn(b"eager=q_80", MockCloudinary.requests[0][1])
+
+    async def test_retries_server_errors(self):
+        MockCloudinary.responses = [(0, 503, {}), (0, 500, {}), (0, 200, {"version": 1})]
+
+        result = await self.client.upload(b"test")
+
+        self.assertEqual(result, {"version": 1})
+        self.assertEqual(len(MockCloudinary.requests), 3)
+
+    async def test_gives_up_after_retries(self):
+        MockCloudinary.responses = [(0, 503, {"error": {"message": "busy"}})] * 3
+
+        with self.assertRaises(HTTPException) as error:
+            await self.client.upload(b"test")
+
+        self.assertEqual(error.exception.status_code, 502)
+        self.assertIn("busy", error.exception.detail)
+        self.assertEqual(len(MockCloudinary.requests), 3)
+
+    async def test_client_errors_are_not_retried(self):
+        MockCloudinary.responses = [(0, 400, {"error": {"message": "Invalid image file"}})]
+
+        with self.assertRaises(HTTPException) as error:
+            await self.client.upload(b"test")
+
+        self.assertEqual(error.exception.detail, "Cloudinary error: Invalid image file")
+        self.assertEqual(len(MockCloudinary.requests), 1)
+
+    async def test_timeout(self):
+        MockCloudinary.responses = [(1, 200, {})] * 3
+
+        with self.assertRaises(HTTPException) as error:
+            await self.client.upload(b"test")
 
-        mock_upload.assert_called_once_with(test_file, public_id=public_id, owerwrite=True)
-        mock_resource.assert_called_once_with(public_id)
-        mock_build_url.assert_called_once_with(width=250, height=250, crop='fill', version='1234')
-        self.assertEqual(result, 'https://cloudinary.com/image.jpg')
+        self.assertEqual(error.exception.status_code, 504)
 
 
 if __name__ == '__main__':
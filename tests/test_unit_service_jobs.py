@@ -0,0 +1,123 @@
+import json
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from fastapi import HTTPException
+from PIL import Image as PILImage
+
+from src.services import jobs, storage
+from src.services.jobs import DONE, FAILED, QUEUED, JobQueue, LocalJobQueue, MemoryJobStore
+
+
+class TestLocalJobQueue(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.queue = LocalJobQueue()
+
+    async def test_qr_job(self):
+        job_id = await self.queue.enqueue("qr", {"image_url": "https://example.com/1.png"}, user_id=1)
+
+        self.assertEqual((await self.queue.get_status(job_id))["status"], QUEUED)
+        await self.queue.join()
+
+        job = await self.queue.get_status(job_id)
+        self.assertEqual(job["status"], DONE)
+        self.assertEqual(job["user_id"], 1)
+        self.assertTrue(job["result"]["qr_image"].startswith("data:image/png;base64,"))
+
+    async def test_failed_job(self):
+        with patch.dict(jobs.HANDLERS, {"optimize": AsyncMock(side_effect=RuntimeError("boom"))}):
+            job_id = await self.queue.enqueue("optimize", {"public_id": "sample"})
+            await self.queue.join()
+
+        job = await self.queue.get_status(job_id)
+        self.assertEqual(job["status"], FAILED)
+        self.assertEqual(job["error"], "boom")
+
+    async def test_unknown_kind(self):
+        with self.assertRaises(ValueError):
+            await self.queue.enqueue("unknown", {})
+
+    async def test_unknown_job(self):
+        self.assertIsNone(await self.queue.get_status("missing"))
+
+    async def test_thumbnail_job(self):
+        with tempfile.TemporaryDirectory() as images_dir, \
+                patch.object(storage, "IMAGES_DIR", Path(images_dir)):
+            sha = "ab" * 32
+            blob = Path(storage.blob_path(sha))
+            blob.parent.mkdir(parents=True)
+            PILImage.new("RGBA", (1000, 500)).save(blob, "PNG")
+
+            job_id = await self.queue.enqueue("thumbnail", {"file_hash": sha})
+            await self.queue.join()
+
+            job = await self.queue.get_status(job_id)
+            self.assertEqual(job["status"], DONE)
+            with PILImage.open(job["result"]["path"]) as thumbnail:
+                self.assertEqual(thumbnail.size, (256, 128))
+
+    async def test_try_enqueue_queue_unavailable(self):
+        unavailable = HTTPException(status_code=503, detail="Job queue is unavailable, try again later")
+
+        with patch.object(self.queue, "submit", AsyncMock(side_effect=unavailable)), \
+                self.assertLogs(jobs.logger, "WARNING"):
+            job_id = await self.queue.try_enqueue("thumbnail", {"file_hash": "ab" * 32})
+
+        self.assertIsNone(job_id)
+
+
+class TestJobInfrastructure(unittest.IsolatedAsyncioTestCase):
+    async def test_memory_store_expires_records(self):
+        store = MemoryJobStore(ttl=60, maxsize=2)
+        with patch("src.services.ttl_cache.time.monotonic", return_value=0):
+            await store.save("first", status=QUEUED)
+        with patch("src.services.ttl_cache.time.monotonic", return_value=30):
+            await store.save("first", status=DONE)
+        with patch("src.services.ttl_cache.time.monotonic", return_value=80):
+            self.assertEqual((await store.get("first"))["status"], DONE)
+        with patch("src.services.ttl_cache.time.monotonic", return_value=91):
+            self.assertIsNone(await store.get("first"))
+
+        for job_id in ("a", "b", "c"):
+            await store.save(job_id, status=QUEUED)
+        self.assertIsNone(await store.get("a"))
+        self.assertEqual(len(store.jobs), 2)
+
+    def test_job_queue_is_abstract(self):
+        with self.assertRaises(TypeError):
+            JobQueue()
+
+    def test_consume_acks_from_connection_thread(self):
+        connection = MagicMock()
+        channel = connection.channel.return_value
+        acked = threading.Event()
+
+        def start_consuming():
+            on_message = channel.basic_consume.call_args.kwargs["on_message_callback"]
+            body = json.dumps({"id": "1", "kind": "qr", "payload": {}}).encode()
+            on_message(channel, MagicMock(delivery_tag=7), None, body)
+            # The callback returns before the job ends, the ack comes back through the connection
+            for _ in range(100):
+                if connection.add_callback_threadsafe.called:
+                    break
+                time.sleep(0.01)
+            connection.add_callback_threadsafe.call_args.args[0]()
+            acked.set()
+
+        channel.start_consuming.side_effect = start_consuming
+        with patch.object(jobs.pika, "BlockingConnection", return_value=connection), \
+                patch.object(jobs, "RedisJobStore", return_value=AsyncMock()), \
+                patch.dict(jobs.HANDLERS, {"qr": AsyncMock(return_value={})}):
+            jobs.consume("amqp://", "image_jobs")
+
+        self.assertTrue(acked.is_set())
+        channel.basic_ack.assert_called_once_with(delivery_tag=7)
+        connection.close.assert_called_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
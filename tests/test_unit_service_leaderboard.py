@@ -0,0 +1,74 @@
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from fastapi import HTTPException
+from redis.exceptions import RedisError
+
+from src.services import leaderboard
+from src.services.leaderboard import EPOCH, GENERATION, Leaderboard
+
+
+class TestLeaderboard(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        patcher = patch.object(leaderboard, "redis_client", MagicMock())
+        self.redis = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.redis.set = AsyncMock(return_value=None)
+        self.redis.zunionstore = AsyncMock()
+        self.redis.expire = AsyncMock()
+        self.redis.delete = AsyncMock()
+        self.redis.zrevrange = AsyncMock(return_value=[])
+        self.pipe = MagicMock()
+        self.pipe.execute = AsyncMock()
+        self.redis.pipeline.return_value.__aenter__ = AsyncMock(return_value=self.pipe)
+        self.redis.pipeline.return_value.__aexit__ = AsyncMock(return_value=False)
+        self.board = Leaderboard("images", half_life=3600, size=10)
+
+    def at(self, half_lives: float):
+        return patch.object(leaderboard.time, "time", return_value=EPOCH + half_lives * 3600)
+
+    def test_position(self):
+        self.assertEqual(self.board.position(EPOCH + 3 * 3600), (0, 3))
+        self.assertEqual(self.board.position(EPOCH + (GENERATION + 1) * 3600), (1, 1))
+
+    async def test_record_weighs_new_events_more(self):
+        with self.at(3):
+            await self.board.record([7, 8])
+
+        self.pipe.zincrby.assert_any_call("leaderboard:images:0", 8.0, 7)
+        self.pipe.zincrby.assert_any_call("leaderboard:images:0", 8.0, 8)
+        self.pipe.zremrangebyrank.assert_called_once_with("leaderboard:images:0", 0, -11)
+
+    async def test_top_scales_scores(self):
+        self.redis.zrevrange.return_value = [("7", 8.0), ("8", 2.0)]
+
+        with self.at(2):
+            result = await self.board.top(2)
+
+        self.assertEqual(result, [("7", 2.0), ("8", 0.5)])
+        self.redis.zrevrange.assert_awaited_once_with("leaderboard:images:0", 0, 1, withscores=True)
+
+    async def test_rollover_carries_previous_generation(self):
+        self.redis.set.return_value = True
+
+        with self.at(GENERATION + 1):
+            await self.board.top(1)
+            await self.board.top(1)
+
+        self.redis.zunionstore.assert_awaited_once_with(
+            "leaderboard:images:1",
+            {"leaderboard:images:1": 1, "leaderboard:images:0": 2.0 ** -GENERATION},
+        )
+
+    async def test_redis_unavailable(self):
+        self.redis.set.side_effect = RedisError
+
+        await self.board.record([7])
+        with self.assertRaises(HTTPException) as error:
+            await self.board.top(1)
+
+        self.assertEqual(error.exception.status_code, 503)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,25 @@
+import unittest
+from datetime import datetime
+
+from fastapi import HTTPException
+
+from src.services.pagination import decode_cursor, encode_cursor
+
+
+class TestPagination(unittest.TestCase):
+    def test_round_trip(self):
+        created_at = datetime(2023, 10, 1, 12, 30, 15, 123456)
+
+        cursor = encode_cursor(created_at, 42)
+
+        self.assertEqual(decode_cursor(cursor), (created_at, 42))
+
+    def test_invalid_cursor(self):
+        for cursor in ("not a cursor", encode_cursor(datetime.now(), 1)[:-4], "MTIz"):
+            with self.assertRaises(HTTPException) as error:
+                decode_cursor(cursor)
+            self.assertEqual(error.exception.status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+import io
+import unittest
+import zipfile
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from fastapi import HTTPException
+from pydantic import ValidationError
+from redis.exceptions import RedisError
+
+from src.schemas.qr import MAX_QR_DATA, QRBatchModel
+from src.services import qr as qr_services
+from src.services.worker_pool import BoundedExecutor
+
+
+class TestQRService(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        qr_services.qr_cache.clear()
+        patcher = patch.object(qr_services, "redis_binary_client", AsyncMock())
+        self.redis = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.redis.get.return_value = None
+        # Thread pool keeps the tests free of process spawning and lets them patch the renderer
+        patcher = patch.object(qr_services, "qr_render_pool", BoundedExecutor(2, 2, "qr-test"))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_render_formats(self):
+        png = qr_services.render_qr_code("https://example.com/1.png", "png")
+        svg = qr_services.render_qr_code("https://example.com/1.png", "svg")
+
+        self.assertTrue(png.startswith(b"\x89PNG"))
+        self.assertIn(b"<svg", svg)
+
+    def test_cache_key(self):
+        key = qr_services.qr_cache_key("https://example.com/1.png", "png")
+
+        self.assertEqual(key, qr_services.qr_cache_key("https://example.com/1.png", "png"))
+        self.assertNotEqual(key, qr_services.qr_cache_key("https://example.com/1.png", "svg"))
+
+    async def test_render_once(self):
+        with patch.object(qr_services, "render_qr_code", return_value=b"png") as render:
+            first = await qr_services.get_qr_code("https://example.com/1.png")
+            second = await qr_services.get_qr_code("https://example.com/1.png")
+
+        self.assertEqual(first, b"png")
+        self.assertEqual(second, b"png")
+        render.assert_called_once()
+        self.redis.get.assert_called_once()
+        self.redis.set.assert_called_once()
+
+    async def test_redis_hit(self):
+        self.redis.get.return_value = b"cached"
+
+        with patch.object(qr_services, "render_qr_code") as render:
+            result = await qr_services.get_qr_code("https://example.com/1.png")
+
+        self.assertEqual(result, b"cached")
+        render.assert_not_called()
+
+    async def test_redis_unavailable(self):
+        self.redis.get.side_effect = RedisError
+        self.redis.set.side_effect = RedisError
+
+        result = await qr_services.get_qr_code("https://example.com/1.png", "svg")
+
+        self.assertIn(b"<svg", result)
+
+
+    async def test_batch(self):
+        qr_services.qr_cache.set(qr_services.qr_cache_key("memory", "png"), b"from memory")
+        self.redis.mget.side_effect = lambda keys: [b"from redis"] + [None] * (len(keys) - 1)
+        pipe = MagicMock(execute=AsyncMock())
+        self.redis.pipeline = MagicMock(return_value=MagicMock(
+            __aenter__=AsyncMock(return_value=pipe), __aexit__=AsyncMock(return_value=False)
+        ))
+        urls = ["memory", "redis", "a", "b", "c"]
+
+        with patch.object(qr_services, "render_qr_code", side_effect=lambda url, _: url.encode()):
+            result = await qr_services.get_qr_codes(urls)
+
+        self.assertEqual(result, [b"from memory", b"from redis", b"a", b"b", b"c"])
+        self.assertEqual(len(self.redis.mget.call_args.args[0]), 4)
+        self.assertEqual(pipe.set.call_count, 3)
+        self.assertEqual(qr_services.qr_cache.get(qr_services.qr_cache_key("c", "png")), b"c")
+
+    async def test_url_too_long(self):
+        self.redis.mget.return_value = [None, None]
+        long_url = "https://example.com/" + "a" * MAX_QR_DATA
+
+        with self.assertRaises(HTTPException) as error:
+            await qr_services.get_qr_code(long_url)
+        self.assertEqual(error.exception.status_code, 400)
+
+        with self.assertRaises(HTTPException) as error:
+            await qr_services.get_qr_codes(["https://example.com/1.png", long_url])
+        self.assertEqual(error.exception.status_code, 400)
+        self.assertIn("https://example.com/aaa", error.exception.detail)
+
+    def test_batch_model_limits_url_length(self):
+        with self.assertRaises(ValidationError):
+            QRBatchModel(image_urls=["a" * (MAX_QR_DATA + 1)])
+
+    def test_build_archive(self):
+        archive = qr_services.build_qr_archive(["https://a", "https://b"], [b"1", b"2"], "svg")
+
+        with zipfile.ZipFile(io.BytesIO(archive)) as result:
+            self.assertEqual(result.namelist(), ["qr_0001.svg", "qr_0002.svg", "index.txt"])
+            self.assertEqual(result.read("qr_0002.svg"), b"2")
+            self.assertIn("qr_0001.svg\thttps://a", result.read("index.txt").decode())
+
+
+if __name__ == '__main__':
+    unittest.main()
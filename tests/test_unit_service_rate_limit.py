@@ -0,0 +1,85 @@
+import unittest
+from unittest.mock import patch
+
+from fastapi import HTTPException, Request, Response
+
+from src.services import rate_limit
+from src.services.rate_limit import RateLimiter, TokenBucketLimiter
+
+
+class TestTokenBucketLimiter(unittest.TestCase):
+    def setUp(self):
+        self.limiter = TokenBucketLimiter(max_keys=2)
+        self.now = 100.0
+        patcher = patch.object(rate_limit.time, "monotonic", lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_limits_burst(self):
+        self.assertEqual(self.limiter.hit("client", 2, 1), 0)
+        self.assertEqual(self.limiter.hit("client", 2, 1), 0)
+        self.assertAlmostEqual(self.limiter.hit("client", 2, 1), 0.5)
+
+    def test_refills(self):
+        self.limiter.hit("client", 2, 1)
+        self.limiter.hit("client", 2, 1)
+        self.now += 0.5
+        self.assertEqual(self.limiter.hit("client", 2, 1), 0)
+        self.assertGreater(self.limiter.hit("client", 2, 1), 0)
+
+    def test_keys_are_independent(self):
+        self.limiter.hit("first", 1, 1)
+        self.assertGreater(self.limiter.hit("first", 1, 1), 0)
+        self.assertEqual(self.limiter.hit("second", 1, 1), 0)
+
+    def test_evicts_least_recently_used(self):
+        self.limiter.hit("first", 1, 1)
+        self.limiter.hit("second", 1, 1)
+        self.limiter.hit("first", 1, 1)
+        self.limiter.hit("third", 1, 1)
+
+        self.assertEqual(list(self.limiter.buckets), ["first", "third"])
+
+
+class TestRateLimiter(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        patcher = patch.object(rate_limit, "local_limiter", TokenBucketLimiter())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @staticmethod
+    def request(host: str = "127.0.0.1") -> Request:
+        return Request({
+            "type": "http", "method": "GET", "path": "/api/users/me", "headers": [],
+            "client": (host, 1234),
+        })
+
+    async def test_local_backend(self):
+        limiter = RateLimiter(times=2, seconds=1)
+
+        await limiter(self.request(), Response())
+        await limiter(self.request(), Response())
+        with self.assertRaises(HTTPException) as error:
+            await limiter(self.request(), Response())
+
+        self.assertEqual(error.exception.status_code, 429)
+        self.assertEqual(error.exception.headers["Retry-After"], "1")
+        await limiter(self.request("10.0.0.1"), Response())
+
+    async def test_limiters_are_independent(self):
+        first, second = RateLimiter(times=1, seconds=1), RateLimiter(times=1, seconds=1)
+
+        await first(self.request(), Response())
+        await second(self.request(), Response())
+
+    async def test_redis_backend(self):
+        limiter = RateLimiter(times=1, seconds=1)
+        with patch.object(rate_limit.settings, "rate_limit_backend", "redis"), \
+                patch.object(rate_limit.RedisRateLimiter, "__call__") as redis_call:
+            await limiter(self.request(), Response())
+
+        redis_call.assert_awaited_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from fastapi import HTTPException
+from PIL import Image as PILImage
+
+from src.services import storage, transform
+from src.services.transform import TransformParams, transform_blob, transform_image
+
+
+class TestTransform(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.images_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.images_dir.cleanup)
+        patcher = patch.object(storage, "IMAGES_DIR", Path(self.images_dir.name))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.sha = "cd" * 32
+        blob = Path(storage.blob_path(self.sha))
+        blob.parent.mkdir(parents=True)
+        PILImage.new("RGB", (400, 200), "red").save(blob, "JPEG")
+
+    def size(self, params):
+        with PILImage.open(transform_blob(self.sha, params)) as image:
+            return image.size
+
+    def test_crop_modes(self):
+        self.assertEqual(self.size(TransformParams(100, 100, "fill")), (100, 100))
+        self.assertEqual(self.size(TransformParams(100, 100, "thumb")), (100, 100))
+        self.assertEqual(self.size(TransformParams(800, 800, "lfill")), (200, 200))
+        self.assertEqual(self.size(TransformParams(100, 100, "fill_pad")), (100, 100))
+        self.assertEqual(self.size(TransformParams(100, 500, "crop")), (100, 200))
+
+    def test_fill_pad_keeps_whole_image(self):
+        with PILImage.open(transform_blob(self.sha, TransformParams(100, 100, "fill_pad"))) as image:
+            self.assertEqual(image.getpixel((50, 5))[3], 0)
+            self.assertEqual(image.getpixel((50, 50))[3], 255)
+
+    def test_radius(self):
+        path = transform_blob(self.sha, TransformParams(100, 100, "fill", radius="max"))
+
+        self.assertTrue(path.endswith("w_100,h_100,c_fill,r_max,q_80.png"))
+        with PILImage.open(path) as image:
+            self.assertEqual(image.getpixel((0, 0))[3], 0)
+            self.assertEqual(image.getpixel((50, 50))[3], 255)
+
+    def test_derivative_is_cached(self):
+        params = TransformParams(50, 50)
+        first = transform_blob(self.sha, params)
+
+        with patch.object(transform, "render") as render:
+            second = transform_blob(self.sha, params)
+
+        self.assertEqual(first, second)
+        render.assert_not_called()
+
+    async def test_missing_blob(self):
+        with self.assertRaises(HTTPException) as error:
+            await transform_image("ef" * 32, TransformParams(50, 50))
+
+        self.assertEqual(error.exception.status_code, 404)
+
+    async def test_derivatives_removed_with_blob(self):
+        await transform_image(self.sha, TransformParams(50, 50))
+
+        await storage.remove_blob(self.sha)
+
+        self.assertFalse(Path(storage.derived_dir(self.sha)).exists())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+import unittest
+from unittest.mock import patch
+
+from src.services.ttl_cache import TTLCache
+
+
+class TestTTLCache(unittest.TestCase):
+    def setUp(self):
+        self.cache = TTLCache(maxsize=2, ttl=10)
+
+    def test_get_and_set(self):
+        self.cache.set("key", "value")
+
+        self.assertEqual(self.cache.get("key"), "value")
+        self.assertIsNone(self.cache.get("missing"))
+        self.assertEqual(self.cache.hits, 1)
+        self.assertEqual(self.cache.misses, 1)
+
+    def test_expired_entry(self):
+        with patch("src.services.ttl_cache.time.monotonic", return_value=100):
+            self.cache.set("key", "value")
+        with patch("src.services.ttl_cache.time.monotonic", return_value=111):
+            self.assertIsNone(self.cache.get("key"))
+        self.assertEqual(len(self.cache), 0)
+
+    def test_non_positive_ttl_is_not_stored(self):
+        self.cache.set("key", "value", ttl=0)
+
+        self.assertIsNone(self.cache.get("key"))
+
+    def test_lru_eviction(self):
+        self.cache.set("first", 1)
+        self.cache.set("second", 2)
+        self.cache.get("first")
+        self.cache.set("third", 3)
+
+        self.assertEqual(self.cache.get("first"), 1)
+        self.assertIsNone(self.cache.get("second"))
+        self.assertEqual(self.cache.get("third"), 3)
+
+    def test_remove_if(self):
+        self.cache.set("first", 1)
+        self.cache.set("second", 2)
+
+        self.cache.remove_if(lambda value: value == 1)
+
+        self.assertIsNone(self.cache.get("first"))
+        self.assertEqual(self.cache.get("second"), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,41 @@
+import asyncio
+import threading
+import unittest
+
+from fastapi import HTTPException
+
+from src.services.worker_pool import BoundedExecutor
+
+
+class TestBoundedExecutor(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.pool = BoundedExecutor(max_workers=1, max_queue=1, name="test")
+
+    def tearDown(self):
+        self.pool.executor.shutdown(wait=True)
+
+    async def test_run(self):
+        result = await self.pool.run(sum, [1, 2, 3])
+
+        self.assertEqual(result, 6)
+        self.assertEqual(self.pool.stats()["completed"], 1)
+        self.assertEqual(self.pool.stats()["in_flight"], 0)
+
+    async def test_rejects_when_saturated(self):
+        release = threading.Event()
+        running = [asyncio.create_task(self.pool.run(release.wait)) for _ in range(2)]
+        await asyncio.sleep(0.05)
+
+        self.assertEqual(self.pool.stats()["queue_depth"], 1)
+        with self.assertRaises(HTTPException) as error:
+            await self.pool.run(release.wait)
+        self.assertEqual(error.exception.status_code, 503)
+        self.assertEqual(self.pool.stats()["rejected"], 1)
+
+        release.set()
+        await asyncio.gather(*running)
+        self.assertEqual(self.pool.stats()["in_flight"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,6 @@
+from src.services.jobs import run_workers
+
+
+if __name__ == "__main__":
+    # Consumes the LavinaMQ job queue, start alongside the API when JOB_BACKEND=amqp
+    run_workers()